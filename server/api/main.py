@@ -1,13 +1,17 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request
 from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 import uuid
 import os
+import base64
+import hashlib
+import hmac
 from datetime import datetime
 import aiofiles
 from minio import Minio
 from minio.error import S3Error
 import redis
-import json
+from celery import Celery
 import jwt
 from sqlalchemy.orm import Session
 import time
@@ -23,7 +27,12 @@ except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
 METRICS_ENABLED = Counter is not None
 
 from db.database import get_db
-from db.models import KycSession
+from db.models import KycSession, SessionSummary
+from common.scheduling import TIERS, DEFAULT_TIER, SessionScheduler
+from common.service_stats import ServiceStats
+from common.retention_stats import RetentionStats
+from common.serialization import CELERY_SETTINGS
+from common.chunked_upload import HMAC_HEADER, ChunkedUploads, UploadBusy, UploadNotFound
 
 app = FastAPI(title="KYC Processing API", version="1.0.0")
 
@@ -64,7 +73,8 @@ async def metrics() -> Response:
     if not METRICS_ENABLED or generate_latest is None:
         raise HTTPException(status_code=503, detail="Prometheus client library not installed")
 
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    exported = scheduler.metrics() + service_stats.metrics() + retention_stats.metrics()
+    return Response(generate_latest() + exported.encode(), media_type=CONTENT_TYPE_LATEST)
 
 # JWT Secret
 JWT_SECRET = "your-secret-key"  # In production, use environment variable
@@ -80,8 +90,26 @@ minio_client = Minio(
 # Redis for Celery
 redis_client = redis.Redis(host='redis', port=6379, db=0)
 
+# Sessions wait in per-tier deadline queues; each gets one dispatch token on the worker queue
+scheduler = SessionScheduler(redis_client)
+service_stats = ServiceStats(redis_client)  # Worker calls to the analysis services
+retention_stats = RetentionStats(redis_client)  # Object storage retention and worker scratch space
+celery_client = Celery(broker=os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0"))
+celery_client.conf.update(CELERY_SETTINGS)
+
 BUCKET_NAME = "kyc-videos"
 
+# For simplicity, uploads are signed with a shared secret (in production, use per-session key)
+INTEGRITY_SECRET = b"shared_secret"
+
+# Resumable uploads: chunks are verified on arrival and staged as MinIO multipart parts
+chunked_uploads = ChunkedUploads(redis_client, minio_client, BUCKET_NAME, INTEGRITY_SECRET)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# Upload kind -> KycSession column holding the video's object name
+UPLOAD_KINDS = {"selfie": "selfie_video_path", "id": "id_video_path"}
+
 @app.on_event("startup")
 async def startup_event():
     """Create MinIO bucket if it doesn't exist"""
@@ -91,6 +119,54 @@ async def startup_event():
     except S3Error as exc:
         print(f"MinIO error: {exc}")
 
+def integrity_digests(content: bytes):
+    """Base64 HMAC-SHA256 and SHA-256 of an upload, as the client computes them"""
+    return (
+        base64.b64encode(hmac.new(INTEGRITY_SECRET, content, hashlib.sha256).digest()).decode(),
+        base64.b64encode(hashlib.sha256(content).digest()).decode(),
+    )
+
+def create_session(db: Session, session_id: str):
+    """Create a pending KYC session and its summary row"""
+    kyc_session = KycSession(
+        session_id=session_id,
+        selfie_video_path="",  # Will be set after upload
+        id_video_path="",  # Will be set after upload
+        status="pending"
+    )
+    db.add(kyc_session)
+    db.flush()  # To get kyc_session.id
+    db.add(SessionSummary(
+        session_pk=kyc_session.id,
+        session_id=session_id,
+        status="pending",
+        created_at=kyc_session.created_at
+    ))
+    db.commit()
+    db.refresh(kyc_session)
+    return kyc_session
+
+def queue_session(session_id: str, priority: str):
+    """Queue an uploaded session under its SLA deadline; returns the response fields for the client"""
+    # The token lets a worker take the most urgent session
+    deadline = scheduler.enqueue(session_id, priority)
+    celery_client.send_task("worker.tasks.run_next_session", queue="kyc_processing")
+
+    # Create JWT token
+    token_payload = {
+        "session_id": session_id,
+        "status": "queued",
+        "exp": datetime.utcnow().timestamp() + 3600  # 1 hour
+    }
+    token = jwt.encode(token_payload, JWT_SECRET, algorithm="HS256")
+    return {
+        "token": token,
+        "session_id": session_id,
+        "status": "queued",
+        "priority": priority,
+        "deadline": deadline,
+    }
+
 @app.post("/ingest")
 async def ingest_videos(
     selfie: UploadFile = File(...),
@@ -99,14 +175,19 @@ async def ingest_videos(
     selfie_sha256: str = None,
     id_hmac: str = None,
     id_sha256: str = None,
+    priority: str = DEFAULT_TIER,
     db: Session = Depends(get_db)
 ):
     """
     Ingest selfie and ID video files for KYC processing.
-    Verifies HMAC and SHA256, stores the videos in MinIO and queues a Celery task for processing.
+    Verifies HMAC and SHA256, stores the videos in MinIO and queues the session for processing.
+    `priority` picks the scheduling tier: interactive app flows, or bulk back-office re-verification.
     """
+    if priority not in TIERS:
+        raise HTTPException(status_code=400, detail=f"Invalid priority. Expected one of: {', '.join(TIERS)}")
+
     for file in [selfie, id_video]:
-        if not file.filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
+        if not file.filename.lower().endswith(VIDEO_EXTENSIONS):
             raise HTTPException(status_code=400, detail="Invalid file format. Only video files are accepted.")
 
     # Read file contents
@@ -114,18 +195,8 @@ async def ingest_videos(
     id_content = await id_video.read()
 
     # Verify HMAC and SHA256
-    import hmac
-    import hashlib
-    import base64
-
-    # For simplicity, use a shared secret (in production, use per-session key)
-    secret = b"shared_secret"
-
-    expected_selfie_hmac = base64.b64encode(hmac.new(secret, selfie_content, hashlib.sha256).digest()).decode()
-    expected_selfie_sha256 = base64.b64encode(hashlib.sha256(selfie_content).digest()).decode()
-
-    expected_id_hmac = base64.b64encode(hmac.new(secret, id_content, hashlib.sha256).digest()).decode()
-    expected_id_sha256 = base64.b64encode(hashlib.sha256(id_content).digest()).decode()
+    expected_selfie_hmac, expected_selfie_sha256 = integrity_digests(selfie_content)
+    expected_id_hmac, expected_id_sha256 = integrity_digests(id_content)
 
     if selfie_hmac != expected_selfie_hmac or selfie_sha256 != expected_selfie_sha256:
         raise HTTPException(status_code=400, detail="Selfie integrity verification failed")
@@ -137,15 +208,7 @@ async def ingest_videos(
     session_id = str(uuid.uuid4())
 
     # Create KYC session in database
-    kyc_session = KycSession(
-        session_id=session_id,
-        selfie_video_path="",  # Will be set after upload
-        id_video_path="",  # Will be set after upload
-        status="pending"
-    )
-    db.add(kyc_session)
-    db.commit()
-    db.refresh(kyc_session)
+    kyc_session = create_session(db, session_id)
 
     try:
         # Upload selfie
@@ -177,34 +240,16 @@ async def ingest_videos(
         kyc_session.id_video_path = id_object_name
         db.commit()
 
-        # Queue Celery task
-        task_data = {
-            "session_id": session_id,
-            "selfie_video_path": selfie_object_name,
-            "id_video_path": id_object_name
-        }
-        redis_client.lpush("kyc_processing_queue", json.dumps(task_data))
+        # Queue the session under its SLA deadline
+        queued = queue_session(session_id, priority)
 
         # Clean up temp files
         os.remove(selfie_temp_path)
         os.remove(id_temp_path)
 
-        # Create JWT token
-        token_payload = {
-            "session_id": session_id,
-            "status": "queued",
-            "exp": datetime.utcnow().timestamp() + 3600  # 1 hour
-        }
-        token = jwt.encode(token_payload, JWT_SECRET, algorithm="HS256")
-
         return JSONResponse(
             status_code=200,
-            content={
-                "token": token,
-                "session_id": session_id,
-                "status": "queued",
-                "message": "Videos uploaded successfully and queued for processing"
-            }
+            content={**queued, "message": "Videos uploaded successfully and queued for processing"}
         )
 
     except S3Error as e:
@@ -214,21 +259,162 @@ async def ingest_videos(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/uploads")
+async def create_upload(payload: dict, db: Session = Depends(get_db)):
+    """
+    Start a resumable, chunked upload of one session video (see common/chunked_upload.py).
+    Expects `kind` (selfie or id), `filename`, `size`, `chunk_size` and `sha256`, the base64 SHA-256
+    over the chunks' SHA-256 digests in order. Without `session_id` a new session is created;
+    pass the returned `session_id` when starting the upload of the session's other video.
+    """
+    kind = payload.get("kind")
+    filename = payload.get("filename") or ""
+    if kind not in UPLOAD_KINDS:
+        raise HTTPException(status_code=400, detail=f"Invalid kind. Expected one of: {', '.join(UPLOAD_KINDS)}")
+    if not filename.lower().endswith(VIDEO_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Invalid file format. Only video files are accepted.")
+
+    session_id = payload.get("session_id")
+    if session_id:
+        kyc_session = db.query(KycSession).filter(KycSession.session_id == session_id).first()
+        if not kyc_session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if kyc_session.status != "pending" or getattr(kyc_session, UPLOAD_KINDS[kind]):
+            raise HTTPException(status_code=409, detail=f"The session's {kind} video is already uploaded")
+    else:
+        session_id = str(uuid.uuid4())
+
+    try:
+        upload_id, total_chunks = await run_in_threadpool(
+            chunked_uploads.create,
+            f"{session_id}/{kind}_{filename}",
+            int(payload.get("size") or 0),
+            int(payload.get("chunk_size") or 0),
+            payload.get("sha256"),
+            session_id=session_id,
+            kind=kind,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except S3Error as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start upload: {str(e)}")
+
+    if not payload.get("session_id"):
+        create_session(db, session_id)
+
+    return {
+        "upload_id": upload_id,
+        "session_id": session_id,
+        "kind": kind,
+        "chunk_size": int(payload["chunk_size"]),
+        "total_chunks": total_chunks,
+    }
+
+@app.put("/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(upload_id: str, index: int, request: Request):
+    """
+    Store chunk `index` (from 0) of an upload; the raw body is the chunk and the X-Chunk-HMAC header
+    its base64 HMAC-SHA256 over "{upload_id}:{index}:" followed by the chunk bytes.
+    Chunks may arrive in any order and in parallel; re-sending a chunk replaces it.
+    """
+    data = await request.body()
+    try:
+        received = await run_in_threadpool(
+            chunked_uploads.put_chunk, upload_id, index, data, request.headers.get(HMAC_HEADER)
+        )
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadBusy:
+        raise HTTPException(status_code=409, detail="Upload is being completed")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except S3Error as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store chunk: {str(e)}")
+
+    return {"upload_id": upload_id, "index": index, "received": received}
+
+@app.get("/uploads/{upload_id}")
+async def get_upload_status(upload_id: str):
+    """Chunks of an upload still missing, for a client resuming after a lost connection"""
+    try:
+        state, missing = await run_in_threadpool(chunked_uploads.missing, upload_id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    return {
+        "upload_id": upload_id,
+        "session_id": state["session_id"],
+        "kind": state["kind"],
+        "chunk_size": state["chunk_size"],
+        "total_chunks": state["total_chunks"],
+        "missing": missing,
+        "completed": bool(state["completed"]),
+    }
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    priority: str = DEFAULT_TIER,
+    db: Session = Depends(get_db)
+):
+    """
+    Assemble an upload once all its chunks are in and its checksum matches.
+    The session is queued for processing, under `priority`, when its second video completes.
+    """
+    if priority not in TIERS:
+        raise HTTPException(status_code=400, detail=f"Invalid priority. Expected one of: {', '.join(TIERS)}")
+
+    try:
+        state = await run_in_threadpool(chunked_uploads.complete, upload_id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadBusy:
+        raise HTTPException(status_code=409, detail="Upload is being completed by another request")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except S3Error as e:
+        raise HTTPException(status_code=500, detail=f"Failed to complete upload: {str(e)}")
+
+    session_id, kind = state["session_id"], state["kind"]
+    # Locked so the two videos completing at once queue the session exactly once
+    kyc_session = db.query(KycSession).filter(KycSession.session_id == session_id).with_for_update().first()
+    if not kyc_session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if getattr(kyc_session, UPLOAD_KINDS[kind]):  # A repeated complete
+        db.rollback()
+        return {"session_id": session_id, "kind": kind, "status": kyc_session.status}
+
+    setattr(kyc_session, UPLOAD_KINDS[kind], state["object_name"])
+    ready = bool(kyc_session.selfie_video_path and kyc_session.id_video_path)
+    db.commit()
+    if not ready:
+        return {
+            "session_id": session_id,
+            "kind": kind,
+            "status": "pending",
+            "message": f"{kind} video uploaded, waiting for the other video"
+        }
+
+    return JSONResponse(
+        status_code=200,
+        content={**queue_session(session_id, priority), "message": "Videos uploaded successfully and queued for processing"}
+    )
+
 @app.get("/status/{session_id}")
 async def get_processing_status(
     session_id: str,
     db: Session = Depends(get_db)
 ):
     """Get the processing status of a KYC session"""
-    session = db.query(KycSession).filter(KycSession.session_id == session_id).first()
-    if not session:
+    summary = db.query(SessionSummary).filter(SessionSummary.session_id == session_id).first()
+    if not summary:
         raise HTTPException(status_code=404, detail="Session not found")
 
     return {
-        "session_id": session.session_id,
-        "status": session.status,
-        "created_at": session.created_at,
-        "updated_at": session.updated_at
+        "session_id": summary.session_id,
+        "status": summary.status,
+        "created_at": summary.created_at,
+        "updated_at": summary.updated_at
     }
 
 @app.get("/results/{session_id}")
@@ -237,53 +423,60 @@ async def get_processing_results(
     db: Session = Depends(get_db)
 ):
     """Get the complete processing results for a KYC session"""
-    session = db.query(KycSession).filter(KycSession.session_id == session_id).first()
-    if not session:
+    summary = db.query(SessionSummary).filter(SessionSummary.session_id == session_id).first()
+    if not summary:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    if session.status != "completed":
+    if summary.status != "completed":
         return {
-            "session_id": session.session_id,
-            "status": session.status,
+            "session_id": summary.session_id,
+            "status": summary.status,
             "message": "Processing not yet completed"
         }
 
     # Build results response
     results = {
-        "session_id": session.session_id,
-        "status": session.status,
-        "results": {}
+        "session_id": summary.session_id,
+        "status": summary.status,
+        "results": {},
+        "stage_timings": summary.stage_timings or {}
     }
 
-    if session.pad_result:
+    if summary.pad_score is not None:
         results["results"]["pad"] = {
-            "score": session.pad_result.score,
-            "passed": bool(session.pad_result.passed)
+            "score": summary.pad_score,
+            "passed": bool(summary.pad_passed)
         }
 
-    if session.deepfake_result:
+    if summary.deepfake_score is not None:
         results["results"]["deepfake"] = {
-            "score": session.deepfake_result.score,
-            "passed": bool(session.deepfake_result.passed)
+            "score": summary.deepfake_score,
+            "passed": bool(summary.deepfake_passed)
         }
 
-    if session.face_match_result:
+    if summary.face_match_score is not None:
         results["results"]["face_match"] = {
-            "cosine_similarity": session.face_match_result.cosine_similarity,
-            "passed": bool(session.face_match_result.passed)
+            "cosine_similarity": summary.face_match_score,
+            "passed": bool(summary.face_match_passed)
         }
 
-    if session.doc_liveness_result:
+    if summary.doc_liveness_score is not None:
         results["results"]["doc_liveness"] = {
-            "score": session.doc_liveness_result.score,
-            "passed": bool(session.doc_liveness_result.passed)
+            "score": summary.doc_liveness_score,
+            "passed": bool(summary.doc_liveness_passed)
+        }
+
+    if summary.replay_matching_frames:
+        results["results"]["replay_index"] = {
+            "matched_session_id": summary.replay_match_session_id,
+            "matching_frames": summary.replay_matching_frames
         }
 
-    if session.risk_score:
+    if summary.decision is not None:
         results["results"]["risk_score"] = {
-            "overall_score": session.risk_score.overall_score,
-            "risk_level": session.risk_score.risk_level,
-            "decision": session.risk_score.decision
+            "overall_score": summary.overall_score,
+            "risk_level": summary.risk_level,
+            "decision": summary.decision
         }
 
-    return results
\ No newline at end of file
+    return results
@@ -0,0 +1 @@
+"""Code shared by the worker, the API and the analysis services."""
@@ -0,0 +1,152 @@
+"""Deadline propagation and admission control for the analysis services.
+
+Callers send ``X-Request-Deadline``: the absolute time (Unix seconds) after
+which they will no longer wait for the answer. For every guarded endpoint
+the service then:
+
+- rejects a request whose deadline has already passed with 504, before any
+  work is done;
+- runs at most ``max_concurrency`` requests at a time, with a short queue
+  of ``max_queue`` waiters, none waiting longer than ``queue_timeout``;
+- answers a request that finds the queue full, or times out in it, with a
+  fast 503 and a ``Retry-After`` estimated from recent service times;
+- drops a queued request whose deadline passes while it waits (504).
+
+Handlers can call ``remaining()`` or ``raise_if_expired()`` between stages
+to stop early once the caller has given up. Admitted, completed, shed and
+expired counts are exported per endpoint by ``metrics()``.
+
+Typical use::
+
+    admission = Admission("pad", ["/analyze"])
+    app.middleware("http")(admission.middleware)
+"""
+import asyncio
+import contextvars
+import math
+import os
+import time
+from collections import defaultdict
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+DEADLINE_HEADER = "X-Request-Deadline"
+
+OUTCOMES = ["admitted", "completed", "shed", "expired"]
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+def _env_int(name, default):
+    value = int(os.getenv(name, "0"))
+    return value if value > 0 else default
+
+
+def parse_deadline(value):
+    """Deadline header value as Unix seconds, or None when absent or malformed"""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def remaining():
+    """Seconds left before the current request's deadline, or None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def raise_if_expired():
+    """Abort the current request once its caller has given up"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+
+
+class Admission:
+    def __init__(self, service, paths, max_concurrency=None, max_queue=None, queue_timeout=None):
+        self.service = service
+        self.paths = set(paths)
+        self.max_concurrency = max_concurrency or _env_int("ADMISSION_MAX_CONCURRENCY", os.cpu_count() or 1)
+        self.max_queue = max_queue if max_queue is not None else _env_int("ADMISSION_MAX_QUEUE", 2 * self.max_concurrency)
+        self.queue_timeout = queue_timeout or float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        # Exponentially weighted mean handler time, for Retry-After estimates
+        self.service_seconds = 1.0
+        self.counts = defaultdict(lambda: dict.fromkeys(OUTCOMES, 0))
+
+    def retry_after(self):
+        """Seconds until a slot is likely free: the queue ahead drained at the current service rate"""
+        return max(1, math.ceil(self.service_seconds * (self.waiting + 1) / self.max_concurrency))
+
+    def _shed(self, path, reason):
+        self.counts[path]["shed"] += 1
+        retry_after = self.retry_after()
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"{self.service} is saturated ({reason})", "retry_after": retry_after},
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def _expired(self, path, stage):
+        self.counts[path]["expired"] += 1
+        return JSONResponse(status_code=504, content={"detail": f"Request deadline exceeded {stage}"})
+
+    async def middleware(self, request, call_next):
+        path = request.url.path
+        if path not in self.paths or request.method != "POST":
+            return await call_next(request)
+
+        deadline = parse_deadline(request.headers.get(DEADLINE_HEADER))
+        if deadline is not None and time.time() >= deadline:
+            return self._expired(path, "before admission")
+
+        if not self.semaphore.locked():
+            # A free slot is taken without suspending, so concurrent arrivals see it as taken
+            await self.semaphore.acquire()
+        elif self.waiting >= self.max_queue:
+            return self._shed(path, "admission queue full")
+        else:
+            wait = self.queue_timeout
+            if deadline is not None:
+                wait = min(wait, deadline - time.time())
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout=max(wait, 0.0))
+            except asyncio.TimeoutError:
+                if deadline is not None and time.time() >= deadline:
+                    return self._expired(path, "while queued")
+                return self._shed(path, "queue wait timed out")
+            finally:
+                self.waiting -= 1
+
+        self.counts[path]["admitted"] += 1
+        self.in_flight += 1
+        token = _deadline.set(deadline)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _deadline.reset(token)
+            self.in_flight -= 1
+            self.semaphore.release()
+            self.service_seconds = 0.8 * self.service_seconds + 0.2 * (time.perf_counter() - started)
+        # Handlers that gave up on an expired deadline (raise_if_expired) answer 504
+        self.counts[path]["expired" if response.status_code == 504 else "completed"] += 1
+        return response
+
+    def metrics(self):
+        """Prometheus text lines: per-endpoint outcome counters and current load"""
+        lines = [
+            f'{self.service}_requests_total{{endpoint="{path}",outcome="{outcome}"}} {count}'
+            for path, counts in sorted(self.counts.items()) for outcome, count in counts.items()
+        ]
+        lines += [
+            f"{self.service}_requests_in_flight {self.in_flight}",
+            f"{self.service}_requests_queued {self.waiting}",
+            f"{self.service}_max_concurrency {self.max_concurrency}",
+        ]
+        return "\n".join(lines) + "\n"
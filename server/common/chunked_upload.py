@@ -0,0 +1,261 @@
+"""Resumable chunked uploads of session videos, staged as MinIO multipart parts.
+
+A client on a flaky mobile link creates one upload per video, PUTs its
+numbered chunks in any order (several at a time if it likes), asks which
+chunks are still missing after a reconnect and completes the upload once
+they are all in. Re-sending a chunk simply replaces it.
+
+Every chunk carries its own HMAC-SHA256 over the upload id, the chunk index
+and the chunk bytes, so a chunk cannot be replayed into another upload or
+position. It is verified on arrival and written straight to MinIO as
+multipart part ``index + 1``; the API buffers nothing beyond the chunk in
+flight. S3 needs every part but the last to be at least 5 MiB, so
+``chunk_size`` is at least ``MIN_CHUNK_SIZE`` and only the last chunk may
+be shorter.
+
+A plain SHA-256 of the video cannot be built from parts that arrive out of
+order, so the video checksum is a chunk manifest: the SHA-256 over the
+chunks' SHA-256 digests, concatenated in index order (``manifest_sha256``).
+Each chunk's digest is taken as it arrives, so completing an upload checks
+the manifest without reading the object back.
+
+Upload state lives in Redis, so any API process can take any chunk, and
+expires ``UPLOAD_TTL`` seconds after the last activity. Completing an
+upload holds a Redis lock keyed by the upload id, so a client retrying a
+complete that timed out waits for the first one and gets its result
+instead of assembling the object twice. Chunks count themselves in flight
+before checking that lock: a chunk arriving once a complete has started is
+refused, and the complete waits for the chunks already in flight, so the
+parts it assembles are the parts it read.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import time
+import uuid
+
+from minio.datatypes import Part
+from minio.error import S3Error
+from redis.exceptions import LockError
+
+PREFIX = "kyc:upload"
+
+MIN_CHUNK_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_CHUNKS = 10000  # S3 part numbers run from 1 to 10000
+
+UPLOAD_TTL = int(os.getenv("UPLOAD_TTL_SECONDS", "86400"))
+# Longest a complete may take (assembling up to MAX_CHUNKS parts), and so how long a concurrent one waits
+COMPLETE_TIMEOUT = int(os.getenv("UPLOAD_COMPLETE_TIMEOUT_SECONDS", "300"))
+
+HMAC_HEADER = "X-Chunk-HMAC"
+
+_INT_FIELDS = ["size", "chunk_size", "total_chunks", "completed"]
+
+
+class UploadNotFound(LookupError):
+    pass
+
+
+class UploadBusy(RuntimeError):
+    """Another request is still completing the upload"""
+
+
+def chunk_hmac(secret, upload_id, index, data):
+    """Base64 HMAC-SHA256 a client sends with chunk `index` of an upload"""
+    mac = hmac.new(secret, f"{upload_id}:{index}:".encode(), hashlib.sha256)
+    mac.update(data)
+    return base64.b64encode(mac.digest()).decode()
+
+
+def manifest_sha256(digests):
+    """Base64 SHA-256 over the raw SHA-256 digests of the chunks, in index order"""
+    return base64.b64encode(hashlib.sha256(b"".join(digests)).digest()).decode()
+
+
+class ChunkedUploads:
+    def __init__(self, redis_client, minio_client, bucket, secret):
+        self.redis = redis_client
+        self.minio = minio_client
+        self.bucket = bucket
+        self.secret = secret
+
+    @staticmethod
+    def _keys(upload_id):
+        return f"{PREFIX}:{upload_id}", f"{PREFIX}:{upload_id}:parts"
+
+    @staticmethod
+    def _lock_key(upload_id):
+        return f"{PREFIX}:{upload_id}:complete"
+
+    @staticmethod
+    def _inflight_key(upload_id):
+        return f"{PREFIX}:{upload_id}:inflight"
+
+    def create(self, object_name, size, chunk_size, sha256, **meta):
+        """Start a multipart upload of `size` bytes into object_name; returns (upload_id, total_chunks).
+
+        Extra keyword arguments are kept with the upload state and returned by ``state()``.
+        """
+        if size <= 0:
+            raise ValueError("Upload size must be positive")
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes")
+        total_chunks = -(-size // chunk_size)
+        if total_chunks > MAX_CHUNKS:
+            raise ValueError(f"Uploads are limited to {MAX_CHUNKS} chunks")
+        if not sha256:
+            raise ValueError("sha256 (chunk manifest checksum) is required")
+
+        upload_id = uuid.uuid4().hex
+        multipart_id = self.minio._create_multipart_upload(self.bucket, object_name, {})
+        key, _ = self._keys(upload_id)
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping={
+            "object_name": object_name,
+            "multipart_id": multipart_id,
+            "size": size,
+            "chunk_size": chunk_size,
+            "total_chunks": total_chunks,
+            "sha256": sha256,
+            "completed": 0,
+            **meta,
+        })
+        pipe.expire(key, UPLOAD_TTL)
+        pipe.execute()
+        return upload_id, total_chunks
+
+    def state(self, upload_id):
+        """Upload metadata as given to create(), plus total_chunks and completed"""
+        key, _ = self._keys(upload_id)
+        values = {field.decode(): value.decode() for field, value in self.redis.hgetall(key).items()}
+        if not values:
+            raise UploadNotFound(upload_id)
+        for field in _INT_FIELDS:
+            values[field] = int(values[field])
+        return values
+
+    def received(self, upload_id):
+        """{chunk index: (part etag, raw SHA-256 digest)} of the chunks stored so far"""
+        _, parts_key = self._keys(upload_id)
+        received = {}
+        for index, value in self.redis.hgetall(parts_key).items():
+            etag, _, digest = value.decode().partition("|")
+            received[int(index)] = (etag, bytes.fromhex(digest))
+        return received
+
+    def missing(self, upload_id):
+        """(state, sorted indices of the chunks not received yet)"""
+        state = self.state(upload_id)
+        if state["completed"]:
+            return state, []
+        received = self.received(upload_id)
+        return state, [index for index in range(state["total_chunks"]) if index not in received]
+
+    def put_chunk(self, upload_id, index, data, mac):
+        """Verify one chunk and store it as its multipart part; returns how many chunks are in.
+
+        Raises UploadBusy while the upload is being completed.
+        """
+        inflight = self._inflight_key(upload_id)
+        pipe = self.redis.pipeline()
+        pipe.incr(inflight)
+        pipe.expire(inflight, UPLOAD_TTL)
+        pipe.execute()
+        try:
+            # Counted in flight first, so a complete starting now waits for this chunk
+            if self.redis.exists(self._lock_key(upload_id)):
+                raise UploadBusy(upload_id)
+            return self._put_chunk(upload_id, index, data, mac)
+        finally:
+            self.redis.decr(inflight)
+
+    def _put_chunk(self, upload_id, index, data, mac):
+        state = self.state(upload_id)
+        if state["completed"]:
+            raise ValueError("Upload already completed")
+        total_chunks, chunk_size = state["total_chunks"], state["chunk_size"]
+        if not 0 <= index < total_chunks:
+            raise ValueError(f"Chunk index must be between 0 and {total_chunks - 1}")
+        expected_size = chunk_size if index < total_chunks - 1 else state["size"] - chunk_size * (total_chunks - 1)
+        if len(data) != expected_size:
+            raise ValueError(f"Chunk {index} must be {expected_size} bytes, got {len(data)}")
+        if not mac or not hmac.compare_digest(mac, chunk_hmac(self.secret, upload_id, index, data)):
+            raise ValueError(f"Chunk {index} HMAC verification failed")
+
+        digest = hashlib.sha256(data).digest()
+        etag = self.minio._upload_part(
+            self.bucket, state["object_name"], data, None, state["multipart_id"], index + 1
+        )
+        key, parts_key = self._keys(upload_id)
+        pipe = self.redis.pipeline()
+        pipe.hset(parts_key, index, f"{etag}|{digest.hex()}")
+        pipe.hlen(parts_key)
+        pipe.expire(parts_key, UPLOAD_TTL)
+        pipe.expire(key, UPLOAD_TTL)
+        return pipe.execute()[1]
+
+    def complete(self, upload_id):
+        """Assemble the object once every chunk is in and the manifest matches; returns the state.
+
+        A manifest mismatch aborts the multipart upload, and the video has to be uploaded again.
+        Completing an already completed upload returns its state unchanged; a complete running
+        concurrently waits for the first to finish and then does the same.
+        """
+        lock = self.redis.lock(self._lock_key(upload_id), timeout=COMPLETE_TIMEOUT, blocking_timeout=COMPLETE_TIMEOUT)
+        if not lock.acquire():
+            raise UploadBusy(upload_id)
+        try:
+            self._wait_for_chunks(upload_id)
+            return self._complete(upload_id)
+        finally:
+            try:
+                lock.release()
+            except LockError:  # Expired while completing; the state is already recorded
+                pass
+
+    def _wait_for_chunks(self, upload_id, poll=0.05):
+        """Wait until no chunk of the upload is being stored; new ones are refused while the lock is held"""
+        waited_until = time.monotonic() + COMPLETE_TIMEOUT
+        while int(self.redis.get(self._inflight_key(upload_id)) or 0) > 0:
+            if time.monotonic() > waited_until:
+                raise UploadBusy(upload_id)
+            time.sleep(poll)
+
+    def _complete(self, upload_id):
+        state, missing = self.missing(upload_id)
+        if state["completed"]:
+            return state
+        if missing:
+            raise ValueError(f"{len(missing)} of {state['total_chunks']} chunks are missing")
+
+        received = self.received(upload_id)
+        key, parts_key = self._keys(upload_id)
+        if manifest_sha256(received[index][1] for index in range(state["total_chunks"])) != state["sha256"]:
+            self.minio._abort_multipart_upload(self.bucket, state["object_name"], state["multipart_id"])
+            self.redis.delete(key, parts_key)
+            raise ValueError("Upload SHA-256 verification failed")
+
+        parts = [Part(index + 1, received[index][0]) for index in range(state["total_chunks"])]
+        try:
+            self.minio._complete_multipart_upload(self.bucket, state["object_name"], state["multipart_id"], parts)
+        except S3Error as e:
+            # Assembled by an earlier complete that failed before recording it
+            if e.code != "NoSuchUpload" or not self._exists(state["object_name"]):
+                raise
+        pipe = self.redis.pipeline()
+        pipe.hset(key, "completed", 1)
+        pipe.delete(parts_key)
+        pipe.execute()
+        state["completed"] = 1
+        return state
+
+    def _exists(self, object_name):
+        try:
+            self.minio.stat_object(self.bucket, object_name)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return False
+            raise
+        return True
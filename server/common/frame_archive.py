@@ -0,0 +1,185 @@
+"""Packed frame archive: every extracted frame of a session in a single object.
+
+Layout (little-endian)::
+
+    header   magic b"KFA1" | version u16 | reserved u16 | frame_count u32 | payload_offset u32
+    index    frame_count x (offset u64 | size u32 | frame_number u32 | timestamp_ms f64)
+    payload  JPEG bytes of every frame, back to back
+
+Header and index sit at the front of the object, so a reader gets the whole
+index with one small range read and then fetches only the frames it needs by
+byte range. Offsets are absolute from the start of the object. Nearby frames
+are fetched with one coalesced range read, or read from a node-local copy
+of the whole archive when the caller has a frame cache (common/frame_cache.py).
+"""
+import struct
+
+MAGIC = b"KFA1"
+VERSION = 1
+FORMAT = "kfa"
+
+HEADER = struct.Struct("<4sHHII")
+ENTRY = struct.Struct("<QIId")
+
+# First range read when the index is not known yet; covers ~170 frames
+INDEX_PREFETCH_BYTES = 4096
+# Requested frames separated by less than this are fetched with one range read
+COALESCE_GAP_BYTES = 256 * 1024
+
+
+def write_archive(fileobj, frames):
+    """Write frames as an archive to a binary file object.
+
+    ``frames`` is a list of ``(frame_number, timestamp_ms, jpeg_bytes)``.
+    Returns the index entries as dicts.
+    """
+    payload_offset = HEADER.size + ENTRY.size * len(frames)
+    entries = []
+    offset = payload_offset
+    for frame_number, timestamp_ms, data in frames:
+        entries.append({
+            "offset": offset,
+            "size": len(data),
+            "frame_number": int(frame_number),
+            "timestamp_ms": float(timestamp_ms),
+        })
+        offset += len(data)
+
+    fileobj.write(HEADER.pack(MAGIC, VERSION, 0, len(frames), payload_offset))
+    for entry in entries:
+        fileobj.write(ENTRY.pack(entry["offset"], entry["size"], entry["frame_number"], entry["timestamp_ms"]))
+    for _, _, data in frames:
+        fileobj.write(data)
+    return entries
+
+
+def parse_header(data):
+    """Return (frame_count, payload_offset) from the first bytes of an archive"""
+    if len(data) < HEADER.size:
+        raise ValueError("Frame archive header is truncated")
+    magic, version, _, frame_count, payload_offset = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a frame archive")
+    if version != VERSION:
+        raise ValueError(f"Unsupported frame archive version {version}")
+    return frame_count, payload_offset
+
+
+def parse_index(data):
+    """Parse the index entries from bytes starting at the archive header"""
+    frame_count, payload_offset = parse_header(data)
+    if len(data) < payload_offset:
+        raise ValueError("Frame archive index is truncated")
+    entries = []
+    for i in range(frame_count):
+        offset, size, frame_number, timestamp_ms = ENTRY.unpack_from(data, HEADER.size + i * ENTRY.size)
+        entries.append({"offset": offset, "size": size, "frame_number": frame_number, "timestamp_ms": timestamp_ms})
+    return entries
+
+
+def describe(bucket, key, entries, etag=None):
+    """Descriptor stored in FrameExtraction.frames_path: where the archive lives plus its index"""
+    descriptor = {
+        "format": FORMAT,
+        "version": VERSION,
+        "bucket": bucket,
+        "key": key,
+        "frame_count": len(entries),
+        "frames": [[e["offset"], e["size"], e["frame_number"], e["timestamp_ms"]] for e in entries],
+    }
+    if etag:
+        descriptor["etag"] = etag
+    return descriptor
+
+
+def frame_refs(descriptor, indices=None):
+    """Self-contained references to archive frames, as sent to the services"""
+    frames = descriptor["frames"]
+    if indices is None:
+        indices = range(len(frames))
+    # The ETag identifies this version of the archive in frame caches
+    version = {"etag": descriptor["etag"]} if descriptor.get("etag") else {}
+    return [
+        {
+            "bucket": descriptor["bucket"],
+            "key": descriptor["key"],
+            "index": i,
+            "offset": frames[i][0],
+            "size": frames[i][1],
+            "frame_number": frames[i][2],
+            "timestamp_ms": frames[i][3],
+            **version,
+        }
+        for i in indices
+    ]
+
+
+def _range_read(client, bucket, key, offset, length):
+    response = client.get_object(bucket, key, offset=offset, length=length)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def read_index(client, bucket, key):
+    """Fetch and parse the index of an archive with one (rarely two) range reads"""
+    data = _range_read(client, bucket, key, 0, INDEX_PREFETCH_BYTES)
+    _, payload_offset = parse_header(data)
+    if len(data) < payload_offset:
+        data += _range_read(client, bucket, key, len(data), payload_offset - len(data))
+    return parse_index(data)
+
+
+def coalesce_ranges(spans, max_gap=COALESCE_GAP_BYTES):
+    """Merge (offset, size) spans into as few read ranges as possible.
+
+    Returns a list of ``(start, end, members)`` where ``members`` are the
+    positions of the input spans covered by that range.
+    """
+    order = sorted(range(len(spans)), key=lambda i: spans[i][0])
+    ranges = []
+    for i in order:
+        offset, size = spans[i]
+        if ranges and offset - ranges[-1][1] <= max_gap:
+            start, end, members = ranges[-1]
+            ranges[-1] = (start, max(end, offset + size), members + [i])
+        else:
+            ranges.append((offset, offset + size, [i]))
+    return ranges
+
+
+def _local_read(path, offset, length):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def read_frame_refs(client, refs, max_gap=COALESCE_GAP_BYTES, cache=None):
+    """Fetch the JPEG bytes of each frame reference, in the order given.
+
+    With a frame cache, frames of archives identified by an ETag are read
+    from the node's local copy, which is downloaded whole on first use.
+    """
+    results = [None] * len(refs)
+    by_object = {}
+    for position, ref in enumerate(refs):
+        by_object.setdefault((ref["bucket"], ref["key"], ref.get("etag")), []).append(position)
+
+    for (bucket, key, etag), positions in by_object.items():
+        spans = [(refs[p]["offset"], refs[p]["size"]) for p in positions]
+        local_path = cache.fetch(client, bucket, key, etag) if cache is not None and etag else None
+        for start, end, members in coalesce_ranges(spans, max_gap):
+            data = None
+            if local_path:
+                try:
+                    data = _local_read(local_path, start, end - start)
+                except FileNotFoundError:  # Evicted meanwhile
+                    local_path = None
+            if data is None:
+                data = _range_read(client, bucket, key, start, end - start)
+            for member in members:
+                offset, size = spans[member]
+                results[positions[member]] = data[offset - start:offset - start + size]
+    return results
@@ -0,0 +1,107 @@
+"""Node-local disk cache of whole frame archives.
+
+The analysis services of one node (and the worker, when it runs there)
+share a cache directory (``FRAME_CACHE_DIR``). The first stage of a session
+to need one of its frame archives downloads the whole object once; later
+stages on the same node, hedged copies and retries read their frames from
+the local file instead of range-reading MinIO. The worker copies an archive
+it has just written straight into the cache when the session's home node
+(see worker/service_client.py) is its own, so no stage downloads it at all.
+
+Entries are keyed by bucket, key and ETag, so an archive rewritten when a
+session is reprocessed never serves stale frames. The least recently used
+entries are removed once the directory exceeds ``FRAME_CACHE_MAX_BYTES``.
+Hits and misses of this process are exported by ``metrics()``.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class FrameCache:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Cache configured by FRAME_CACHE_DIR and FRAME_CACHE_MAX_BYTES, or None when no directory is set"""
+        root = os.getenv("FRAME_CACHE_DIR")
+        if not root:
+            return None
+        return cls(root, int(os.getenv("FRAME_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
+
+    def path(self, bucket, key, etag):
+        digest = hashlib.sha256(f"{bucket}/{key}@{etag}".encode()).hexdigest()
+        return os.path.join(self.root, f"{digest}.kfa")
+
+    def get(self, bucket, key, etag):
+        """Local path of a cached archive, or None"""
+        path = self.path(bucket, key, etag)
+        try:
+            os.utime(path)  # Recency for eviction
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return path
+
+    def _store(self, path, write):
+        """Write an entry through a temporary file, so readers never see a partial archive"""
+        fd, partial = tempfile.mkstemp(dir=self.root, suffix=".partial")
+        os.close(fd)
+        try:
+            write(partial)
+            os.replace(partial, path)
+        except BaseException:
+            os.unlink(partial)
+            raise
+        self.evict()
+        return path
+
+    def put(self, bucket, key, etag, local_path):
+        """Copy a local archive into the cache"""
+        return self._store(self.path(bucket, key, etag), lambda partial: shutil.copyfile(local_path, partial))
+
+    def fetch(self, client, bucket, key, etag):
+        """Local path of the archive, downloading the whole object on a miss"""
+        return self.get(bucket, key, etag) or self._store(
+            self.path(bucket, key, etag), lambda partial: client.fget_object(bucket, key, partial)
+        )
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".kfa"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def metrics(self, service):
+        """Prometheus text lines: frame archive lookups served from the node's cache"""
+        return (
+            f'kyc_frame_cache_hits_total{{service="{service}"}} {self.hits}\n'
+            f'kyc_frame_cache_misses_total{{service="{service}"}} {self.misses}\n'
+        )
@@ -0,0 +1,67 @@
+"""Consistent hash ring mapping keys (session ids) to nodes.
+
+Every node is placed on a 64-bit ring at ``vnodes`` pseudo-random points
+(hashes of ``"<node>#<i>"``), and a key belongs to the first node point
+clockwise from the key's own hash. Adding or removing a node only moves
+the keys between that node's points and their predecessors, about 1/N of
+them; every other key keeps its node. ``preference()`` lists all nodes in
+ring order from a key, so callers fall back to the key's next node when its
+owner is unavailable.
+"""
+import bisect
+import hashlib
+
+DEFAULT_VNODES = 64
+
+
+def ring_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, nodes=(), vnodes=DEFAULT_VNODES):
+        self.vnodes = vnodes
+        self.points = []  # Sorted (hash, node)
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return node in self.nodes
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.vnodes):
+            bisect.insort(self.points, (ring_hash(f"{node}#{i}"), node))
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        self.points = [point for point in self.points if point[1] != node]
+
+    def owner(self, key):
+        """Node the key belongs to, or None on an empty ring"""
+        if not self.points:
+            return None
+        i = bisect.bisect(self.points, (ring_hash(key),))
+        return self.points[i % len(self.points)][1]
+
+    def preference(self, key):
+        """Every node once, in ring order starting with the key's owner"""
+        if not self.points:
+            return []
+        start = bisect.bisect(self.points, (ring_hash(key),))
+        order = []
+        for i in range(len(self.points)):
+            node = self.points[(start + i) % len(self.points)][1]
+            if node not in order:
+                order.append(node)
+                if len(order) == len(self.nodes):
+                    break
+        return order
@@ -0,0 +1,278 @@
+"""ICAO 9303 machine-readable zone parsing and check-digit validation.
+
+Supports TD1 (3 x 30), TD2 (2 x 36) and TD3 / passport (2 x 44) zones.
+Records of one format are validated together: the zone's lines are
+concatenated into one fixed-width row per record, characters are mapped to
+their ICAO values with a 256-entry lookup table, and every check digit of
+every record is computed with a single matrix product against a
+precomputed (record width x checks) weight table. Each column of that table
+holds the repeating 7-3-1 weights over the characters the check covers, and
+zero elsewhere.
+"""
+import json
+import string
+from datetime import date
+from operator import itemgetter
+
+import numpy as np
+
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
+    orjson = None
+
+FILLER = "<"
+
+# Character -> ICAO value: digits 0-9, A-Z 10-35, filler 0; anything else -1
+CHAR_VALUES = np.full(256, -1, dtype=np.int16)
+for _value, _char in enumerate(string.digits + string.ascii_uppercase):
+    CHAR_VALUES[ord(_char)] = _value
+CHAR_VALUES[ord(FILLER)] = 0
+
+_ZERO = ord("0")
+_FILLER = ord(FILLER)
+
+# Field slices are over the concatenated zone (line 2 starts at line_length)
+LAYOUTS = {
+    "TD1": {
+        "lines": 3,
+        "line_length": 30,
+        "fields": {
+            "type": (0, 2), "country": (2, 5), "number": (5, 14), "check_number": (14, 15),
+            "optional1": (15, 30), "birth_date": (30, 36), "check_birth": (36, 37), "sex": (37, 38),
+            "expiration_date": (38, 44), "check_expiration": (44, 45), "nationality": (45, 48),
+            "optional2": (48, 59), "check_composite": (59, 60), "names": (60, 90),
+        },
+        # check: (covered slices, check digit position, '<' allowed for an all-filler field)
+        "checks": {
+            "number": ([(5, 14)], 14, None),
+            "birth_date": ([(30, 36)], 36, None),
+            "expiration_date": ([(38, 44)], 44, None),
+            "composite": ([(5, 30), (30, 37), (38, 45), (48, 59)], 59, None),
+        },
+    },
+    "TD2": {
+        "lines": 2,
+        "line_length": 36,
+        "fields": {
+            "type": (0, 2), "country": (2, 5), "names": (5, 36), "number": (36, 45),
+            "check_number": (45, 46), "nationality": (46, 49), "birth_date": (49, 55),
+            "check_birth": (55, 56), "sex": (56, 57), "expiration_date": (57, 63),
+            "check_expiration": (63, 64), "optional1": (64, 71), "check_composite": (71, 72),
+        },
+        "checks": {
+            "number": ([(36, 45)], 45, None),
+            "birth_date": ([(49, 55)], 55, None),
+            "expiration_date": ([(57, 63)], 63, None),
+            "composite": ([(36, 46), (49, 56), (57, 71)], 71, None),
+        },
+    },
+    "TD3": {
+        "lines": 2,
+        "line_length": 44,
+        "fields": {
+            "type": (0, 2), "country": (2, 5), "names": (5, 44), "number": (44, 53),
+            "check_number": (53, 54), "nationality": (54, 57), "birth_date": (57, 63),
+            "check_birth": (63, 64), "sex": (64, 65), "expiration_date": (65, 71),
+            "check_expiration": (71, 72), "personal_number": (72, 86), "check_personal": (86, 87),
+            "check_composite": (87, 88),
+        },
+        "checks": {
+            "number": ([(44, 53)], 53, None),
+            "birth_date": ([(57, 63)], 63, None),
+            "expiration_date": ([(65, 71)], 71, None),
+            "personal_number": ([(72, 86)], 86, (72, 86)),
+            "composite": ([(44, 54), (57, 64), (65, 87)], 87, None),
+        },
+    },
+}
+
+FORMAT_BY_SHAPE = {(layout["lines"], layout["line_length"]): fmt for fmt, layout in LAYOUTS.items()}
+
+DOCUMENT_TYPES = {"P": "passport", "I": "id_card", "A": "id_card", "C": "id_card", "V": "visa"}
+SEXES = {"M": "Male", "F": "Female"}
+
+
+def _weight_table(layout):
+    """(record width, checks) float32 matrix of 7-3-1 weights; exact for sums far below 2**24"""
+    width = layout["lines"] * layout["line_length"]
+    table = np.zeros((width, len(layout["checks"])), dtype=np.float32)
+    for column, (slices, _, _) in enumerate(layout["checks"].values()):
+        positions = np.concatenate([np.arange(start, end) for start, end in slices])
+        table[positions, column] = np.resize(np.array([7, 3, 1], dtype=np.float32), positions.size)
+    return table
+
+
+for _layout in LAYOUTS.values():
+    _layout["width"] = _layout["lines"] * _layout["line_length"]
+    _layout["weights"] = _weight_table(_layout)
+    _layout["check_positions"] = np.array([pos for _, pos, _ in _layout["checks"].values()])
+    _layout["check_names"] = list(_layout["checks"])
+    _layout["field_names"] = list(_layout["fields"])
+    # Slices every field out of a record string in one C-level call
+    _layout["field_getter"] = itemgetter(*(slice(start, end) for start, end in _layout["fields"].values()))
+
+
+def check_digit(text):
+    """ICAO 9303 check digit of a string, as a character"""
+    values = CHAR_VALUES[np.frombuffer(text.encode("ascii", "replace"), dtype=np.uint8)]
+    weights = np.resize(np.array([7, 3, 1]), values.size)
+    return str(int(np.clip(values, 0, None) @ weights) % 10)
+
+
+def is_record(record):
+    """Whether a zone is newline-separated text or a list of lines"""
+    return isinstance(record, str) or (isinstance(record, list) and all(isinstance(line, str) for line in record))
+
+
+def split_record(record):
+    """Normalize one zone, given as newline-separated text or a list of lines, into stripped upper-case lines"""
+    lines = (record if isinstance(record, str) else "\n".join(record)).upper().split("\n")
+    lines = [line.strip() for line in lines]
+    return [line for line in lines if line] if "" in lines else lines
+
+
+def record_format(lines):
+    """TD1/TD2/TD3 from the shape of a zone, or None"""
+    lengths = set(map(len, lines))
+    if len(lengths) != 1:
+        return None
+    return FORMAT_BY_SHAPE.get((len(lines), lengths.pop()))
+
+
+def _split_names(names):
+    surname, _, given = names.partition("<<")
+    return surname.replace(FILLER, " ").strip(), given.replace(FILLER, " ").strip()
+
+
+def _validate_format(fmt, texts):
+    """Check every record of one format at once; returns charset_ok (records,) and passed (records, checks)"""
+    layout = LAYOUTS[fmt]
+    raw = np.frombuffer("".join(texts).encode("ascii", "replace"), dtype=np.uint8).reshape(len(texts), layout["width"])
+    values = CHAR_VALUES[raw]
+    charset_ok = (values >= 0).all(axis=1)
+
+    sums = (np.clip(values, 0, None).astype(np.float32) @ layout["weights"]).astype(np.int32) % 10
+    digits = raw[:, layout["check_positions"]]
+    passed = (digits >= _ZERO) & (digits <= _ZERO + 9) & (digits - _ZERO == sums)
+
+    for column, (_, _, filler_field) in enumerate(layout["checks"].values()):
+        if filler_field:
+            # An all-filler optional field may carry '<' instead of 0 as its check digit
+            start, end = filler_field
+            empty = (raw[:, start:end] == _FILLER).all(axis=1)
+            passed[:, column] |= empty & (digits[:, column] == _FILLER)
+
+    return charset_ok, passed
+
+
+def _td1_long_number(text):
+    """TD1 document numbers over 9 characters continue in optional1; returns (number, check_ok)"""
+    overflow = text[15:30].split(FILLER, 1)[0]
+    if not overflow:
+        return text[5:14], False
+    number = text[5:14] + overflow[:-1]
+    return number, check_digit(number) == overflow[-1]
+
+
+def parse_batch(records, fields=True):
+    """Parse and validate MRZ records.
+
+    ``records`` holds zones as newline-separated strings or lists of lines.
+    Returns one dict per record, in order, with ``format``, ``valid`` and
+    per-check results; with ``fields`` also the raw fields as ``mrz_data``.
+    Records that are not a string or a list of strings, or whose shape is not
+    TD1/TD2/TD3, get ``format=None`` and an ``error``.
+    """
+    results = [None] * len(records)
+    groups = {}
+    for i, record in enumerate(records):
+        if not is_record(record):
+            results[i] = {"format": None, "valid": False, "error": "a zone must be a string or a list of strings"}
+            continue
+        lines = split_record(record)
+        fmt = record_format(lines)
+        if fmt is None:
+            results[i] = {"format": None, "valid": False, "error": "not a TD1, TD2 or TD3 zone"}
+            continue
+        indices, texts = groups.setdefault(fmt, ([], []))
+        indices.append(i)
+        texts.append("".join(lines))
+
+    for fmt, (indices, texts) in groups.items():
+        layout = LAYOUTS[fmt]
+        charset_ok, passed = _validate_format(fmt, texts)
+        valid = charset_ok & passed.all(axis=1)
+        check_names, field_names, field_getter = layout["check_names"], layout["field_names"], layout["field_getter"]
+        check_rows = passed.tolist()
+        charset_list, valid_list = charset_ok.tolist(), valid.tolist()
+
+        for row, (i, text) in enumerate(zip(indices, texts)):
+            result = {
+                "format": fmt,
+                "valid": valid_list[row],
+                "charset_ok": charset_list[row],
+                "checks": dict(zip(check_names, check_rows[row])),
+            }
+            number = None
+            if fmt == "TD1" and text[14] == FILLER:
+                number, number_ok = _td1_long_number(text)
+                result["checks"]["number"] = number_ok
+                result["valid"] = charset_list[row] and all(result["checks"].values())
+            if fields:
+                data = dict(zip(field_names, field_getter(text)))
+                data["surname"], data["names"] = _split_names(data["names"])
+                if number is not None:
+                    data["number"] = number
+                result["mrz_data"] = data
+            results[i] = result
+    return results
+
+
+def parse_record(record):
+    """Parse and validate a single MRZ record"""
+    return parse_batch([record])[0]
+
+
+def to_ndjson(results):
+    """Encode parse results as newline-delimited JSON bytes, one record per line"""
+    if orjson is not None:
+        return b"".join(orjson.dumps(result, option=orjson.OPT_APPEND_NEWLINE) for result in results)
+    return "".join(json.dumps(result, separators=(",", ":")) + "\n" for result in results).encode()
+
+
+def _iso_date(yymmdd, future):
+    """YYMMDD -> ISO date; birth dates are placed in the past, expiry dates up to 50 years ahead"""
+    if not yymmdd.isdigit():
+        return None
+    year = int(yymmdd[:2])
+    today_yy = date.today().year % 100
+    century = 2000 if (year <= today_yy + 50 if future else year <= today_yy) else 1900
+    try:
+        return date(century + year, int(yymmdd[2:4]), int(yymmdd[4:6])).isoformat()
+    except ValueError:
+        return None
+
+
+def parsed_fields(mrz_data):
+    """Human-readable fields from a parsed record's mrz_data"""
+    return {
+        "document_type": DOCUMENT_TYPES.get(mrz_data["type"][0], "unknown"),
+        "issuing_country": mrz_data["country"].replace(FILLER, ""),
+        "document_number": mrz_data["number"].replace(FILLER, ""),
+        "surname": mrz_data["surname"],
+        "given_names": mrz_data["names"],
+        "nationality": mrz_data["nationality"].replace(FILLER, ""),
+        "date_of_birth": _iso_date(mrz_data["birth_date"], future=False),
+        "sex": SEXES.get(mrz_data["sex"], "Unspecified"),
+        "expiration_date": _iso_date(mrz_data["expiration_date"], future=True),
+    }
+
+
+def find_zone(lines):
+    """The trailing 2-3 lines of OCR output that form an MRZ, or None"""
+    for count in (3, 2):
+        tail = lines[-count:]
+        if len(tail) == count and record_format(tail):
+            return tail
+    return None
@@ -0,0 +1,155 @@
+"""Process-pool execution of CPU-bound inference inside a FastAPI service.
+
+Each pool process loads its own copy of the model once (``loader``), then
+serves inference calls. Image batches are not pickled: the request handler
+copies the frames into one shared memory block and the pool process maps
+them back as numpy views, so a call only ships the block name and the
+array layout. The handler awaits the result without blocking the event
+loop, keeping ``/health`` and ``/metrics`` responsive while every core is
+busy.
+
+Typical use::
+
+    pool = InferencePool(models.load_model)
+
+    @app.on_event("startup")
+    def start_pool():
+        pool.start()
+
+    result = await pool.run(models.analyze, frames, enable_rppg=True)
+
+``loader`` and the inference functions must be importable module-level
+functions: pool processes are spawned, not forked.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_model = None
+
+
+def resolve_processes(processes=None):
+    """INFERENCE_PROCESSES, or one process per CPU"""
+    if processes is None:
+        processes = int(os.getenv("INFERENCE_PROCESSES", "0"))
+    return processes if processes > 0 else (os.cpu_count() or 1)
+
+
+def pack_arrays(arrays):
+    """Copy arrays into one new shared memory block; returns (block, layout)"""
+    arrays = [np.ascontiguousarray(array) for array in arrays]
+    layout, offset = [], 0
+    for array in arrays:
+        layout.append((array.shape, array.dtype.str, offset))
+        offset += array.nbytes
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for array, (shape, dtype, start) in zip(arrays, layout):
+        np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)[...] = array
+    return block, layout
+
+
+def unpack_arrays(buf, layout):
+    """Numpy views onto a shared memory buffer described by `layout`"""
+    return [np.ndarray(shape, dtype=dtype, buffer=buf, offset=start) for shape, dtype, start in layout]
+
+
+def _init_process(loader):
+    global _model
+    _model = loader() if loader is not None else None
+
+
+def _invoke(fn, name, layout, kwargs):
+    """Run fn(model, arrays, **kwargs) in a pool process on arrays mapped from shared memory"""
+    # Spawned processes share the parent's resource tracker, which already
+    # tracks the block; the parent unlinks it when the call returns
+    block = shared_memory.SharedMemory(name=name)
+    arrays = unpack_arrays(block.buf, layout)
+    try:
+        return fn(_model, arrays, **kwargs)
+    finally:
+        del arrays
+        block.close()
+
+
+class SharedBatch:
+    """Frames copied into shared memory once and reused by several pool calls"""
+
+    def __init__(self, arrays):
+        self.block, self.layout = pack_arrays(arrays)
+
+    def close(self):
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InferencePool:
+    def __init__(self, loader=None, processes=None):
+        self.loader = loader
+        self.processes = resolve_processes(processes)
+        self.executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        """Spawn the pool processes and load one model copy in each"""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+                initargs=(self.loader,),
+            )
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def shared(self, arrays):
+        """Pack frames once for several run() calls; use as a context manager"""
+        return SharedBatch(arrays)
+
+    async def run(self, fn, arrays, **kwargs):
+        """Await fn(model, arrays, **kwargs) in a pool process.
+
+        ``arrays`` is a list of numpy arrays, or a SharedBatch from shared().
+        """
+        self.start()
+        batch = arrays if isinstance(arrays, SharedBatch) else SharedBatch(arrays)
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            result = await loop.run_in_executor(
+                self.executor, _invoke, fn, batch.block.name, batch.layout, kwargs
+            )
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            if batch is not arrays:
+                batch.close()
+        self.completed += 1
+        return result
+
+    def metrics(self, prefix):
+        """Prometheus text lines describing the pool"""
+        return (
+            f"{prefix}_inference_processes {self.processes}\n"
+            f"{prefix}_inference_in_flight {self.in_flight}\n"
+            f"{prefix}_inference_completed_total {self.completed}\n"
+            f"{prefix}_inference_failed_total {self.failed}\n"
+        )
@@ -0,0 +1,171 @@
+"""ONNX Runtime CPU inference for the analysis services' models.
+
+A model is an ONNX file ``<name>.onnx`` under ``ONNX_MODEL_DIR``, run with
+the CPU execution provider and full graph optimization. Thread counts
+come from ``ONNX_INTRA_OP_THREADS`` (default: the CPUs left to each
+inference pool process, see common/inference_pool.py, so the pool does not
+oversubscribe the cores) and ``ONNX_INTER_OP_THREADS`` (default 1: operators
+run one after the other; more runs independent branches in parallel).
+
+``INFERENCE_PRECISION=int8`` loads ``<name>.int8.onnx`` instead, written
+by ``scripts/benchmark_onnx.py calibrate``: either statically quantized
+(QDQ, per-channel weights) with activation ranges calibrated on frames
+from sample videos, or dynamically quantized (int8 weights, activations
+quantized at run time) without calibration data. Services fall back to
+fp32 when no int8 file exists, and to their mock models when onnxruntime
+or the fp32 file is missing.
+
+Image classifiers take an NCHW float batch of RGB frames normalized with
+the ImageNet statistics and output, per frame, either [spoof, live] logits
+or a single live logit; ``ImageClassifier.scores()`` turns them into live
+probabilities.
+"""
+import os
+
+import cv2
+import numpy as np
+
+from common.inference_pool import resolve_processes
+
+try:
+    import onnxruntime as ort
+except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
+    ort = None
+
+MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "/app/onnx_models")
+PRECISIONS = ["fp32", "int8"]
+
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+DEFAULT_INPUT_SIZE = 224
+MAX_BATCH = 32
+
+
+def model_path(name, precision="fp32", model_dir=None):
+    suffix = ".onnx" if precision == "fp32" else f".{precision}.onnx"
+    return os.path.join(model_dir or MODEL_DIR, name + suffix)
+
+
+def _env_threads(name, default):
+    value = int(os.getenv(name, "0"))
+    return value if value > 0 else default
+
+
+def session_options(intra_op_threads=None, inter_op_threads=None):
+    """CPU session options; threads default to ONNX_*_OP_THREADS, then to the pool process's share of the CPUs"""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = intra_op_threads or _env_threads(
+        "ONNX_INTRA_OP_THREADS", max(1, (os.cpu_count() or 1) // resolve_processes())
+    )
+    options.inter_op_num_threads = inter_op_threads or _env_threads("ONNX_INTER_OP_THREADS", 1)
+    if options.inter_op_num_threads > 1:
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    return options
+
+
+class OnnxModel:
+    def __init__(self, path, intra_op_threads=None, inter_op_threads=None):
+        if ort is None:
+            raise RuntimeError("onnxruntime is not installed")
+        self.path = path
+        self.session = ort.InferenceSession(
+            path, sess_options=session_options(intra_op_threads, inter_op_threads),
+            providers=["CPUExecutionProvider"],
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = model_input.shape
+
+    def run(self, batch):
+        """First output of the model for one input batch"""
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class ImageClassifier(OnnxModel):
+    """Per-frame live probability from an NCHW image classifier"""
+
+    @property
+    def input_size(self):
+        height, width = self.input_shape[2:4]
+        if isinstance(height, int) and isinstance(width, int):
+            return width, height
+        return DEFAULT_INPUT_SIZE, DEFAULT_INPUT_SIZE
+
+    def preprocess(self, frames):
+        """BGR or grayscale uint8 frames -> normalized float32 NCHW batch"""
+        batch = []
+        for frame in frames:
+            if frame.ndim == 2:
+                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+            rgb = cv2.cvtColor(cv2.resize(frame, self.input_size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+            batch.append((rgb.astype(np.float32) / 255.0 - IMAGENET_MEAN) / IMAGENET_STD)
+        return np.ascontiguousarray(np.stack(batch).transpose(0, 3, 1, 2))
+
+    def scores(self, frames):
+        """Live probability of every frame"""
+        results = []
+        for start in range(0, len(frames), MAX_BATCH):
+            logits = np.asarray(self.run(self.preprocess(frames[start:start + MAX_BATCH])), dtype=np.float32)
+            logits = logits.reshape(len(logits), -1)
+            if logits.shape[1] == 1:
+                results.append(1.0 / (1.0 + np.exp(-logits[:, 0])))
+            else:
+                shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+                results.append(shifted[:, 1] / shifted.sum(axis=1))
+        return np.concatenate(results) if results else np.zeros(0, dtype=np.float32)
+
+
+def load(name, precision=None, model_dir=None, cls=OnnxModel, **threads):
+    """Model `name` at INFERENCE_PRECISION (or `precision`), or None when onnxruntime or the model is missing"""
+    if ort is None:
+        return None
+    precision = precision or os.getenv("INFERENCE_PRECISION", "fp32")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown inference precision {precision!r}, expected one of {PRECISIONS}")
+    path = model_path(name, precision, model_dir)
+    if precision != "fp32" and not os.path.exists(path):
+        print(f"[onnx] No {precision} model at {path}, using fp32")
+        path = model_path(name, "fp32", model_dir)
+    if not os.path.exists(path):
+        return None
+    return cls(path, **threads)
+
+
+def quantize_dynamic(src, dst):
+    """int8 weights, activations quantized at run time; needs no calibration data"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic as quantize
+
+    quantize(src, dst, weight_type=QuantType.QInt8)
+    return dst
+
+
+def quantize_static(src, dst, batches, per_channel=True):
+    """int8 QDQ model with activation ranges calibrated on `batches` (model input arrays)"""
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static as quantize
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    input_name = ort.InferenceSession(src, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(batches)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {input_name: batch}
+
+    # Shape inference and graph cleanup first, as the quantizer expects
+    prepared = dst + ".prep.onnx"
+    quant_pre_process(src, prepared)
+    try:
+        quantize(
+            prepared, dst, Reader(),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+        )
+    finally:
+        os.unlink(prepared)
+    return dst
@@ -0,0 +1,52 @@
+"""Perceptual hashing of frames.
+
+A 64-bit DCT hash: the image is reduced to 32x32 grayscale, transformed with
+a 2-D DCT, and the 8x8 lowest-frequency coefficients are compared with their
+median. Frames that look alike (same document, small shifts, lighting or
+compression changes) get hashes a few bits apart, so near-duplicates are
+found by Hamming distance.
+"""
+import cv2
+import numpy as np
+
+HASH_BITS = 64
+
+# Hashes this close are treated as the same content (about 15% of bits)
+DEFAULT_MAX_DISTANCE = 10
+
+
+def phash(image):
+    """64-bit perceptual hash of a BGR or grayscale image, as an int"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    # The DC term only encodes overall brightness; leave it out of the median
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    """Number of differing bits between two hashes"""
+    return (a ^ b).bit_count()
+
+
+def to_signed(value):
+    """Hash as a signed 64-bit int, for BIGINT columns"""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def dedupe(hashes, max_distance=DEFAULT_MAX_DISTANCE):
+    """Greedily group near-duplicate hashes in the given order.
+
+    Returns ``[(representative index, [member indices])]``; the first hash of
+    each group is its representative, so pass hashes best-first.
+    """
+    groups = []
+    for i, value in enumerate(hashes):
+        for representative, members in groups:
+            if hamming(hashes[representative], value) <= max_distance:
+                members.append(i)
+                break
+        else:
+            groups.append((i, [i]))
+    return groups
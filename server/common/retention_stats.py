@@ -0,0 +1,43 @@
+"""Counters of the storage retention tasks and worker scratch usage, kept in Redis.
+
+The worker's retention tasks (worker/retention.py) count deleted objects and
+bytes per artifact, and worker processes report their host's scratch space
+after every run (worker/scratch.py); the API exports both on ``/metrics``.
+"""
+import time
+
+PREFIX = "kyc:retention"
+
+COUNTERS = ["objects_deleted", "bytes_deleted", "delete_errors"]
+
+
+class RetentionStats:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    def record(self, artifact, **counts):
+        """Add counts for one artifact kind (frames, proxies, videos, orphans, uploads)"""
+        pipe = self.redis.pipeline()
+        for name, value in counts.items():
+            pipe.hincrby(PREFIX, f"{name}|{artifact}", value)
+        pipe.hset(PREFIX, f"last_run|{artifact}", round(time.time(), 3))
+        pipe.execute()
+
+    def set_scratch(self, host, directories, size):
+        self.redis.hset(f"{PREFIX}:scratch", mapping={f"directories|{host}": directories, f"bytes|{host}": size})
+
+    def metrics(self):
+        """Prometheus text lines: deletions per artifact and scratch space per worker host"""
+        lines = []
+        values = {key.decode(): value.decode() for key, value in self.redis.hgetall(PREFIX).items()}
+        for field, value in sorted(values.items()):
+            name, _, artifact = field.partition("|")
+            if name in COUNTERS:
+                lines.append(f'kyc_retention_{name}_total{{artifact="{artifact}"}} {value}')
+            elif name == "last_run":
+                lines.append(f'kyc_retention_last_run_timestamp_seconds{{artifact="{artifact}"}} {value}')
+        scratch = {key.decode(): value.decode() for key, value in self.redis.hgetall(f"{PREFIX}:scratch").items()}
+        for field, value in sorted(scratch.items()):
+            name, _, host = field.partition("|")
+            lines.append(f'kyc_worker_scratch_{name}{{host="{host}"}} {value}')
+        return "\n".join(lines) + "\n" if lines else ""
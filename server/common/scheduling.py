@@ -0,0 +1,155 @@
+"""Earliest-deadline-first scheduling of KYC sessions across priority tiers.
+
+Each session is given an SLA deadline when it is ingested and waits in a
+Redis sorted set for its tier, scored by that deadline. Tiers are served
+in strict priority order (interactive app flows before bulk back-office
+re-verification), earliest deadline first within a tier. A session that is
+still queued long after its deadline (more than ``DEMOTE_AFTER`` times its
+SLA past it) is hopeless: it is moved to the ``late`` tier, which is only
+served when the others are empty, so it cannot starve fresh work.
+
+Sessions are not bound to Celery messages. The API enqueues the session
+and sends one interchangeable dispatch token per session; whichever worker
+runs a token pops the most urgent session at that moment. Queue wait per
+tier is kept as a histogram in Redis and exported by ``metrics()``.
+
+Typical use::
+
+    scheduler = SessionScheduler(redis_client)
+    scheduler.enqueue(session_id, "interactive")    # API
+    entry = scheduler.pop_next()                    # worker
+"""
+import os
+import time
+from collections import namedtuple
+
+LATE_TIER = "late"
+
+# Seconds from ingest to the SLA deadline, in priority order (interactive: the 8 s end-to-end latency KPI)
+SLA_SECONDS = {
+    "interactive": float(os.getenv("SCHEDULER_SLA_INTERACTIVE", "8")),
+    "bulk": float(os.getenv("SCHEDULER_SLA_BULK", "86400")),
+}
+TIERS = list(SLA_SECONDS)
+DEFAULT_TIER = TIERS[0]
+
+# Queued sessions this many SLAs past their deadline are demoted to the late tier
+DEMOTE_AFTER = float(os.getenv("SCHEDULER_DEMOTE_AFTER", "1.0"))
+
+# Upper bounds of the queue wait histogram buckets, in seconds
+WAIT_BUCKETS = [1, 5, 15, 60, 300, 900, 3600, 14400, 86400]
+
+PREFIX = "kyc:sched"
+
+QueuedSession = namedtuple("QueuedSession", ["session_id", "tier", "queue", "deadline", "enqueued_at", "attempts"])
+
+# KEYS: tier queues in priority order, then the late queue, the session metadata hash and the stats hash
+# ARGV: now, then the demotion cutoff (seconds past the deadline) of each tier queue
+_POP_NEXT = """
+local now = tonumber(ARGV[1])
+local late_index = #KEYS - 2
+local late, sessions, stats = KEYS[late_index], KEYS[#KEYS - 1], KEYS[#KEYS]
+for i = 1, late_index - 1 do
+    local overdue = redis.call('ZRANGEBYSCORE', KEYS[i], '-inf', now - tonumber(ARGV[i + 1]), 'WITHSCORES', 'LIMIT', 0, 100)
+    for j = 1, #overdue, 2 do
+        redis.call('ZREM', KEYS[i], overdue[j])
+        redis.call('ZADD', late, overdue[j + 1], overdue[j])
+        redis.call('HINCRBY', stats, 'demoted', 1)
+    end
+end
+for i = 1, late_index do
+    local head = redis.call('ZPOPMIN', KEYS[i])
+    if #head > 0 then
+        local meta = redis.call('HGET', sessions, head[1])
+        redis.call('HDEL', sessions, head[1])
+        return {i, head[1], head[2], meta}
+    end
+end
+return nil
+"""
+
+
+def queue_key(tier):
+    return f"{PREFIX}:queue:{tier}"
+
+
+def _wait_key(tier):
+    return f"{PREFIX}:wait:{tier}"
+
+
+class SessionScheduler:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.queues = TIERS + [LATE_TIER]
+        self.sessions_key = f"{PREFIX}:sessions"
+        self.stats_key = f"{PREFIX}:stats"
+        self._pop_next = redis_client.register_script(_POP_NEXT)
+
+    def enqueue(self, session_id, tier=DEFAULT_TIER, deadline=None, attempts=0, enqueued_at=None):
+        """Queue a session under its tier; the deadline defaults to now plus the tier's SLA"""
+        if tier not in SLA_SECONDS:
+            raise ValueError(f"Unknown priority tier: {tier}")
+        enqueued_at = enqueued_at or time.time()
+        deadline = deadline or enqueued_at + SLA_SECONDS[tier]
+        pipe = self.redis.pipeline()
+        pipe.hset(self.sessions_key, session_id, f"{tier}|{enqueued_at}|{attempts}")
+        pipe.zadd(queue_key(tier), {session_id: deadline})
+        pipe.execute()
+        return deadline
+
+    def requeue(self, entry):
+        """Put a popped session back with its original tier, deadline and ingest time, one attempt on"""
+        return self.enqueue(entry.session_id, entry.tier, entry.deadline, entry.attempts + 1, entry.enqueued_at)
+
+    def pop_next(self, now=None):
+        """Demote hopeless sessions, then remove and return the most urgent one (or None)"""
+        cutoffs = [DEMOTE_AFTER * SLA_SECONDS[tier] for tier in TIERS]
+        keys = [queue_key(queue) for queue in self.queues] + [self.sessions_key, self.stats_key]
+        head = self._pop_next(keys=keys, args=[now or time.time()] + cutoffs)
+        if head is None:
+            return None
+        index, session_id, deadline, meta = head
+        queue = self.queues[index - 1]
+        tier, enqueued_at, attempts = (meta.decode() if meta else f"{queue}|{deadline}|0").split("|")
+        return QueuedSession(session_id.decode(), tier, queue, float(deadline), float(enqueued_at), int(attempts))
+
+    def record_wait(self, queue, seconds):
+        """Add one dispatched session's queue wait to the histogram of the queue it left"""
+        pipe = self.redis.pipeline()
+        for bound in WAIT_BUCKETS:
+            if seconds <= bound:
+                pipe.hincrby(_wait_key(queue), str(bound), 1)
+        pipe.hincrby(_wait_key(queue), "count", 1)
+        pipe.hincrbyfloat(_wait_key(queue), "sum", seconds)
+        pipe.execute()
+
+    def metrics(self, now=None):
+        """Prometheus text lines: per-tier queue depth, overdue sessions and queue wait histogram"""
+        now = now or time.time()
+        pipe = self.redis.pipeline()
+        for queue in self.queues:
+            pipe.zcard(queue_key(queue))
+            pipe.zcount(queue_key(queue), "-inf", now)
+            pipe.hgetall(_wait_key(queue))
+        pipe.hget(self.stats_key, "demoted")
+        replies = pipe.execute()
+
+        lines = []
+        for i, queue in enumerate(self.queues):
+            depth, overdue, wait = replies[3 * i: 3 * i + 3]
+            wait = {key.decode(): float(value) for key, value in wait.items()}
+            lines += [
+                f'kyc_queue_depth{{tier="{queue}"}} {depth}',
+                f'kyc_queue_overdue{{tier="{queue}"}} {overdue}',
+            ]
+            lines += [
+                f'kyc_queue_wait_seconds_bucket{{tier="{queue}",le="{bound}"}} {int(wait.get(str(bound), 0))}'
+                for bound in WAIT_BUCKETS
+            ]
+            lines += [
+                f'kyc_queue_wait_seconds_bucket{{tier="{queue}",le="+Inf"}} {int(wait.get("count", 0))}',
+                f'kyc_queue_wait_seconds_sum{{tier="{queue}"}} {wait.get("sum", 0.0)}',
+                f'kyc_queue_wait_seconds_count{{tier="{queue}"}} {int(wait.get("count", 0))}',
+            ]
+        lines.append(f"kyc_queue_demoted_total {int(replies[-1] or 0)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,60 @@
+"""Encoding of the documents passed between the API, the worker and the services.
+
+JSON goes through orjson when it is installed (several times faster than
+the stdlib encoder, compact, and it understands numpy scalars and arrays);
+stdlib json with compact separators is the fallback. Service responses use
+the matching FastAPI response class (``response_class()``) and the worker
+encodes request bodies and decodes responses with ``dumps``/``loads``.
+
+Celery messages are msgpack when msgpack is installed, with JSON still
+accepted so messages queued by an older API or worker drain during a
+rollout. No component reads task return values, so results are not stored
+in Redis (``CELERY_SETTINGS``).
+
+Values for JSON columns are stored as they are: the columns are JSONB, and
+encoding a value before assigning it would store a JSON string instead of
+an object.
+"""
+import json
+
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
+    orjson = None
+
+try:
+    import msgpack
+except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
+    msgpack = None
+
+JSON_CONTENT_TYPE = "application/json"
+
+CELERY_SERIALIZER = "msgpack" if msgpack is not None else "json"
+
+CELERY_SETTINGS = {
+    "task_serializer": CELERY_SERIALIZER,
+    "result_serializer": CELERY_SERIALIZER,
+    "accept_content": sorted({CELERY_SERIALIZER, "json"}),
+    "task_ignore_result": True,
+    "result_expires": 3600,  # For tasks that opt in with ignore_result=False
+}
+
+
+def dumps(value):
+    """Compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def response_class():
+    """FastAPI response class encoding with orjson when available"""
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    return ORJSONResponse if orjson is not None else JSONResponse
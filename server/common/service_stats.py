@@ -0,0 +1,43 @@
+"""Counters of the worker's calls to the analysis services, kept in Redis.
+
+Worker processes record every call per service and replica, every hedged
+call and hedge win, and whether a session's call was served by its home
+node (see worker/service_client.py); the API exports the totals on
+``/metrics``, like the scheduler's queue statistics. The affinity hit rate
+is ``affinity_home / (affinity_home + affinity_fallback)``.
+"""
+PREFIX = "kyc:services"
+
+REPLICA_COUNTERS = ["requests", "errors"]
+SERVICE_COUNTERS = ["hedged", "hedge_wins", "affinity_home", "affinity_fallback"]
+
+
+class ServiceStats:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    def record(self, service, replica=None, **counts):
+        """Add counts for a service, or for one of its replicas when `replica` is given"""
+        pipe = self.redis.pipeline()
+        pipe.sadd(PREFIX, service)
+        for name, value in counts.items():
+            field = f"{name}|{replica}" if replica else name
+            pipe.hincrby(f"{PREFIX}:{service}", field, value)
+        pipe.execute()
+
+    def set_hedge_delay(self, service, seconds):
+        self.redis.hset(f"{PREFIX}:{service}", "hedge_delay_seconds", seconds)
+
+    def metrics(self):
+        """Prometheus text lines: calls and errors per replica, hedges, hedge wins and home node calls per service"""
+        lines = []
+        for service in sorted(name.decode() for name in self.redis.smembers(PREFIX)):
+            values = {key.decode(): value.decode() for key, value in self.redis.hgetall(f"{PREFIX}:{service}").items()}
+            for field, value in sorted(values.items()):
+                name, _, replica = field.partition("|")
+                if name in REPLICA_COUNTERS:
+                    lines.append(f'kyc_service_{name}_total{{service="{service}",replica="{replica}"}} {value}')
+            lines += [f'kyc_service_{name}_total{{service="{service}"}} {values.get(name, 0)}' for name in SERVICE_COUNTERS]
+            if "hedge_delay_seconds" in values:
+                lines.append(f'kyc_service_hedge_delay_seconds{{service="{service}"}} {values["hedge_delay_seconds"]}')
+        return "\n".join(lines) + "\n" if lines else ""
@@ -0,0 +1,105 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+Databases created before migrations were introduced already have these
+tables; mark them with `alembic -c db/alembic.ini stamp 0001` instead of
+running this revision.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+RESULT_TABLES = [
+    'frame_extractions',
+    'pad_results',
+    'deepfake_results',
+    'face_match_results',
+    'ocr_results',
+    'mrz_results',
+    'doc_liveness_results',
+    'risk_scores',
+]
+
+
+def _result_table(name, *columns):
+    op.create_table(
+        name,
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('session_id', sa.Integer(), sa.ForeignKey('kyc_sessions.id')),
+        *columns,
+        sa.Column('created_at', sa.DateTime()),
+    )
+    op.create_index(f'ix_{name}_id', name, ['id'])
+
+
+def upgrade():
+    op.create_table(
+        'kyc_sessions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('session_id', sa.String()),
+        sa.Column('selfie_video_path', sa.String()),
+        sa.Column('id_video_path', sa.String()),
+        sa.Column('status', sa.String()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+    )
+    op.create_index('ix_kyc_sessions_id', 'kyc_sessions', ['id'])
+    op.create_index('ix_kyc_sessions_session_id', 'kyc_sessions', ['session_id'], unique=True)
+
+    _result_table(
+        'frame_extractions',
+        sa.Column('frames_path', sa.String()),
+        sa.Column('frame_count', sa.Integer()),
+    )
+    for name in ['pad_results', 'deepfake_results', 'doc_liveness_results']:
+        _result_table(
+            name,
+            sa.Column('score', sa.Float()),
+            sa.Column('threshold', sa.Float()),
+            sa.Column('passed', sa.Integer()),
+            sa.Column('details', sa.JSON()),
+        )
+    _result_table(
+        'face_match_results',
+        sa.Column('cosine_similarity', sa.Float()),
+        sa.Column('threshold', sa.Float()),
+        sa.Column('passed', sa.Integer()),
+        sa.Column('face_image_path', sa.String()),
+        sa.Column('id_photo_path', sa.String()),
+        sa.Column('details', sa.JSON()),
+    )
+    _result_table(
+        'ocr_results',
+        sa.Column('extracted_text', sa.String()),
+        sa.Column('confidence', sa.Float()),
+        sa.Column('document_type', sa.String()),
+        sa.Column('details', sa.JSON()),
+    )
+    _result_table(
+        'mrz_results',
+        sa.Column('mrz_data', sa.JSON()),
+        sa.Column('parsed_fields', sa.JSON()),
+        sa.Column('valid', sa.Integer()),
+        sa.Column('details', sa.JSON()),
+    )
+    _result_table(
+        'risk_scores',
+        sa.Column('overall_score', sa.Float()),
+        sa.Column('risk_level', sa.String()),
+        sa.Column('component_scores', sa.JSON()),
+        sa.Column('weights', sa.JSON()),
+        sa.Column('decision', sa.String()),
+    )
+
+
+def downgrade():
+    for name in reversed(RESULT_TABLES):
+        op.drop_table(name)
+    op.drop_table('kyc_sessions')
@@ -0,0 +1,111 @@
+"""Index filter/join columns and partition sessions and results by month
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+
+kyc_sessions and every result table become RANGE-partitioned on created_at
+with one partition per month (plus a default partition). Postgres requires
+the partition key in every unique constraint, so primary keys become
+(id, created_at), kyc_sessions.session_id is indexed but no longer unique at
+the database level (it is a random UUID), and the session_id foreign keys are
+dropped because a partitioned kyc_sessions has no unique key on id alone.
+The ORM still declares them for joins.
+
+Also adds risk_scores.version, introduced for re-scoring runs.
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from db.partitions import PARTITIONED_TABLES, add_months, create_default_partition, ensure_partitions
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+RESULT_TABLES = [table for table in PARTITIONED_TABLES if table != 'kyc_sessions']
+MONTHS_AHEAD = 3
+
+
+def _rename_to_legacy(table):
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+    op.execute(f"ALTER TABLE {table}_legacy RENAME CONSTRAINT {table}_pkey TO {table}_legacy_pkey")
+    op.execute(f"ALTER INDEX IF EXISTS ix_{table}_id RENAME TO ix_{table}_legacy_id")
+    op.execute(f"UPDATE {table}_legacy SET created_at = timezone('utc', now()) WHERE created_at IS NULL")
+
+
+def _create_partitioned(table):
+    op.execute(f"CREATE TABLE {table} (LIKE {table}_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    op.execute(
+        f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL, "
+        f"ALTER COLUMN created_at SET DEFAULT timezone('utc', now())"
+    )
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)")
+
+
+def _move_rows(table):
+    op.execute(f"INSERT INTO {table} SELECT * FROM {table}_legacy")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+
+def upgrade():
+    op.add_column('risk_scores', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+    op.execute("ALTER INDEX ix_kyc_sessions_session_id RENAME TO ix_kyc_sessions_legacy_session_id")
+    for table in PARTITIONED_TABLES:
+        _rename_to_legacy(table)
+        _create_partitioned(table)
+
+    conn = op.get_bind()
+    oldest = conn.execute(sa.text(
+        "SELECT min(m) FROM (" + " UNION ALL ".join(
+            f"SELECT min(created_at) AS m FROM {table}_legacy" for table in PARTITIONED_TABLES
+        ) + ") AS mins"
+    )).scalar() or datetime.utcnow()
+    ensure_partitions(conn, oldest, add_months(datetime.utcnow().date(), MONTHS_AHEAD))
+    for table in PARTITIONED_TABLES:
+        create_default_partition(conn, table)
+
+    for table in PARTITIONED_TABLES:
+        _move_rows(table)
+    for table in RESULT_TABLES + ['kyc_sessions']:
+        op.execute(f"DROP TABLE {table}_legacy CASCADE")
+
+    # Indexes on the partitioned parents cascade to every partition
+    op.create_index('ix_kyc_sessions_session_id', 'kyc_sessions', ['session_id'])
+    op.create_index('ix_kyc_sessions_status_created_at', 'kyc_sessions', ['status', 'created_at'])
+    op.create_index('ix_kyc_sessions_created_at', 'kyc_sessions', ['created_at'])
+    for table in RESULT_TABLES:
+        op.create_index(f'ix_{table}_session_id', table, ['session_id'])
+
+    # Fresh statistics so the planner prunes partitions and picks the new indexes
+    for table in PARTITIONED_TABLES:
+        op.execute(f"ANALYZE {table}")
+
+
+def downgrade():
+    for table in RESULT_TABLES:
+        op.drop_index(f'ix_{table}_session_id', table_name=table)
+    op.drop_index('ix_kyc_sessions_created_at', table_name='kyc_sessions')
+    op.drop_index('ix_kyc_sessions_status_created_at', table_name='kyc_sessions')
+    op.drop_index('ix_kyc_sessions_session_id', table_name='kyc_sessions')
+
+    for table in PARTITIONED_TABLES:
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+        op.execute(f"ALTER TABLE {table}_partitioned RENAME CONSTRAINT {table}_pkey TO {table}_partitioned_pkey")
+        op.execute(f"CREATE TABLE {table} (LIKE {table}_partitioned INCLUDING DEFAULTS)")
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at DROP NOT NULL, ALTER COLUMN created_at DROP DEFAULT")
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_partitioned")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        op.execute(f"DROP TABLE {table}_partitioned CASCADE")
+        op.create_index(f'ix_{table}_id', table, ['id'])
+
+    op.create_index('ix_kyc_sessions_session_id', 'kyc_sessions', ['session_id'], unique=True)
+    for table in RESULT_TABLES:
+        op.create_foreign_key(f'{table}_session_id_fkey', table, 'kyc_sessions', ['session_id'], ['id'])
+
+    op.drop_column('risk_scores', 'version')
@@ -0,0 +1,98 @@
+"""Add the session_summary read model
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+
+One row per session with its status, component scores, pass flags, latest
+risk decision and per-stage timings, so outcome lookups are a single indexed
+row fetch instead of a join over seven result tables. The table is not
+partitioned; session_id is unique again here. Existing sessions are
+backfilled from the result tables (the most recent row of each, and the
+latest RiskScore version); stage timings are only recorded going forward.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def _latest(table, columns, order="id DESC"):
+    """Join the newest row of a result table per session"""
+    return (
+        f"LEFT JOIN (SELECT DISTINCT ON (session_id) session_id, {columns} FROM {table} "
+        f"ORDER BY session_id, {order}) AS {table} ON {table}.session_id = s.id"
+    )
+
+
+def upgrade():
+    op.create_table(
+        'session_summary',
+        sa.Column('session_pk', sa.Integer(), primary_key=True),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('status', sa.String()),
+        sa.Column('attack_type', sa.String()),
+        sa.Column('attack_variation', sa.String()),
+        sa.Column('frame_count', sa.Integer()),
+        sa.Column('pad_score', sa.Float()),
+        sa.Column('pad_passed', sa.Integer()),
+        sa.Column('deepfake_score', sa.Float()),
+        sa.Column('deepfake_passed', sa.Integer()),
+        sa.Column('face_match_score', sa.Float()),
+        sa.Column('face_match_passed', sa.Integer()),
+        sa.Column('doc_liveness_score', sa.Float()),
+        sa.Column('doc_liveness_passed', sa.Integer()),
+        sa.Column('ocr_confidence', sa.Float()),
+        sa.Column('document_type', sa.String()),
+        sa.Column('mrz_valid', sa.Integer()),
+        sa.Column('overall_score', sa.Float()),
+        sa.Column('risk_level', sa.String()),
+        sa.Column('decision', sa.String()),
+        sa.Column('risk_version', sa.Integer()),
+        sa.Column('stage_timings', sa.JSON()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('completed_at', sa.DateTime()),
+    )
+    op.create_index('ix_session_summary_session_id', 'session_summary', ['session_id'], unique=True)
+
+    op.execute(
+        "INSERT INTO session_summary (session_pk, session_id, status, attack_type, attack_variation, frame_count, "
+        "pad_score, pad_passed, deepfake_score, deepfake_passed, face_match_score, face_match_passed, "
+        "doc_liveness_score, doc_liveness_passed, ocr_confidence, document_type, mrz_valid, "
+        "overall_score, risk_level, decision, risk_version, created_at, updated_at, completed_at) "
+        "SELECT s.id, s.session_id, s.status, "
+        "CASE WHEN json_typeof(pad_results.details) = 'object' THEN pad_results.details->>'attack_type' END, "
+        "CASE WHEN json_typeof(pad_results.details) = 'object' THEN pad_results.details->>'variation' END, "
+        "frame_extractions.frame_count, "
+        "pad_results.score, pad_results.passed, deepfake_results.score, deepfake_results.passed, "
+        "face_match_results.cosine_similarity, face_match_results.passed, "
+        "doc_liveness_results.score, doc_liveness_results.passed, "
+        "ocr_results.confidence, ocr_results.document_type, mrz_results.valid, "
+        "risk_scores.overall_score, risk_scores.risk_level, risk_scores.decision, risk_scores.version, "
+        "s.created_at, s.updated_at, CASE WHEN s.status = 'completed' THEN s.updated_at END "
+        "FROM kyc_sessions s "
+        + " ".join([
+            _latest('frame_extractions', 'frame_count'),
+            _latest('pad_results', 'score, passed, details'),
+            _latest('deepfake_results', 'score, passed'),
+            _latest('face_match_results', 'cosine_similarity, passed'),
+            _latest('doc_liveness_results', 'score, passed'),
+            _latest('ocr_results', 'confidence, document_type'),
+            _latest('mrz_results', 'valid'),
+            _latest('risk_scores', 'overall_score, risk_level, decision, version', order="version DESC, id DESC"),
+        ])
+        # session_id is no longer unique on the partitioned kyc_sessions; keep the oldest row
+        + " ORDER BY s.id ON CONFLICT DO NOTHING"
+    )
+
+    op.create_index('ix_session_summary_status_created_at', 'session_summary', ['status', 'created_at'])
+    op.create_index('ix_session_summary_created_at', 'session_summary', ['created_at'])
+    op.execute("ANALYZE session_summary")
+
+
+def downgrade():
+    op.drop_table('session_summary')
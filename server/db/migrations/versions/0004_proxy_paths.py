@@ -0,0 +1,27 @@
+"""Add analysis proxy paths to kyc_sessions
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+
+Object keys of the low-resolution analysis proxies the worker transcodes
+once per session. Adding the columns on the partitioned parent adds them to
+every partition.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('kyc_sessions', sa.Column('selfie_proxy_path', sa.String()))
+    op.add_column('kyc_sessions', sa.Column('id_proxy_path', sa.String()))
+
+
+def downgrade():
+    op.drop_column('kyc_sessions', 'id_proxy_path')
+    op.drop_column('kyc_sessions', 'selfie_proxy_path')
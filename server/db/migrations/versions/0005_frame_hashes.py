@@ -0,0 +1,47 @@
+"""Add the frame_hashes replay index
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+Perceptual hashes of sampled frames from every session, with one btree
+index per 16-bit chunk for multi-index-hashing radius search (see
+worker/replay_index.py). Not partitioned: every lookup spans all history,
+and the chunk indexes would otherwise be probed once per partition. The
+session_summary columns hold the best cross-session match.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+CHUNKS = 4
+
+
+def upgrade():
+    op.create_table(
+        'frame_hashes',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('session_pk', sa.Integer()),
+        sa.Column('session_id', sa.String()),
+        sa.Column('stream', sa.String()),
+        sa.Column('frame_number', sa.Integer()),
+        sa.Column('hash', sa.BigInteger(), nullable=False),
+        *[sa.Column(f'chunk{i}', sa.Integer(), nullable=False) for i in range(CHUNKS)],
+        sa.Column('created_at', sa.DateTime()),
+    )
+    op.create_index('ix_frame_hashes_session_pk', 'frame_hashes', ['session_pk'])
+    for i in range(CHUNKS):
+        op.create_index(f'ix_frame_hashes_chunk{i}', 'frame_hashes', [f'chunk{i}'])
+
+    op.add_column('session_summary', sa.Column('replay_match_session_id', sa.String()))
+    op.add_column('session_summary', sa.Column('replay_matching_frames', sa.Integer()))
+
+
+def downgrade():
+    op.drop_column('session_summary', 'replay_matching_frames')
+    op.drop_column('session_summary', 'replay_match_session_id')
+    op.drop_table('frame_hashes')
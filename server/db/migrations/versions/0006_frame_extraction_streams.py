@@ -0,0 +1,25 @@
+"""Add the stream column to frame_extractions
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+
+The worker now extracts the selfie and ID videos as two streams and writes
+one frame_extractions row per stream. Rows written before the split keep
+an empty stream.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('frame_extractions', sa.Column('stream', sa.String()))
+
+
+def downgrade():
+    op.drop_column('frame_extractions', 'stream')
@@ -0,0 +1,47 @@
+"""Store result details as JSONB objects
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+
+The worker encoded service responses with json.dumps before assigning them
+to JSON columns, so rows hold a JSON string wrapping the object. The columns
+become JSONB and such strings are decoded into the objects they hold; rows
+already holding objects (seeded data, session_summary) are kept as they are.
+The conversion rewrites the tables; detached archive partitions are left
+untouched. The downgrade keeps the decoded objects.
+"""
+from alembic import op
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+JSON_COLUMNS = {
+    'pad_results': ['details'],
+    'deepfake_results': ['details'],
+    'face_match_results': ['details'],
+    'ocr_results': ['details'],
+    'mrz_results': ['mrz_data', 'parsed_fields', 'details'],
+    'doc_liveness_results': ['details'],
+    'risk_scores': ['component_scores', 'weights'],
+    'session_summary': ['stage_timings'],
+}
+
+
+def upgrade():
+    for table, columns in JSON_COLUMNS.items():
+        changes = ", ".join(
+            f"ALTER COLUMN {column} TYPE jsonb USING CASE "
+            f"WHEN json_typeof({column}) = 'string' AND left({column} #>> '{{}}', 1) IN ('{{', '[') "
+            f"THEN ({column} #>> '{{}}')::jsonb ELSE {column}::jsonb END"
+            for column in columns
+        )
+        op.execute(f"ALTER TABLE {table} {changes}")
+
+
+def downgrade():
+    for table, columns in JSON_COLUMNS.items():
+        changes = ", ".join(f"ALTER COLUMN {column} TYPE json USING {column}::json" for column in columns)
+        op.execute(f"ALTER TABLE {table} {changes}")
@@ -0,0 +1,42 @@
+"""Track object storage retention on session_summary
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+
+The retention task (worker/retention.py) deletes each artifact of a
+finished session once it is past its retention window, counted from
+``completed_at``, and stamps ``<artifact>_purged_at``. Sessions that
+finished before failures were stamped take their last update as
+completion time. A partial index per artifact covers only the
+finished sessions not purged yet, so finding the sessions due stays cheap
+however long the history grows.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+ARTIFACTS = ['frames', 'proxies', 'videos']
+
+
+def upgrade():
+    op.execute(
+        "UPDATE session_summary SET completed_at = updated_at "
+        "WHERE completed_at IS NULL AND status IN ('completed', 'failed')"
+    )
+    for artifact in ARTIFACTS:
+        op.add_column('session_summary', sa.Column(f'{artifact}_purged_at', sa.DateTime()))
+        op.create_index(
+            f'ix_session_summary_{artifact}_due', 'session_summary', ['completed_at'],
+            postgresql_where=sa.text(f"{artifact}_purged_at IS NULL AND status IN ('completed', 'failed')"),
+        )
+
+
+def downgrade():
+    for artifact in ARTIFACTS:
+        op.drop_index(f'ix_session_summary_{artifact}_due', table_name='session_summary')
+        op.drop_column('session_summary', f'{artifact}_purged_at')
@@ -1,51 +1,70 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 Base = declarative_base()
 
+# kyc_sessions and the result tables are partitioned by month on created_at
+# (see db/partitions.py and migration 0002). In the database their primary keys
+# are (id, created_at) and the session_id foreign keys are not enforced; they
+# are declared here so the ORM can join the tables. session_summary is a
+# regular table holding one denormalized row per session for the read paths.
+
 class KycSession(Base):
     __tablename__ = 'kyc_sessions'
+    __table_args__ = (
+        Index('ix_kyc_sessions_status_created_at', 'status', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String, unique=True, index=True)
+    session_id = Column(String, index=True)  # Random UUID; not a unique index on the partitioned table
     selfie_video_path = Column(String)
     id_video_path = Column(String)
+    selfie_proxy_path = Column(String)  # Low-resolution analysis proxy next to the original, if transcoded
+    id_proxy_path = Column(String)
     status = Column(String, default='pending')  # pending, processing, completed, failed
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    frame_extraction = relationship("FrameExtraction", back_populates="session", uselist=False)
+    frame_extractions = relationship("FrameExtraction", back_populates="session")  # One per stream: selfie and id
     pad_result = relationship("PadResult", back_populates="session", uselist=False)
     deepfake_result = relationship("DeepfakeResult", back_populates="session", uselist=False)
     face_match_result = relationship("FaceMatchResult", back_populates="session", uselist=False)
     ocr_result = relationship("OcrResult", back_populates="session", uselist=False)
     mrz_result = relationship("MrzResult", back_populates="session", uselist=False)
     doc_liveness_result = relationship("DocLivenessResult", back_populates="session", uselist=False)
-    risk_score = relationship("RiskScore", back_populates="session", uselist=False)
+    risk_scores = relationship("RiskScore", back_populates="session", order_by="RiskScore.version.desc()")
+    summary = relationship("SessionSummary", back_populates="session", uselist=False)
+
+    @property
+    def risk_score(self):
+        """Latest RiskScore version, or None if the session has not been scored"""
+        return self.risk_scores[0] if self.risk_scores else None
 
 class FrameExtraction(Base):
     __tablename__ = 'frame_extractions'
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey('kyc_sessions.id'))
-    frames_path = Column(String)  # Path to extracted frames
+    session_id = Column(Integer, ForeignKey('kyc_sessions.id'), index=True)
+    stream = Column(String)  # selfie or id; empty for sessions extracted before the streams were split
+    frames_path = Column(String)  # JSON descriptor of the packed frame archive: bucket, key and frame index
     frame_count = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    session = relationship("KycSession", back_populates="frame_extraction")
+    session = relationship("KycSession", back_populates="frame_extractions")
 
 class PadResult(Base):
     __tablename__ = 'pad_results'
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey('kyc_sessions.id'))
+    session_id = Column(Integer, ForeignKey('kyc_sessions.id'), index=True)
     score = Column(Float)
     threshold = Column(Float)
     passed = Column(Integer)  # 1 for pass, 0 for fail
-    details = Column(JSON)
+    details = Column(JSONB)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("KycSession", back_populates="pad_result")
@@ -54,11 +73,11 @@ class DeepfakeResult(Base):
     __tablename__ = 'deepfake_results'
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey('kyc_sessions.id'))
+    session_id = Column(Integer, ForeignKey('kyc_sessions.id'), index=True)
     score = Column(Float)
     threshold = Column(Float)
     passed = Column(Integer)  # 1 for pass, 0 for fail
-    details = Column(JSON)
+    details = Column(JSONB)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("KycSession", back_populates="deepfake_result")
@@ -67,13 +86,13 @@ class FaceMatchResult(Base):
     __tablename__ = 'face_match_results'
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey('kyc_sessions.id'))
+    session_id = Column(Integer, ForeignKey('kyc_sessions.id'), index=True)
     cosine_similarity = Column(Float)
     threshold = Column(Float)
     passed = Column(Integer)  # 1 for pass, 0 for fail
     face_image_path = Column(String)
     id_photo_path = Column(String)
-    details = Column(JSON)
+    details = Column(JSONB)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("KycSession", back_populates="face_match_result")
@@ -82,11 +101,11 @@ class OcrResult(Base):
     __tablename__ = 'ocr_results'
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey('kyc_sessions.id'))
+    session_id = Column(Integer, ForeignKey('kyc_sessions.id'), index=True)
     extracted_text = Column(String)
     confidence = Column(Float)
     document_type = Column(String)
-    details = Column(JSON)
+    details = Column(JSONB)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("KycSession", back_populates="ocr_result")
@@ -95,11 +114,11 @@ class MrzResult(Base):
     __tablename__ = 'mrz_results'
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey('kyc_sessions.id'))
-    mrz_data = Column(JSON)
-    parsed_fields = Column(JSON)
+    session_id = Column(Integer, ForeignKey('kyc_sessions.id'), index=True)
+    mrz_data = Column(JSONB)
+    parsed_fields = Column(JSONB)
     valid = Column(Integer)  # 1 for valid, 0 for invalid
-    details = Column(JSON)
+    details = Column(JSONB)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("KycSession", back_populates="mrz_result")
@@ -108,11 +127,11 @@ class DocLivenessResult(Base):
     __tablename__ = 'doc_liveness_results'
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey('kyc_sessions.id'))
+    session_id = Column(Integer, ForeignKey('kyc_sessions.id'), index=True)
     score = Column(Float)
     threshold = Column(Float)
     passed = Column(Integer)  # 1 for pass, 0 for fail
-    details = Column(JSON)
+    details = Column(JSONB)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("KycSession", back_populates="doc_liveness_result")
@@ -121,12 +140,75 @@ class RiskScore(Base):
     __tablename__ = 'risk_scores'
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey('kyc_sessions.id'))
+    session_id = Column(Integer, ForeignKey('kyc_sessions.id'), index=True)
     overall_score = Column(Float)
     risk_level = Column(String)  # low, medium, high
-    component_scores = Column(JSON)  # Individual scores from each service
-    weights = Column(JSON)  # Weights used for calculation
+    component_scores = Column(JSONB)  # Individual scores from each service
+    weights = Column(JSONB)  # Weights used for calculation
     decision = Column(String)  # approve, reject, manual_review
+    version = Column(Integer, nullable=False, default=1, server_default='1')  # Bumped by re-scoring runs
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    session = relationship("KycSession", back_populates="risk_score")
\ No newline at end of file
+    session = relationship("KycSession", back_populates="risk_scores")
+
+class SessionSummary(Base):
+    """Denormalized outcome of one session, written by the worker alongside each result row"""
+    __tablename__ = 'session_summary'
+    __table_args__ = (
+        Index('ix_session_summary_status_created_at', 'status', 'created_at'),
+        # Finished sessions whose artifacts are still in object storage (worker/retention.py)
+        *(
+            Index(f'ix_session_summary_{artifact}_due', 'completed_at',
+                  postgresql_where=text(f"{artifact}_purged_at IS NULL AND status IN ('completed', 'failed')"))
+            for artifact in ('frames', 'proxies', 'videos')
+        ),
+    )
+
+    session_pk = Column(Integer, ForeignKey('kyc_sessions.id'), primary_key=True)
+    session_id = Column(String, unique=True, index=True, nullable=False)  # Not partitioned, so this stays unique
+    status = Column(String, default='pending')  # pending, processing, completed, failed
+    attack_type = Column(String)  # Red team label from the PAD details; empty for live traffic
+    attack_variation = Column(String)
+    frame_count = Column(Integer)
+    pad_score = Column(Float)
+    pad_passed = Column(Integer)  # 1 for pass, 0 for fail
+    deepfake_score = Column(Float)
+    deepfake_passed = Column(Integer)
+    face_match_score = Column(Float)
+    face_match_passed = Column(Integer)
+    doc_liveness_score = Column(Float)
+    doc_liveness_passed = Column(Integer)
+    ocr_confidence = Column(Float)
+    document_type = Column(String)
+    mrz_valid = Column(Integer)  # 1 for valid, 0 for invalid
+    overall_score = Column(Float)
+    risk_level = Column(String)
+    decision = Column(String)
+    risk_version = Column(Integer)  # RiskScore version the risk columns were copied from
+    replay_match_session_id = Column(String)  # Past session sharing the most near-identical frames, if any
+    replay_matching_frames = Column(Integer)
+    stage_timings = Column(JSONB)  # Seconds spent per pipeline stage
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime)
+    frames_purged_at = Column(DateTime)  # When retention deleted the session's frame archives
+    proxies_purged_at = Column(DateTime)
+    videos_purged_at = Column(DateTime)
+
+    session = relationship("KycSession", back_populates="summary")
+
+class FrameHash(Base):
+    """Perceptual hash of one sampled frame, indexed by 16-bit chunks for radius search (worker/replay_index.py)"""
+    __tablename__ = 'frame_hashes'
+
+    id = Column(BigInteger, primary_key=True)
+    session_pk = Column(Integer, ForeignKey('kyc_sessions.id'), index=True)
+    session_id = Column(String)  # Copied so matches are reported without a join on the partitioned table
+    stream = Column(String)  # selfie or id
+    frame_number = Column(Integer)
+    hash = Column(BigInteger, nullable=False)  # 64-bit hash stored signed
+    chunk0 = Column(Integer, nullable=False, index=True)
+    chunk1 = Column(Integer, nullable=False, index=True)
+    chunk2 = Column(Integer, nullable=False, index=True)
+    chunk3 = Column(Integer, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
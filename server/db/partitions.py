@@ -0,0 +1,124 @@
+"""Monthly range partitions on created_at for kyc_sessions and the result tables.
+
+Partitions are named ``<table>_p<YYYYMM>``; rows outside every monthly
+partition land in ``<table>_default``. ``ensure_future_partitions`` keeps a few
+months ahead of the clock, and ``archive_partitions`` detaches months past the
+retention window (optionally dropping them).
+"""
+import re
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+PARTITIONED_TABLES = [
+    "kyc_sessions",
+    "frame_extractions",
+    "pad_results",
+    "deepfake_results",
+    "face_match_results",
+    "ocr_results",
+    "mrz_results",
+    "doc_liveness_results",
+    "risk_scores",
+]
+
+ARCHIVE_SCHEMA = "archive"
+
+_PARTITION_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def month_start(value):
+    """First day of the month containing value"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    """First day of the month `months` after value's month"""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def create_month_partition(conn, table, month):
+    """Create the partition of `table` covering `month` if it does not exist"""
+    start = month_start(month)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, start)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+    ))
+
+
+def create_default_partition(conn, table):
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+
+
+def ensure_partitions(conn, first_month, last_month, tables=PARTITIONED_TABLES):
+    """Create monthly partitions from first_month to last_month (inclusive) for every table"""
+    month = month_start(first_month)
+    while month <= month_start(last_month):
+        for table in tables:
+            create_month_partition(conn, table, month)
+        month = add_months(month, 1)
+
+
+def ensure_future_partitions(conn, months_ahead=3, tables=PARTITIONED_TABLES):
+    """Make sure partitions exist for the current month and the next `months_ahead`"""
+    today = datetime.utcnow().date()
+    ensure_partitions(conn, today, add_months(today, months_ahead), tables)
+
+
+def list_partitions(conn, table):
+    """Monthly partitions attached to `table` as (name, month) pairs, oldest first"""
+    rows = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ), {"table": table}).scalars()
+
+    partitions = []
+    for name in rows:
+        match = _PARTITION_RE.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def archive_partitions(conn, retain_months, drop=False, tables=PARTITIONED_TABLES, dry_run=False):
+    """Detach monthly partitions that ended more than `retain_months` months ago.
+
+    Detached partitions are moved to the ``archive`` schema (where they can be
+    dumped to cold storage) or dropped when ``drop`` is set. session_summary
+    rows of the same months are deleted, since they can be rebuilt from the
+    archived result tables. Returns the names of the affected partitions.
+    """
+    cutoff = add_months(datetime.utcnow().date(), -retain_months)
+    if not drop and not dry_run:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+
+    archived = []
+    archived_session_months = []
+    for table in tables:
+        for name, month in list_partitions(conn, table):
+            if add_months(month, 1) > cutoff:
+                continue
+            archived.append(name)
+            if table == "kyc_sessions":
+                archived_session_months.append(month)
+            if dry_run:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            if drop:
+                conn.execute(text(f"DROP TABLE {name}"))
+            else:
+                conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+
+    if archived_session_months and not dry_run:
+        conn.execute(
+            text("DELETE FROM session_summary WHERE created_at >= :start AND created_at < :end"),
+            {"start": min(archived_session_months), "end": add_months(max(archived_session_months), 1)},
+        )
+    return archived
@@ -3,7 +3,15 @@ from fastapi.responses import PlainTextResponse
 import random
 import json
 
-app = FastAPI(title="Deepfake Detection Service", version="1.0.0")
+from common.admission import Admission
+from common.serialization import response_class
+
+app = FastAPI(title="Deepfake Detection Service", version="1.0.0", default_response_class=response_class())
+
+# Requests carry the caller's deadline; at most ADMISSION_MAX_CONCURRENCY run at once, the rest queue briefly or get a 503
+admission = Admission("deepfake", ["/analyze"])
+app.middleware("http")(admission.middleware)
+
 
 @app.post("/analyze")
 async def analyze_deepfake(payload: dict):
@@ -14,6 +22,8 @@ async def analyze_deepfake(payload: dict):
     try:
         session_id = payload.get("session_id")
         video_path = payload.get("video_path")
+        # Aligned face crops of the selfie frames (worker/face_crops.py), for frame-level artifact checks
+        crop_refs = payload.get("face_crops", [])
 
         if not session_id or not video_path:
             raise HTTPException(status_code=400, detail="session_id and video_path are required")
@@ -31,7 +41,8 @@ async def analyze_deepfake(payload: dict):
                 "video_path": video_path,
                 "method": "deepfake_detection",
                 "confidence": round(1.0 - score, 3),  # Convert to confidence
-                "detected_anomalies": random.randint(0, 3)
+                "detected_anomalies": random.randint(0, 3),
+                "face_crop_count": len(crop_refs)
             }
         }
 
@@ -44,7 +55,7 @@ async def analyze_deepfake(payload: dict):
 
 @app.get("/metrics", response_class=PlainTextResponse)
 async def metrics():
-    return "# Metrics not implemented yet\n"
+    return admission.metrics()
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "deepfake_svc"}
@@ -1,9 +1,59 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import PlainTextResponse
-import random
 import json
+import numpy as np
+from typing import List
+import cv2
+from minio import Minio
+
+import models
+from common.admission import Admission, raise_if_expired
+from common.frame_archive import read_frame_refs
+from common.frame_cache import FrameCache
+from common.inference_pool import InferencePool
+from common.serialization import response_class
+
+app = FastAPI(title="Document Liveness Service", version="1.0.0", default_response_class=response_class())
+
+# Requests carry the caller's deadline; at most ADMISSION_MAX_CONCURRENCY run at once, the rest queue briefly or get a 503
+admission = Admission("doclive", ["/analyze"])
+app.middleware("http")(admission.middleware)
+
+# Liveness analysis runs in INFERENCE_PROCESSES pool processes, each with its own model copy
+inference_pool = InferencePool(models.load_model)
+
+
+@app.on_event("startup")
+def start_inference_pool():
+    inference_pool.start()
+
+
+@app.on_event("shutdown")
+def stop_inference_pool():
+    inference_pool.shutdown()
+
+# MinIO client for range reads from the packed frame archives
+minio_client = Minio(
+    "storage:9000",
+    access_key="minioadmin",
+    secret_key="minioadmin",
+    secure=False
+)
+
+# Archives shared with the other services on this node, when FRAME_CACHE_DIR is set
+frame_cache = FrameCache.from_env()
+
+
+def load_archive_frames(refs: List[dict]) -> List[np.ndarray]:
+    """Fetch and decode frames referenced by (bucket, key, offset, size) from their archives"""
+    frames = []
+    for data in read_frame_refs(minio_client, refs, cache=frame_cache):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            frames.append(frame)
+    return frames
 
-app = FastAPI(title="Document Liveness Service", version="1.0.0")
 
 @app.post("/analyze")
 async def analyze_document_liveness(payload: dict):
@@ -12,14 +62,23 @@ async def analyze_document_liveness(payload: dict):
     """
     try:
         session_id = payload.get("session_id")
-        frames = payload.get("frames", [])
+        frames_data = payload.get("frames", [])
 
-        if not session_id or not frames:
+        if not session_id or not frames_data:
             raise HTTPException(status_code=400, detail="session_id and frames are required")
 
-        # Mock document liveness analysis - in real implementation this would
-        # analyze frames for signs of document tampering, photocopies, digital screens, etc.
-        score = random.uniform(0.5, 1.0)  # Mock score between 0.5 and 1.0
+        # Frames arrive as references into the session's frame archive; fetch only those with range reads
+        archive_refs = [f for f in frames_data if isinstance(f, dict) and 'key' in f]
+        frames = await run_in_threadpool(load_archive_frames, archive_refs) if archive_refs else []
+
+        if not frames:
+            raise HTTPException(status_code=400, detail="No valid frames provided")
+
+        raise_if_expired()
+
+        # Analyze frames for signs of photocopies, digital screens, etc. in a pool process
+        analysis = await inference_pool.run(models.analyze, frames)
+        score = analysis["score"]
 
         result = {
             "session_id": session_id,
@@ -30,17 +89,16 @@ async def analyze_document_liveness(payload: dict):
                 "frames_analyzed": len(frames),
                 "method": "document_liveness_detection",
                 "confidence": round(score, 3),
-                "detected_artifacts": random.randint(0, 2),  # Number of suspicious artifacts
-                "liveness_indicators": {
-                    "texture_analysis": random.choice([True, True, False]),
-                    "edge_analysis": random.choice([True, True, False]),
-                    "reflection_check": random.choice([True, True, False])
-                }
+                "detected_artifacts": analysis["detected_artifacts"],  # Number of suspicious artifacts
+                "liveness_indicators": analysis["liveness_indicators"],
+                "moire_energy": analysis["moire_energy"]
             }
         }
 
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Document liveness analysis failed: {str(e)}")
 
@@ -48,7 +106,9 @@ async def analyze_document_liveness(payload: dict):
 
 @app.get("/metrics", response_class=PlainTextResponse)
 async def metrics():
-    return "# Metrics not implemented yet\n"
+    return admission.metrics() + inference_pool.metrics("doclive") + (
+        frame_cache.metrics("doclive") if frame_cache else ""
+    )
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "doclive_svc"}
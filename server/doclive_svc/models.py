@@ -0,0 +1,71 @@
+"""Document liveness model, loaded once per inference pool process (see common/inference_pool.py)."""
+import random
+import numpy as np
+from typing import Dict, List
+import cv2
+
+from common import onnx_backend
+
+
+class MockDocumentLivenessModel:
+    """Mock model - in real implementation this would be a trained classifier.
+
+    The liveness indicators are computed from the frames. The score comes from
+    doc_liveness.onnx on ONNX Runtime when it is deployed and is simulated otherwise.
+    """
+
+    def __init__(self):
+        self.classifier = onnx_backend.load("doc_liveness", cls=onnx_backend.ImageClassifier)
+
+    def texture_ok(self, gray: np.ndarray) -> bool:
+        """Printed and screen-displayed copies lose fine texture"""
+        return bool(cv2.Laplacian(gray, cv2.CV_64F).var() > 50.0)
+
+    def edges_ok(self, gray: np.ndarray) -> bool:
+        """A real card has crisp, dense edges (guilloche, print)"""
+        return bool((cv2.Canny(gray, 50, 150) > 0).mean() > 0.02)
+
+    def reflection_ok(self, gray: np.ndarray) -> bool:
+        """Screens and glossy photocopies show large saturated glare areas"""
+        return bool((gray >= 250).mean() < 0.05)
+
+    def moire_energy(self, gray: np.ndarray) -> float:
+        """Share of spectral energy in isolated high-frequency peaks (screen moire)"""
+        small = cv2.resize(gray, (256, 256), interpolation=cv2.INTER_AREA).astype(np.float32)
+        spectrum = np.abs(np.fft.fftshift(np.fft.fft2(small - small.mean())))
+        yy, xx = np.ogrid[-128:128, -128:128]
+        high = spectrum[(yy ** 2 + xx ** 2) > 48 ** 2]
+        return float(np.sort(high)[-32:].sum() / (spectrum.sum() + 1e-6))
+
+    def score(self, frames: List[np.ndarray]) -> float:
+        if self.classifier is not None and frames:
+            return float(self.classifier.scores(frames).mean())
+        return random.uniform(0.5, 1.0)  # Mock score between 0.5 and 1.0
+
+    def analyze(self, frames: List[np.ndarray]) -> Dict:
+        indicators = {"texture_analysis": [], "edge_analysis": [], "reflection_check": []}
+        moire = []
+        for frame in frames:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            indicators["texture_analysis"].append(self.texture_ok(gray))
+            indicators["edge_analysis"].append(self.edges_ok(gray))
+            indicators["reflection_check"].append(self.reflection_ok(gray))
+            moire.append(self.moire_energy(gray))
+
+        # An indicator passes when most frames agree
+        passed = {name: sum(values) * 2 > len(values) for name, values in indicators.items()}
+        return {
+            "score": self.score(frames),
+            "liveness_indicators": passed,
+            "detected_artifacts": sum(not ok for ok in passed.values()),
+            "moire_energy": round(float(np.mean(moire)), 4) if moire else 0.0,
+        }
+
+
+def load_model() -> MockDocumentLivenessModel:
+    return MockDocumentLivenessModel()
+
+
+def analyze(model: MockDocumentLivenessModel, frames: List[np.ndarray]) -> Dict:
+    """Document liveness for one batch of frames; runs inside a pool process"""
+    return model.analyze(frames)
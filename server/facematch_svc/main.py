@@ -1,9 +1,45 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import PlainTextResponse
 import random
 import json
+import numpy as np
+from typing import List
+import cv2
+from minio import Minio
+
+from common.admission import Admission
+from common.frame_archive import read_frame_refs
+from common.frame_cache import FrameCache
+from common.serialization import response_class
+
+app = FastAPI(title="Face Matching Service", version="1.0.0", default_response_class=response_class())
+
+# Requests carry the caller's deadline; at most ADMISSION_MAX_CONCURRENCY run at once, the rest queue briefly or get a 503
+admission = Admission("facematch", ["/match"])
+app.middleware("http")(admission.middleware)
+
+# MinIO client for range reads from the face crop archives
+minio_client = Minio(
+    "storage:9000",
+    access_key="minioadmin",
+    secret_key="minioadmin",
+    secure=False
+)
+
+# Archives shared with the other services on this node, when FRAME_CACHE_DIR is set
+frame_cache = FrameCache.from_env()
+
+
+def load_face_crops(refs: List[dict]) -> List[np.ndarray]:
+    """Fetch and decode aligned face crops (worker/face_crops.py) from their archives"""
+    crops = []
+    for data in read_frame_refs(minio_client, refs, cache=frame_cache):
+        crop = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if crop is not None:
+            crops.append(crop)
+    return crops
 
-app = FastAPI(title="Face Matching Service", version="1.0.0")
 
 @app.post("/match")
 async def match_faces(payload: dict):
@@ -15,12 +51,20 @@ async def match_faces(payload: dict):
         session_id = payload.get("session_id")
         face_frames = payload.get("face_frames", [])
         id_photo_path = payload.get("id_photo_path")
+        crop_refs = payload.get("face_crops", [])
+        id_crop_ref = payload.get("id_face_crop")
 
         if not session_id or not face_frames or not id_photo_path:
             raise HTTPException(status_code=400, detail="session_id, face_frames, and id_photo_path are required")
 
+        # Faces already detected and aligned to 112x112 by the worker: embeddings are computed
+        # straight from the crops, and only frames without a crop would need a detector
+        selfie_crops = await run_in_threadpool(load_face_crops, crop_refs) if crop_refs else []
+        id_crops = await run_in_threadpool(load_face_crops, [id_crop_ref]) if id_crop_ref else []
+        id_crop = id_crops[0] if id_crops else None
+
         # Mock face matching - in real implementation this would use InsightFace
-        # to extract embeddings from face_frames and id_photo, then compute similarity
+        # to extract embeddings from the selfie crops and the ID photo crop, then compute similarity
         cosine_similarity = random.uniform(0.3, 1.0)  # Mock similarity between 0.3 and 1.0
 
         result = {
@@ -32,7 +76,9 @@ async def match_faces(payload: dict):
                 "face_frames_count": len(face_frames),
                 "id_photo_path": id_photo_path,
                 "method": "insightface_cosine_similarity",
-                "face_detected": random.choice([True, True, True, False]),  # Mostly successful
+                "face_crops_count": len(selfie_crops),
+                "id_face_crop": id_crop is not None,
+                "face_detected": bool(selfie_crops) if crop_refs else random.choice([True, True, True, False]),
                 "face_image_path": face_frames[:2] if cosine_similarity >= 0.35 else []
             }
         }
@@ -46,7 +92,7 @@ async def match_faces(payload: dict):
 
 @app.get("/metrics", response_class=PlainTextResponse)
 async def metrics():
-    return "# Metrics not implemented yet\n"
+    return admission.metrics() + (frame_cache.metrics("facematch") if frame_cache else "")
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "facematch_svc"}
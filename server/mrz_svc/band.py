@@ -0,0 +1,132 @@
+"""MRZ band localization and band-only recognition.
+
+The machine-readable zone is two or three long, evenly spaced lines of
+OCR-B text at the bottom of the data page. It is found on a downscaled
+grayscale image with morphology and projection profiles (no OCR):
+
+1. blackhat + horizontal Sobel highlight dark, dense character strokes;
+2. a wide closing merges the characters of each line into solid runs;
+3. the row profile of that mask gives text lines; MRZ lines are the ones
+   spanning most of the page width, grouped in 2-3 consecutive rows of
+   similar height;
+4. the column profile within those rows gives the horizontal extent.
+
+Only the band is then passed to Tesseract, restricted to the MRZ alphabet.
+"""
+import os
+
+import cv2
+import numpy as np
+
+try:
+    import pytesseract
+except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
+    pytesseract = None
+
+# Raised when the tesseract binary is missing or fails on a band; callers fall back to OCR text
+RECOGNIZER_ERRORS = (pytesseract.TesseractNotFoundError, pytesseract.TesseractError) if pytesseract else ()
+
+MRZ_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<"
+MRZ_LINE_LENGTHS = {30: "TD1", 36: "TD2", 44: "TD3"}
+
+# "ocrb" or "mrz" traineddata can be dropped into tessdata for better accuracy
+TESSERACT_LANG = os.getenv("MRZ_TESSERACT_LANG", "eng")
+
+ANALYSIS_WIDTH = 640
+MIN_LINE_SPAN = 0.55  # fraction of the page width an MRZ line covers
+
+
+def _runs(mask):
+    """(start, end) index pairs of consecutive True values in a 1-D mask"""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def text_line_mask(gray):
+    """Binary mask where each text line becomes a solid horizontal run"""
+    blackhat = cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, cv2.getStructuringElement(cv2.MORPH_RECT, (13, 5)))
+    grad = np.abs(cv2.Sobel(blackhat, cv2.CV_32F, 1, 0, ksize=-1))
+    grad = (255 * (grad - grad.min()) / max(float(np.ptp(grad)), 1e-6)).astype(np.uint8)
+    grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (21, 3)))
+    _, mask = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return mask > 0
+
+
+def locate_mrz_band(gray):
+    """Bounding box (x0, y0, x1, y1) of the MRZ band in `gray`, or None.
+
+    Works on a copy downscaled to ANALYSIS_WIDTH; the box is returned in the
+    coordinates of the input image.
+    """
+    scale = ANALYSIS_WIDTH / gray.shape[1]
+    small = cv2.resize(gray, (ANALYSIS_WIDTH, max(1, round(gray.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    mask = text_line_mask(small)
+    height, width = mask.shape
+
+    # Row profile: a row belongs to a long text line if its filled span is wide
+    filled = mask.any(axis=1)
+    first = np.where(filled, mask.argmax(axis=1), width)
+    last = np.where(filled, width - 1 - mask[:, ::-1].argmax(axis=1), -1)
+    long_rows = (last - first) >= MIN_LINE_SPAN * width
+    long_rows &= mask.mean(axis=1) >= 0.35
+
+    lines = [(start, end) for start, end in _runs(long_rows) if end - start >= 3]
+    if len(lines) < 2:
+        return None
+
+    # Group consecutive lines of similar height and spacing, prefer the lowest group of 2-3
+    best = None
+    for i in range(len(lines)):
+        group = [lines[i]]
+        for line in lines[i + 1:]:
+            prev = group[-1]
+            line_height = prev[1] - prev[0]
+            if line[0] - prev[1] > 1.5 * line_height or abs((line[1] - line[0]) - line_height) > 0.6 * line_height:
+                break
+            group.append(line)
+        if 2 <= len(group) <= 3 and (best is None or group[-1][1] >= best[-1][1]):
+            best = group
+
+    if best is None:
+        return None
+
+    y0, y1 = best[0][0], best[-1][1]
+    columns = mask[y0:y1].mean(axis=0) > 0.2
+    xs = np.flatnonzero(columns)
+    if xs.size == 0:
+        return None
+    x0, x1 = xs[0], xs[-1] + 1
+
+    # Pad by half a line height and map back to input coordinates
+    pad = max(2, (y1 - y0) // (2 * len(best)))
+    box = (max(0, x0 - pad), max(0, y0 - pad), min(width, x1 + pad), min(height, y1 + pad))
+    return tuple(int(round(v / scale)) for v in box)
+
+
+def clean_mrz_lines(text):
+    """Keep lines that look like MRZ lines and snap them to the nearest ICAO length"""
+    lines = []
+    for raw in text.upper().splitlines():
+        line = "".join(ch for ch in raw.replace(" ", "") if ch in MRZ_ALPHABET)
+        if len(line) < 25:
+            continue
+        length = min(MRZ_LINE_LENGTHS, key=lambda n: abs(n - len(line)))
+        lines.append(line[:length].ljust(length, "<"))
+    return lines
+
+
+def recognize_band(gray, box):
+    """OCR only the MRZ band with the MRZ alphabet; returns cleaned lines or None without Tesseract"""
+    if pytesseract is None:
+        return None
+    x0, y0, x1, y1 = box
+    band = gray[y0:y1, x0:x1]
+    # Tesseract reads best with ~30 px glyphs on a clean binary image
+    band = cv2.resize(band, None, fx=2.0, fy=2.0, interpolation=cv2.INTER_CUBIC) if band.shape[0] < 80 else band
+    _, band = cv2.threshold(band, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    text = pytesseract.image_to_string(
+        band, lang=TESSERACT_LANG, config=f"--psm 6 -c tessedit_char_whitelist={MRZ_ALPHABET}"
+    )
+    return clean_mrz_lines(text)
+
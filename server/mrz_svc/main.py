@@ -1,14 +1,75 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import PlainTextResponse
-import random
-import json
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import time
+import numpy as np
+from typing import List
+import cv2
+from minio import Minio
 
-app = FastAPI(title="MRZ Parsing Service", version="1.0.0")
+from common.admission import Admission, raise_if_expired
+from common.frame_archive import read_frame_refs
+from common.frame_cache import FrameCache
+from common.icao9303 import find_zone, parse_batch, parse_record, parsed_fields, to_ndjson
+from common.serialization import response_class
+from band import RECOGNIZER_ERRORS, clean_mrz_lines, locate_mrz_band, recognize_band
+
+app = FastAPI(title="MRZ Parsing Service", version="1.0.0", default_response_class=response_class())
+
+# Requests carry the caller's deadline; at most ADMISSION_MAX_CONCURRENCY run at once, the rest queue briefly or get a 503
+admission = Admission("mrz", ["/parse", "/parse/frames", "/parse/batch"])
+app.middleware("http")(admission.middleware)
+
+# MinIO client for range reads from the packed frame archives
+minio_client = Minio(
+    "storage:9000",
+    access_key="minioadmin",
+    secret_key="minioadmin",
+    secure=False
+)
+
+# Archives shared with the other services on this node, when FRAME_CACHE_DIR is set
+frame_cache = FrameCache.from_env()
+
+
+def load_archive_frames(refs: List[dict]) -> List[np.ndarray]:
+    """Fetch frames referenced by (bucket, key, offset, size) and decode them straight to grayscale"""
+    frames = []
+    for data in read_frame_refs(minio_client, refs, cache=frame_cache):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if frame is not None:
+            frames.append(frame)
+    return frames
+
+
+# /parse/batch limits: records per request, and records parsed per streamed chunk
+MAX_BATCH_RECORDS = 100_000
+BATCH_CHUNK = 2000
+
+
+def zone_result(zone):
+    """Response body for one candidate zone (a list of MRZ lines, or None when no zone was found)"""
+    if zone is None:
+        return {"mrz_data": {}, "parsed_fields": {}, "valid": False,
+                "analysis": {"mrz_found": False, "checks": {}, "confidence": 0.0}}
+    record = parse_record(zone)
+    checks = record["checks"]
+    return {
+        "mrz_data": {**record["mrz_data"], "format": record["format"], "lines": zone},
+        "parsed_fields": parsed_fields(record["mrz_data"]),
+        "valid": record["valid"],
+        "analysis": {
+            "mrz_found": True,
+            "checks": checks,
+            # Share of passing check digits; a wrong character usually breaks one check and the composite
+            "confidence": round(sum(checks.values()) / len(checks), 3) if record["charset_ok"] else 0.0
+        }
+    }
 
 @app.post("/parse")
 async def parse_mrz(payload: dict):
     """
-    Parse MRZ data from OCR text using PassportEye
+    Parse and validate the MRZ found at the end of OCR text (ICAO 9303 TD1/TD2/TD3)
     """
     try:
         session_id = payload.get("session_id")
@@ -17,61 +78,118 @@ async def parse_mrz(payload: dict):
         if not session_id:
             raise HTTPException(status_code=400, detail="session_id is required")
 
-        # Mock MRZ parsing - in real implementation this would use PassportEye
-        # to parse MRZ data from the OCR text
-        mock_mrz_data = {
-            "type": "P",
-            "country": "USA",
-            "number": "P123456789",
-            "check_number": "8",
-            "nationality": "USA",
-            "birth_date": "900101",
-            "check_birth": "7",
-            "sex": "M",
-            "expiration_date": "300101",
-            "check_expiration": "1",
-            "personal_number": "<<<<<<<<<<<<<<",
-            "check_personal": "<",
-            "check_composite": "8"
-        }
+        result = zone_result(find_zone(clean_mrz_lines(ocr_text)))
+        result["session_id"] = session_id
+        result["analysis"].update({"method": "icao9303", "text_length": len(ocr_text)})
+        return result
 
-        mock_parsed_fields = {
-            "document_type": "passport",
-            "issuing_country": "United States",
-            "document_number": "P123456789",
-            "surname": "DOE",
-            "given_names": "JOHN",
-            "nationality": "American",
-            "date_of_birth": "1990-01-01",
-            "sex": "Male",
-            "expiration_date": "2030-01-01"
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"MRZ parsing failed: {str(e)}")
 
-        valid = random.choice([True, True, False])  # Mostly valid
-
-        result = {
-            "session_id": session_id,
-            "mrz_data": mock_mrz_data,
-            "parsed_fields": mock_parsed_fields,
-            "valid": valid,
-            "analysis": {
-                "method": "passporteye_mrz_parser",
-                "text_length": len(ocr_text),
-                "mrz_found": valid,
-                "confidence": round(random.uniform(0.8, 0.99), 3) if valid else 0.0
-            }
-        }
 
+@app.post("/parse/batch")
+async def parse_mrz_batch(payload: dict):
+    """
+    Validate many MRZ zones in one request, e.g. for back-office re-verification.
+
+    ``records`` holds zones as newline-separated strings or lists of lines;
+    ``fields`` (default true) controls whether the raw fields are returned.
+    Results are streamed as NDJSON, one line per record in input order, with
+    the record's ``index``, ``format``, ``valid`` and per-check results.
+    """
+    records = payload.get("records")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="records must be a list of MRZ zones")
+    if len(records) > MAX_BATCH_RECORDS:
+        raise HTTPException(status_code=413, detail=f"at most {MAX_BATCH_RECORDS} records per request")
+    fields = bool(payload.get("fields", True))
+
+    def stream():
+        for offset in range(0, len(records), BATCH_CHUNK):
+            results = parse_batch(records[offset:offset + BATCH_CHUNK], fields=fields)
+            for index, result in enumerate(results, start=offset):
+                result["index"] = index
+            yield to_ndjson(results)
+
+    # A sync generator is iterated in the threadpool, so parsing does not block the event loop
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def read_frames_mrz(archive_refs: List[dict]) -> dict:
+    """Fetch the frames and read the MRZ band of each in turn; blocking, so run in the threadpool"""
+    started = time.perf_counter()
+    frames = load_archive_frames(archive_refs) if archive_refs else []
+
+    result, band, frame_index, error = zone_result(None), None, None, None
+    bands_found = 0
+    for i, gray in enumerate(frames):
+        raise_if_expired()
+        box = locate_mrz_band(gray)
+        if box is None:
+            continue
+        bands_found += 1
+        try:
+            lines = recognize_band(gray, box)
+        except RECOGNIZER_ERRORS as e:
+            # Tesseract missing or failing: report no zone so the caller falls back to OCR text
+            result, band, frame_index, error = zone_result(None), box, i, str(e)
+            break
+        if lines is None:
+            # No recogniser installed: report the band so the caller can fall back to OCR text
+            band, frame_index = box, i
+            break
+        candidate = zone_result(find_zone(lines))
+        found = candidate["analysis"]["mrz_found"] and not result["analysis"]["mrz_found"]
+        if band is None or found or candidate["valid"]:
+            result, band, frame_index = candidate, box, i
+        # A zone that passes every check cannot be improved on; otherwise try the next frame
+        if candidate["valid"]:
+            break
+
+    result["analysis"].update({
+        "method": "mrz_band_localization",
+        "frames_received": len(frames),
+        "bands_found": bands_found,
+        "frame_index": frame_index,
+        "band": list(band) if band else None,
+        "recognizer_error": error,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    })
+    return result
+
+
+@app.post("/parse/frames")
+async def parse_mrz_frames(payload: dict):
+    """
+    Read the MRZ directly from document frames, without full-page OCR.
+
+    Each frame is searched for the MRZ band (see band.py); only that band is
+    recognised. Frames are tried in the order given until one yields a zone
+    that passes every check digit; otherwise the first well-formed zone is kept.
+    """
+    try:
+        session_id = payload.get("session_id")
+        frames_data = payload.get("frames", [])
+
+        if not session_id:
+            raise HTTPException(status_code=400, detail="session_id is required")
+
+        archive_refs = [f for f in frames_data if isinstance(f, dict) and 'key' in f]
+        result = await run_in_threadpool(read_frames_mrz, archive_refs)
+        result["session_id"] = session_id
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"MRZ parsing failed: {str(e)}")
-
+        raise HTTPException(status_code=500, detail=f"MRZ band parsing failed: {str(e)}")
 
 
 @app.get("/metrics", response_class=PlainTextResponse)
 async def metrics():
-    return "# Metrics not implemented yet\n"
+    return admission.metrics() + (frame_cache.metrics("mrz") if frame_cache else "")
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "mrz_svc"}
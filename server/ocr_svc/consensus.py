@@ -0,0 +1,57 @@
+"""Per-field consensus over the OCR results of several frames.
+
+Each frame's OCR output is a list of ``(line, confidence)``. Lines shaped
+``LABEL: VALUE`` become fields; every other line is a field of its own,
+keyed by its text. Each frame votes for the value it read with weight
+``confidence x support``, where support is the number of near-duplicate
+frames it stands for. Per field, the value with the most votes wins, so one
+frame with glare or motion blur on a field is outvoted by the others.
+"""
+from collections import defaultdict
+
+
+def split_field(line):
+    """(label, value) for 'LABEL: VALUE' lines, (None, line) otherwise"""
+    label, sep, value = line.partition(":")
+    if sep and label.strip() and value.strip() and len(label) <= 32:
+        return " ".join(label.upper().split()), value.strip()
+    return None, line.strip()
+
+
+def build_consensus(frame_results):
+    """Merge ``[(lines, support)]`` per-frame OCR results, best frame first.
+
+    Returns ``(text, fields, confidence)``: the consensus text in the line
+    order of the best frame, the labelled fields and an overall confidence.
+    """
+    votes = defaultdict(lambda: defaultdict(float))
+    weight = defaultdict(float)
+    labels = {}
+    total_weight = sum(support for _, support in frame_results) or 1
+
+    for lines, support in frame_results:
+        for line, confidence in lines:
+            label, value = split_field(line)
+            if not value:
+                continue
+            key = label or value.upper()
+            labels.setdefault(key, label)
+            votes[key][value] += confidence * support
+            weight[key] += support
+
+    text_lines, fields, confidences = [], {}, []
+    for key, label in labels.items():
+        # Unlabelled lines read in fewer than half of the frames are OCR noise
+        if label is None and weight[key] < total_weight / 2:
+            continue
+        value, score = max(votes[key].items(), key=lambda item: item[1])
+        # Frames that read another value count against the field's confidence
+        confidences.append(score / weight[key])
+        if label is None:
+            text_lines.append(value)
+        else:
+            fields[label] = value
+            text_lines.append(f"{label}: {value}")
+
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return "\n".join(text_lines), fields, confidence
@@ -1,41 +1,153 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import PlainTextResponse
-import random
+import os
 import json
+import numpy as np
+from collections import OrderedDict
+from typing import List
+import cv2
+from minio import Minio
+
+import models
+from common.admission import Admission, raise_if_expired
+from common.frame_archive import read_frame_refs
+from common.frame_cache import FrameCache
+from common.inference_pool import InferencePool
+from common.phash import dedupe
+from common.serialization import response_class
+from consensus import build_consensus
+
+app = FastAPI(title="OCR Service", version="1.0.0", default_response_class=response_class())
+
+# Requests carry the caller's deadline; at most ADMISSION_MAX_CONCURRENCY run at once, the rest queue briefly or get a 503
+admission = Admission("ocr", ["/extract"])
+app.middleware("http")(admission.middleware)
+
+# ROI detection, hashing and OCR run in INFERENCE_PROCESSES pool processes, each with its own model copy
+inference_pool = InferencePool(models.load_model)
+
+
+@app.on_event("startup")
+def start_inference_pool():
+    inference_pool.start()
+
+
+@app.on_event("shutdown")
+def stop_inference_pool():
+    inference_pool.shutdown()
+
+# MinIO client for range reads from the packed frame archives
+minio_client = Minio(
+    "storage:9000",
+    access_key="minioadmin",
+    secret_key="minioadmin",
+    secure=False
+)
+
+# Archives shared with the other services on this node, when FRAME_CACHE_DIR is set
+frame_cache = FrameCache.from_env()
+
+# Distinct document crops OCR'd per request; near-duplicates within this Hamming distance are skipped
+MAX_OCR_FRAMES = int(os.getenv("OCR_MAX_FRAMES", "3"))
+DUPLICATE_DISTANCE = int(os.getenv("OCR_DUPLICATE_DISTANCE", "10"))
+CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "4096"))
+
+# OCR output per document crop, least recently used first; kept here so every pool process shares it.
+# Keyed by the sha256 of the crop pixels, never by the perceptual hash: documents printed on the
+# same template hash alike, and a near match must not serve one applicant's text to another.
+ocr_cache = OrderedDict()
+cache_stats = {"hits": 0, "misses": 0}
+
+
+def load_archive_frames(refs: List[dict]) -> List[np.ndarray]:
+    """Fetch and decode frames referenced by (bucket, key, offset, size) from their archives"""
+    frames = []
+    for data in read_frame_refs(minio_client, refs, cache=frame_cache):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            frames.append(frame)
+    return frames
+
+
+def cache_get(digest: str):
+    """Cached OCR lines for a crop digest, or None"""
+    if digest not in ocr_cache:
+        cache_stats["misses"] += 1
+        return None
+    ocr_cache.move_to_end(digest)
+    cache_stats["hits"] += 1
+    return ocr_cache[digest]
+
+
+def cache_put(digest: str, lines: List[tuple]):
+    ocr_cache[digest] = lines
+    if len(ocr_cache) > CACHE_SIZE:
+        ocr_cache.popitem(last=False)
 
-app = FastAPI(title="OCR Service", version="1.0.0")
 
 @app.post("/extract")
 async def extract_text(payload: dict):
     """
-    Extract text from document images using docTR
+    Extract text from document images using docTR.
+
+    Every frame is cropped to its document region and perceptually hashed.
+    Frames are ranked by crop sharpness, near-duplicates are folded into the
+    sharpest copy, and only the best few distinct crops are OCR'd (or served
+    from the cache of exact crop digests, which retries and hedged copies
+    hit). The result is a per-field consensus of those crops, so OCR cost
+    follows distinct content rather than frame count.
     """
     try:
         session_id = payload.get("session_id")
-        frames = payload.get("frames", [])
+        frames_data = payload.get("frames", [])
 
-        if not session_id or not frames:
+        if not session_id or not frames_data:
             raise HTTPException(status_code=400, detail="session_id and frames are required")
 
-        # Mock OCR extraction - in real implementation this would use docTR
-        # to extract text from document images
-        mock_texts = [
-            "JOHN DOE\nPASSPORT NO: P123456789\nNATIONALITY: UNITED STATES",
-            "JANE SMITH\nID CARD\nDOB: 01/01/1990",
-            "DRIVER LICENSE\nSTATE OF CALIFORNIA\nDL: A1234567"
-        ]
+        # Frames arrive as references into the session's frame archive; fetch only those with range reads
+        archive_refs = [f for f in frames_data if isinstance(f, dict) and 'key' in f]
+        frames = await run_in_threadpool(load_archive_frames, archive_refs) if archive_refs else []
+
+        with inference_pool.shared(frames) as batch:
+            signatures = await inference_pool.run(models.crop_signatures, batch)
+            ranked = sorted(range(len(frames)), key=lambda i: signatures[i][0], reverse=True)
+            distinct = dedupe([signatures[i][1] for i in ranked], DUPLICATE_DISTANCE)
+            groups = distinct[:MAX_OCR_FRAMES]
+
+            results, misses = {}, []
+            for representative, _ in groups:
+                index = ranked[representative]
+                cached = cache_get(signatures[index][2])
+                if cached is None:
+                    misses.append(index)
+                else:
+                    results[index] = cached
+            if misses:
+                raise_if_expired()
+                selected = [(index, signatures[index][1]) for index in misses]
+                ocr_lines = await inference_pool.run(models.ocr_crops, batch, selected=selected)
+                for index, lines in zip(misses, ocr_lines):
+                    cache_put(signatures[index][2], lines)
+                    results[index] = lines
+
+        frame_results = [(results[ranked[representative]], len(members)) for representative, members in groups]
 
-        extracted_text = random.choice(mock_texts)
-        confidence = random.uniform(0.7, 0.95)
+        extracted_text, fields, confidence = build_consensus(frame_results)
 
         result = {
             "session_id": session_id,
             "text": extracted_text,
+            "fields": fields,
             "confidence": round(confidence, 3),
             "document_type": "passport" if "PASSPORT" in extracted_text.upper() else "id_card",
             "analysis": {
-                "frames_processed": len(frames),
-                "method": "docTR_ocr",
+                "frames_received": len(frames),
+                "distinct_frames": len(distinct),
+                "frames_processed": len(misses),
+                "cache_hits": len(groups) - len(misses),
+                "roi_found": sum(found for _, _, _, found in signatures),
+                "method": models.METHOD,
                 "text_length": len(extracted_text),
                 "language_detected": "en"
             }
@@ -43,6 +155,8 @@ async def extract_text(payload: dict):
 
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OCR extraction failed: {str(e)}")
 
@@ -50,7 +164,11 @@ async def extract_text(payload: dict):
 
 @app.get("/metrics", response_class=PlainTextResponse)
 async def metrics():
-    return "# Metrics not implemented yet\n"
+    return admission.metrics() + inference_pool.metrics("ocr") + (
+        f"ocr_cache_hits_total {cache_stats['hits']}\n"
+        f"ocr_cache_misses_total {cache_stats['misses']}\n"
+        f"ocr_cache_entries {len(ocr_cache)}\n"
+    ) + (frame_cache.metrics("ocr") if frame_cache else "")
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "ocr_svc"}
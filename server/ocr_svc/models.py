@@ -0,0 +1,57 @@
+"""OCR backend, loaded once per inference pool process (see common/inference_pool.py)."""
+import hashlib
+import random
+import numpy as np
+from typing import List
+import cv2
+
+from common.phash import phash
+from roi import extract_roi, sharpness
+
+try:
+    from doctr.models import ocr_predictor
+except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
+    ocr_predictor = None
+
+METHOD = "docTR_ocr" if ocr_predictor is not None else "mock_ocr"
+
+
+def load_model():
+    """The docTR predictor, or None to use the mock"""
+    return ocr_predictor(pretrained=True) if ocr_predictor is not None else None
+
+
+def run_ocr(model, roi: np.ndarray, frame_hash: int) -> List[tuple]:
+    """OCR one document crop into [(line, confidence)]"""
+    if model is not None:
+        page = model([cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)]).pages[0]
+        return [
+            (" ".join(word.value for word in line.words),
+             float(np.mean([word.confidence for word in line.words])))
+            for block in page.blocks for line in block.lines if line.words
+        ]
+
+    # Mock OCR extraction - in real implementation this would use docTR.
+    # Seeded by the crop hash so the same document content reads the same way.
+    mock_texts = [
+        "JOHN DOE\nPASSPORT NO: P123456789\nNATIONALITY: UNITED STATES",
+        "JANE SMITH\nID CARD\nDOB: 01/01/1990",
+        "DRIVER LICENSE\nSTATE OF CALIFORNIA\nDL: A1234567"
+    ]
+    rng = random.Random(frame_hash)
+    return [(line, rng.uniform(0.7, 0.95)) for line in rng.choice(mock_texts).split("\n")]
+
+
+def crop_signatures(model, frames: List[np.ndarray]) -> List[tuple]:
+    """(sharpness, perceptual hash, sha256 digest, document_found) of each frame's document crop; runs inside a pool process"""
+    signatures = []
+    for frame in frames:
+        roi, found = extract_roi(frame)
+        digest = hashlib.sha256(np.ascontiguousarray(roi).tobytes()).hexdigest()
+        signatures.append((sharpness(roi), phash(roi), digest, found))
+    return signatures
+
+
+def ocr_crops(model, frames: List[np.ndarray], selected: List[tuple]) -> List[List[tuple]]:
+    """OCR the document crops of the selected (frame index, hash) pairs; runs inside a pool process"""
+    return [run_ocr(model, extract_roi(frames[index])[0], frame_hash) for index, frame_hash in selected]
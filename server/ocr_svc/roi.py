@@ -0,0 +1,62 @@
+"""Document region detection for OCR.
+
+The document is located on a downscaled copy as the largest convex
+quadrilateral contour, then cut out of the full-resolution frame and
+warped to a fronto-parallel rectangle with the ID-1 card aspect ratio. OCR
+runs on that crop only, so background text and clutter are never read, and
+the crop's perceptual hash does not change when the card moves in frame.
+"""
+import cv2
+import numpy as np
+
+DETECTION_WIDTH = 480
+MIN_DOCUMENT_AREA = 0.15  # fraction of the frame
+ROI_WIDTH = 1000
+ID1_ASPECT = 85.6 / 53.98
+
+
+def _order_corners(quad):
+    """Corners as top-left, top-right, bottom-right, bottom-left"""
+    quad = quad.reshape(4, 2).astype(np.float32)
+    sums, diffs = quad.sum(axis=1), np.diff(quad, axis=1).ravel()
+    return np.array([quad[sums.argmin()], quad[diffs.argmin()], quad[sums.argmax()], quad[diffs.argmax()]])
+
+
+def locate_document(frame):
+    """Corners of the largest document-like quadrilateral in full-frame coordinates, or None"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    scale = DETECTION_WIDTH / gray.shape[1]
+    small = cv2.resize(gray, (DETECTION_WIDTH, max(1, round(gray.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    best, best_area = None, MIN_DOCUMENT_AREA * small.size
+    for contour in contours:
+        quad = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(quad) == 4 and cv2.isContourConvex(quad):
+            area = cv2.contourArea(quad)
+            if area > best_area:
+                best, best_area = quad, area
+    return None if best is None else _order_corners(best) / scale
+
+
+def extract_roi(frame):
+    """(roi, found): the warped document crop, or the whole frame when no document is found"""
+    corners = locate_document(frame)
+    if corners is None:
+        return frame, False
+    top, right, bottom, left = (np.linalg.norm(corners[a] - corners[b]) for a, b in ((0, 1), (1, 2), (2, 3), (3, 0)))
+    width = ROI_WIDTH
+    # Keep portrait documents portrait
+    height = round(width / ID1_ASPECT) if top + bottom >= right + left else round(width * ID1_ASPECT)
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(corners.astype(np.float32), target)
+    return cv2.warpPerspective(frame, matrix, (width, height)), True
+
+
+def sharpness(image):
+    """Variance of the Laplacian; higher is sharper"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import PlainTextResponse
 import random
 import json
@@ -6,62 +7,54 @@ import numpy as np
 from typing import List, Dict, Optional
 import cv2
 from datetime import datetime
+from minio import Minio
 
-app = FastAPI(title="PAD Service", version="1.0.0")
+import models
+from common.admission import Admission, raise_if_expired
+from common.frame_archive import read_frame_refs
+from common.frame_cache import FrameCache
+from common.inference_pool import InferencePool
+from common.serialization import response_class
 
-class MultiSignalPAD:
-    def __init__(self):
-        # Initialize mock models - in real implementation these would be actual ML models
-        self.texture_cnn = MockTextureCNN()
-        self.temporal_analyzer = MockTemporalAnalyzer()
-        self.rppg_analyzer = MockRPPGAnalyzer()
+app = FastAPI(title="PAD Service", version="1.0.0", default_response_class=response_class())
 
-    def analyze_texture(self, frames: List[np.ndarray]) -> float:
-        """Analyze facial texture using CNN for signs of spoofing"""
-        return self.texture_cnn.predict(frames)
+# Requests carry the caller's deadline; at most ADMISSION_MAX_CONCURRENCY run at once, the rest queue briefly or get a 503
+admission = Admission("pad", ["/analyze"])
+app.middleware("http")(admission.middleware)
 
-    def analyze_temporal(self, frames: List[np.ndarray]) -> Dict[str, float]:
-        """Analyze temporal patterns (blinks, head movements)"""
-        return self.temporal_analyzer.analyze(frames)
+# PAD inference runs in INFERENCE_PROCESSES pool processes, each with its own model copy
+inference_pool = InferencePool(models.load_model)
 
-    def analyze_rppg(self, frames: List[np.ndarray]) -> Optional[float]:
-        """Analyze remote photoplethysmography (optional)"""
-        return self.rppg_analyzer.analyze(frames)
 
-class MockTextureCNN:
-    def predict(self, frames: List[np.ndarray]) -> float:
-        """Mock texture analysis - returns liveness score based on texture consistency"""
-        if not frames:
-            return 0.0
-        # Simulate texture analysis - real attacks have inconsistent textures
-        base_score = random.uniform(0.3, 0.9)
-        # Add some variance based on frame count
-        variance = min(len(frames) / 100.0, 0.2)
-        return max(0.0, min(1.0, base_score + random.uniform(-variance, variance)))
-
-class MockTemporalAnalyzer:
-    def analyze(self, frames: List[np.ndarray]) -> Dict[str, float]:
-        """Mock temporal analysis for blinks and head movements"""
-        blink_score = random.uniform(0.4, 0.95)  # Blink pattern consistency
-        head_movement_score = random.uniform(0.5, 0.9)  # Natural head movements
-        overall_temporal = (blink_score + head_movement_score) / 2.0
-
-        return {
-            "blink_consistency": blink_score,
-            "head_movement_naturalness": head_movement_score,
-            "overall_temporal": overall_temporal
-        }
+@app.on_event("startup")
+def start_inference_pool():
+    inference_pool.start()
+
+
+@app.on_event("shutdown")
+def stop_inference_pool():
+    inference_pool.shutdown()
+
+# MinIO client for range reads from the packed frame archives
+minio_client = Minio(
+    "storage:9000",
+    access_key="minioadmin",
+    secret_key="minioadmin",
+    secure=False
+)
 
-class MockRPPGAnalyzer:
-    def analyze(self, frames: List[np.ndarray]) -> Optional[float]:
-        """Mock rPPG analysis - detects blood flow patterns"""
-        if len(frames) < 30:  # Need sufficient frames for rPPG
-            return None
+# Archives shared with the other services on this node, when FRAME_CACHE_DIR is set
+frame_cache = FrameCache.from_env()
 
-        # Simulate rPPG signal detection
-        # Real attacks often lack proper blood flow signals
-        rppg_score = random.uniform(0.2, 0.85)
-        return rppg_score
+
+def load_archive_frames(refs: List[dict]) -> List[np.ndarray]:
+    """Fetch and decode frames referenced by (bucket, key, offset, size) from their archives"""
+    frames = []
+    for data in read_frame_refs(minio_client, refs, cache=frame_cache):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            frames.append(frame)
+    return frames
 
 @app.post("/analyze")
 async def analyze_pad(payload: dict):
@@ -72,29 +65,39 @@ async def analyze_pad(payload: dict):
     try:
         session_id = payload.get("session_id")
         frames_data = payload.get("frames", [])
+        crop_refs = payload.get("face_crops", [])
         enable_rppg = payload.get("enable_rppg", True)
 
         if not session_id:
             raise HTTPException(status_code=400, detail="session_id is required")
 
-        # Initialize multi-signal PAD analyzer
-        pad_analyzer = MultiSignalPAD()
+        # Frames arrive as references into the session's frame archive; fetch only those with range reads
+        archive_refs = [f for f in frames_data if isinstance(f, dict) and 'key' in f]
+        frames = await run_in_threadpool(load_archive_frames, archive_refs) if archive_refs else []
 
-        # Convert frame data to numpy arrays (mock conversion)
-        frames = []
+        # Convert inline frame data to numpy arrays (mock conversion)
         for frame_data in frames_data:
             if isinstance(frame_data, dict) and 'data' in frame_data:
                 # Mock frame processing - in real implementation, decode base64 or process binary data
-                frame = np.random.rand(480, 640, 3)  # Mock RGB frame
+                frame = np.random.randint(0, 256, (480, 640, 3), dtype=np.uint8)  # Mock RGB frame
                 frames.append(frame)
 
         if not frames:
             raise HTTPException(status_code=400, detail="No valid frames provided")
 
-        # Perform multi-signal analysis
-        texture_score = pad_analyzer.analyze_texture(frames)
-        temporal_results = pad_analyzer.analyze_temporal(frames)
-        rppg_score = pad_analyzer.analyze_rppg(frames) if enable_rppg else None
+        # Faces detected and aligned once by the worker; the texture CNN runs on these crops
+        crops = await run_in_threadpool(load_archive_frames, crop_refs) if crop_refs else []
+
+        # Frame loading may have used up the caller's time budget
+        raise_if_expired()
+
+        # Perform multi-signal analysis in a pool process; frames travel through shared memory
+        signals = await inference_pool.run(
+            models.analyze, frames + crops, enable_rppg=enable_rppg, crop_count=len(crops)
+        )
+        texture_score = signals["texture"]
+        temporal_results = signals["temporal"]
+        rppg_score = signals["rppg"]
 
         # Combine scores with weights
         weights = {
@@ -125,6 +128,7 @@ async def analyze_pad(payload: dict):
             "passed": passed,
             "analysis": {
                 "frame_count": len(frames),
+                "face_crop_count": len(crops),
                 "method": "multi_signal_pad",
                 "signals_analyzed": {
                     "texture_cnn": round(texture_score, 3),
@@ -140,6 +144,8 @@ async def analyze_pad(payload: dict):
 
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PAD analysis failed: {str(e)}")
 
@@ -147,7 +153,7 @@ async def analyze_pad(payload: dict):
 
 @app.get("/metrics", response_class=PlainTextResponse)
 async def metrics():
-    return "# Metrics not implemented yet\n"
+    return admission.metrics() + inference_pool.metrics("pad") + (frame_cache.metrics("pad") if frame_cache else "")
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "pad_svc"}
@@ -0,0 +1,95 @@
+"""PAD models, loaded once per inference pool process (see common/inference_pool.py)."""
+import random
+import numpy as np
+from typing import List, Dict, Optional
+
+from common import onnx_backend
+
+
+class MultiSignalPAD:
+    def __init__(self):
+        # The texture CNN runs on ONNX Runtime when pad_texture.onnx is deployed; the other signals are still mocks
+        self.texture_cnn = OnnxTextureCNN.load() or MockTextureCNN()
+        self.temporal_analyzer = MockTemporalAnalyzer()
+        self.rppg_analyzer = MockRPPGAnalyzer()
+
+    def analyze_texture(self, frames: List[np.ndarray]) -> float:
+        """Analyze facial texture using CNN for signs of spoofing"""
+        return self.texture_cnn.predict(frames)
+
+    def analyze_temporal(self, frames: List[np.ndarray]) -> Dict[str, float]:
+        """Analyze temporal patterns (blinks, head movements)"""
+        return self.temporal_analyzer.analyze(frames)
+
+    def analyze_rppg(self, frames: List[np.ndarray]) -> Optional[float]:
+        """Analyze remote photoplethysmography (optional)"""
+        return self.rppg_analyzer.analyze(frames)
+
+class OnnxTextureCNN:
+    """Texture CNN classifying face crops as live or spoof (common/onnx_backend.py)"""
+
+    def __init__(self, classifier: onnx_backend.ImageClassifier):
+        self.classifier = classifier
+
+    @classmethod
+    def load(cls) -> Optional["OnnxTextureCNN"]:
+        classifier = onnx_backend.load("pad_texture", cls=onnx_backend.ImageClassifier)
+        return cls(classifier) if classifier is not None else None
+
+    def predict(self, frames: List[np.ndarray]) -> float:
+        """Mean live probability over the frames"""
+        if not frames:
+            return 0.0
+        return float(self.classifier.scores(frames).mean())
+
+class MockTextureCNN:
+    def predict(self, frames: List[np.ndarray]) -> float:
+        """Mock texture analysis - returns liveness score based on texture consistency"""
+        if not frames:
+            return 0.0
+        # Simulate texture analysis - real attacks have inconsistent textures
+        base_score = random.uniform(0.3, 0.9)
+        # Add some variance based on frame count
+        variance = min(len(frames) / 100.0, 0.2)
+        return max(0.0, min(1.0, base_score + random.uniform(-variance, variance)))
+
+class MockTemporalAnalyzer:
+    def analyze(self, frames: List[np.ndarray]) -> Dict[str, float]:
+        """Mock temporal analysis for blinks and head movements"""
+        blink_score = random.uniform(0.4, 0.95)  # Blink pattern consistency
+        head_movement_score = random.uniform(0.5, 0.9)  # Natural head movements
+        overall_temporal = (blink_score + head_movement_score) / 2.0
+
+        return {
+            "blink_consistency": blink_score,
+            "head_movement_naturalness": head_movement_score,
+            "overall_temporal": overall_temporal
+        }
+
+class MockRPPGAnalyzer:
+    def analyze(self, frames: List[np.ndarray]) -> Optional[float]:
+        """Mock rPPG analysis - detects blood flow patterns"""
+        if len(frames) < 30:  # Need sufficient frames for rPPG
+            return None
+
+        # Simulate rPPG signal detection
+        # Real attacks often lack proper blood flow signals
+        rppg_score = random.uniform(0.2, 0.85)
+        return rppg_score
+
+
+def load_model() -> MultiSignalPAD:
+    return MultiSignalPAD()
+
+
+def analyze(model: MultiSignalPAD, arrays: List[np.ndarray], enable_rppg: bool = True, crop_count: int = 0) -> Dict:
+    """Run every PAD signal on one batch of frames; runs inside a pool process.
+
+    The last `crop_count` arrays are aligned face crops of those frames; texture is scored on them when present.
+    """
+    frames, crops = arrays[:len(arrays) - crop_count], arrays[len(arrays) - crop_count:]
+    return {
+        "texture": model.analyze_texture(crops or frames),
+        "temporal": model.analyze_temporal(frames),
+        "rppg": model.analyze_rppg(frames) if enable_rppg else None,
+    }
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Decode Scaling Benchmark for Segment-Parallel Frame Extraction
+
+Decodes the candidate frames of a video with 1..N worker processes (see
+worker/parallel_decode.py) and reports wall time, decoded frames per second,
+speedup and parallel efficiency per process count. Without --video a
+synthetic clip is generated with OpenCV (use --resolution 3840x2160 for 4K).
+
+Usage: python scripts/benchmark_decode.py [--video sample.mp4] [--max-processes 8] [--interval 5]
+                                          [--resolution 1920x1080] [--seconds 30] [--runs 3]
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import cv2
+import numpy as np
+from pathlib import Path
+from worker.parallel_decode import decode_candidates, keyframe_indices
+
+
+def generate_video(path, width, height, seconds, fps=30):
+    """Write a synthetic clip with moving texture so every frame differs"""
+    rng = np.random.default_rng(0)
+    texture = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for i in range(int(seconds * fps)):
+        frame = np.roll(texture, shift=i * 4, axis=1)
+        cv2.putText(frame, f"{i:05d}", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 4, (255, 255, 255), 8)
+        writer.write(frame)
+    writer.release()
+
+
+def benchmark_scaling(video_path, max_processes, interval, runs):
+    results = []
+    reference = None
+    for processes in range(1, max_processes + 1):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            candidates, _ = decode_candidates(video_path, interval, processes=processes)
+            timings.append(time.perf_counter() - start)
+
+        frame_numbers = [frame_number for frame_number, _, _ in candidates]
+        if reference is None:
+            reference = frame_numbers
+        wall = statistics.median(timings)
+        results.append({
+            'processes': processes,
+            'seconds_median': wall,
+            'candidates': len(candidates),
+            'candidates_per_second': len(candidates) / wall if wall else 0.0,
+            'identical_to_sequential': frame_numbers == reference,
+        })
+
+    baseline = results[0]['seconds_median']
+    for row in results:
+        row['speedup'] = baseline / row['seconds_median'] if row['seconds_median'] else 0.0
+        row['efficiency'] = row['speedup'] / row['processes']
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark segment-parallel decoding from 1 to N processes")
+    parser.add_argument('--video', help="Video to decode (default: generate a synthetic clip)")
+    parser.add_argument('--max-processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--interval', type=int, default=5, help="Decode every n-th frame as a candidate")
+    parser.add_argument('--resolution', default='1920x1080', help="Synthetic clip resolution, WIDTHxHEIGHT")
+    parser.add_argument('--seconds', type=float, default=30, help="Synthetic clip length")
+    parser.add_argument('--runs', type=int, default=3, help="Repetitions per process count")
+    return parser.parse_args()
+
+
+def main(args):
+    video_path = args.video
+    if video_path is None:
+        width, height = (int(v) for v in args.resolution.lower().split('x'))
+        video_path = os.path.join(tempfile.mkdtemp(), 'synthetic.mp4')
+        print(f"🎞️  Generating {args.seconds:.0f}s {width}x{height} synthetic clip...")
+        generate_video(video_path, width, height, args.seconds)
+
+    keyframes = keyframe_indices(video_path)
+    print(f"⏱️  Benchmarking decode of {video_path} with 1..{args.max_processes} processes "
+          f"({'ffprobe keyframes: ' + str(len(keyframes)) if keyframes is not None else 'no ffprobe, even split'})")
+
+    results = benchmark_scaling(video_path, args.max_processes, args.interval, args.runs)
+    for row in results:
+        print(f"  {row['processes']:>2} processes: {row['seconds_median']:.2f}s, "
+              f"{row['candidates_per_second']:,.0f} candidates/s, speedup {row['speedup']:.2f}x, "
+              f"efficiency {row['efficiency']:.0%}{'' if row['identical_to_sequential'] else ' ⚠️ output differs'}")
+
+    os.makedirs('benchmark_results', exist_ok=True)
+    output_path = 'benchmark_results/decode_scaling.json'
+    with open(output_path, 'w') as f:
+        json.dump({'video': video_path, 'interval': args.interval, 'runs': args.runs, 'results': results}, f, indent=2)
+    print(f"📄 Results saved to {output_path}")
+
+
+if __name__ == '__main__':
+    # Ensure we're in the server directory
+    os.chdir(Path(__file__).parent.parent)
+    main(parse_args())
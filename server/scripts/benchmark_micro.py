@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark Suite for Pipeline Hot Functions
+
+Times the worker's frame extraction and frame archive upload (against a
+local S3 stand-in), the upload integrity check of /ingest, risk scoring,
+threshold benchmarking and the request handler of every analysis service.
+Each benchmark is sampled --repeat times after one warm-up call; its peak
+Python memory (tracemalloc) is measured on one extra call. A run is saved as
+a versioned JSON baseline (benchmark_results/micro_<label>.json) with the
+git commit and environment it was taken on.
+
+`compare` flags benchmarks whose samples got significantly slower (one-sided
+Mann-Whitney U test, p < --alpha, and a median slowdown above
+--min-slowdown) or whose peak memory grew by more than --memory-growth, and
+exits with status 1 if any did.
+
+Benchmarks whose dependencies are missing are recorded as skipped, and
+ones that raise as failed; neither is compared. Run from
+server/ in an environment with the worker, API and service requirements;
+without --s3-endpoint the S3 stand-in is an in-process moto server.
+
+Usage: python scripts/benchmark_micro.py run [--label after] [--repeat 20] [--only risk] [--s3-endpoint host:port]
+       python scripts/benchmark_micro.py compare benchmark_results/micro_before.json \\
+                                                 benchmark_results/micro_after.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import platform
+import subprocess
+import tempfile
+import importlib
+import importlib.util
+import statistics
+import logging
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+# The worker reads its config from /app/config.yaml unless told otherwise
+os.environ.setdefault("KYC_CONFIG_PATH", str(Path(__file__).resolve().parent.parent / "config.yaml"))
+# One inference process per service keeps handler timings comparable across machines
+os.environ.setdefault("INFERENCE_PROCESSES", "1")
+
+try:
+    from moto.server import ThreadedMotoServer
+except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
+    ThreadedMotoServer = None
+
+SCHEMA_VERSION = 1
+DEFAULT_REPEAT = 20
+BENCH_BUCKET = "kyc-frames"
+
+TD3_SPECIMEN = (
+    "P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<\n"
+    "L898902C36UTO7408122F1204159ZE184226B<<<<<10"
+)
+
+BENCHMARKS = {}
+
+
+class SkipBenchmark(Exception):
+    pass
+
+
+def benchmark(name, repeat=None):
+    """Register a setup function returning (call, teardown) for a named benchmark"""
+    def register(setup):
+        BENCHMARKS[name] = (setup, repeat)
+        return setup
+    return register
+
+
+def require(module_name):
+    """Import a module, or skip the benchmark when it (or a dependency) is missing"""
+    try:
+        return importlib.import_module(module_name)
+    except ModuleNotFoundError as e:
+        raise SkipBenchmark(f"missing dependency: {e.name}")
+
+
+class Fixtures:
+    """Inputs shared by the benchmarks, built on first use"""
+
+    def __init__(self, s3_endpoint=None):
+        self.s3_endpoint = s3_endpoint
+        self.workdir = tempfile.mkdtemp(prefix="benchmark_micro_")
+        self.moto = None
+        self._s3 = None
+        self._video = None
+        self._archive = None
+
+    @property
+    def video(self):
+        if self._video is None:
+            from benchmark_decode import generate_video
+            self._video = os.path.join(self.workdir, "clip.mp4")
+            generate_video(self._video, 640, 360, 10)
+        return self._video
+
+    @property
+    def s3(self):
+        """MinIO client for the S3 stand-in"""
+        if self._s3 is None:
+            minio = require("minio")
+            endpoint = self.s3_endpoint
+            if endpoint is None:
+                if ThreadedMotoServer is None:
+                    raise SkipBenchmark("no S3 stand-in: install moto[server] or pass --s3-endpoint")
+                logging.getLogger("werkzeug").setLevel(logging.ERROR)
+                self.moto = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+                self.moto.start()
+                host, port = self.moto.get_host_and_port()
+                endpoint = f"{host}:{port}"
+            self._s3 = minio.Minio(endpoint, access_key="minioadmin", secret_key="minioadmin", secure=False)
+            if not self._s3.bucket_exists(BENCH_BUCKET):
+                self._s3.make_bucket(BENCH_BUCKET)
+        return self._s3
+
+    @property
+    def archive(self):
+        """(local path, descriptor) of a frame archive of the clip, uploaded to the stand-in"""
+        if self._archive is None:
+            tasks = require("worker.tasks")
+            frame_archive = require("common.frame_archive")
+            path = os.path.join(self.workdir, "frames.kfa")
+            entries, _, _ = tasks.extract_frames(self.video, path, tasks.config["frame_selection"])
+            self.s3.fput_object(BENCH_BUCKET, "bench/frames.kfa", path)
+            self._archive = (path, frame_archive.describe(BENCH_BUCKET, "bench/frames.kfa", entries))
+        return self._archive
+
+    def frame_refs(self, count):
+        frame_archive = require("common.frame_archive")
+        _, descriptor = self.archive
+        return frame_archive.frame_refs(descriptor, range(min(count, descriptor["frame_count"])))
+
+    def close(self):
+        if self.moto is not None:
+            self.moto.stop()
+
+
+# --- Worker ---------------------------------------------------------------
+
+@benchmark("worker.extract_frames", repeat=5)
+def bench_extract_frames(fixtures):
+    tasks = require("worker.tasks")
+    path = os.path.join(fixtures.workdir, "extract.kfa")
+    return lambda: tasks.extract_frames(fixtures.video, path, tasks.config["frame_selection"]), None
+
+
+@benchmark("worker.upload_frame_archive", repeat=10)
+def bench_upload_frame_archive(fixtures):
+    tasks = require("worker.tasks")
+    path, _ = fixtures.archive
+    original = tasks.minio_client
+    tasks.minio_client = fixtures.s3
+
+    def teardown():
+        tasks.minio_client = original
+    return lambda: tasks.upload_frame_archive("bench", path), teardown
+
+
+@benchmark("worker.score_session_x1000")
+def bench_score_session(fixtures):
+    tasks = require("worker.tasks")
+    risk = require("worker.risk")
+    rng = np.random.default_rng(0)
+    sessions = [dict(zip(risk.COMPONENTS, map(float, row))) for row in rng.random((1000, len(risk.COMPONENTS)))]
+    return lambda: [risk.score_session(scores, tasks.config) for scores in sessions], None
+
+
+@benchmark("worker.evaluate_100k")
+def bench_evaluate(fixtures):
+    tasks = require("worker.tasks")
+    risk = require("worker.risk")
+    rng = np.random.default_rng(0)
+    scores = {component: rng.random(100_000) for component in risk.COMPONENTS}
+    return lambda: risk.evaluate(scores, tasks.config), None
+
+
+@benchmark("scripts.red_team_histogram_1m")
+def bench_thresholds(fixtures):
+    red_team = require("benchmark_red_team")
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 2, 1_000_000)
+    scores = rng.random(1_000_000) * 0.6 + labels * 0.4
+    chunk = red_team.DEFAULT_CHUNK_SIZE
+    thresholds = np.arange(0.0, 1.0, 0.05)
+
+    def run():
+        # As main() does: fold the streamed chunks into a histogram, then sweep the thresholds
+        histogram = red_team.ScoreHistogram()
+        for start in range(0, len(scores), chunk):
+            histogram.update(scores[start:start + chunk], labels[start:start + chunk])
+        return red_team.benchmark_histogram_thresholds(histogram, thresholds)
+    return run, None
+
+
+# --- API ------------------------------------------------------------------
+
+@benchmark("api.integrity_digests_25mb", repeat=10)
+def bench_integrity(fixtures):
+    spec = importlib.util.spec_from_file_location("api_main", "api/main.py")
+    api = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(api)
+    except (ModuleNotFoundError, RuntimeError) as e:
+        raise SkipBenchmark(f"API does not import here: {e}")
+    content = np.random.default_rng(0).integers(0, 256, 25 * 1024 * 1024, dtype=np.uint8).tobytes()
+    return lambda: api.integrity_digests(content), None
+
+
+# --- Analysis services ----------------------------------------------------
+
+SERVICE_MODULES = ["main", "models", "roi", "consensus", "band"]
+
+
+def service_handler(service, path, payload_factory, uses_frames=False):
+    """Setup for one service endpoint, called in-process through its ASGI app"""
+    def setup(fixtures):
+        httpx = require("httpx")
+        payload = payload_factory(fixtures)
+        service_dir = str(Path(service).resolve())
+        sys.path.insert(0, service_dir)
+        for name in SERVICE_MODULES:
+            sys.modules.pop(name, None)
+        try:
+            module = importlib.import_module("main")
+        except ModuleNotFoundError as e:
+            sys.path.remove(service_dir)
+            raise SkipBenchmark(f"missing dependency: {e.name}")
+        if uses_frames:
+            module.minio_client = fixtures.s3
+
+        loop = asyncio.new_event_loop()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=module.app), base_url="http://bench")
+
+        def call():
+            response = loop.run_until_complete(client.post(path, json=payload))
+            if response.status_code != 200:
+                raise RuntimeError(f"{service}{path} answered {response.status_code}: {response.text[:200]}")
+
+        def teardown():
+            loop.run_until_complete(client.aclose())
+            loop.close()
+            pool = getattr(module, "inference_pool", None)
+            if pool is not None:
+                pool.shutdown()
+            sys.path.remove(service_dir)
+            for name in SERVICE_MODULES:
+                sys.modules.pop(name, None)
+        return call, teardown
+    return setup
+
+
+for _name, _service, _path, _payload, _frames in [
+    ("pad_svc./analyze", "pad_svc", "/analyze",
+     lambda f: {"session_id": "bench", "frames": f.frame_refs(10)}, True),
+    ("deepfake_svc./analyze", "deepfake_svc", "/analyze",
+     lambda f: {"session_id": "bench", "video_path": "bench/selfie_proxy.mp4"}, False),
+    ("facematch_svc./match", "facematch_svc", "/match",
+     lambda f: {"session_id": "bench", "face_frames": f.frame_refs(3), "id_photo_path": f.frame_refs(1)[0]}, False),
+    ("ocr_svc./extract", "ocr_svc", "/extract",
+     lambda f: {"session_id": "bench", "frames": f.frame_refs(4)}, True),
+    ("mrz_svc./parse", "mrz_svc", "/parse",
+     lambda f: {"session_id": "bench", "ocr_text": TD3_SPECIMEN}, False),
+    ("mrz_svc./parse/frames", "mrz_svc", "/parse/frames",
+     lambda f: {"session_id": "bench", "frames": f.frame_refs(3)}, True),
+    ("doclive_svc./analyze", "doclive_svc", "/analyze",
+     lambda f: {"session_id": "bench", "frames": f.frame_refs(6)}, True),
+]:
+    benchmark(_name, repeat=10)(service_handler(_service, _path, _payload, _frames))
+
+
+# --- Running and comparing ------------------------------------------------
+
+def measure(call, repeat):
+    """Wall-time samples of `repeat` calls after a warm-up, and the peak traced memory of one more"""
+    call()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return samples, peak
+
+
+def run_suite(fixtures, repeat, only=None):
+    results = {}
+    for name, (setup, default_repeat) in BENCHMARKS.items():
+        if only and not any(part in name for part in only):
+            continue
+        try:
+            call, teardown = setup(fixtures)
+        except SkipBenchmark as e:
+            print(f"  ⏭️  {name}: skipped ({e})")
+            results[name] = {'skipped': str(e)}
+            continue
+        try:
+            samples, peak = measure(call, default_repeat or repeat)
+        except Exception as e:
+            print(f"  ❌ {name}: failed ({e})")
+            results[name] = {'error': str(e)}
+            continue
+        finally:
+            if teardown is not None:
+                teardown()
+        quartiles = statistics.quantiles(samples, n=4)
+        results[name] = {
+            'repeat': len(samples),
+            'samples_seconds': samples,
+            'median_seconds': statistics.median(samples),
+            'iqr_seconds': quartiles[2] - quartiles[0],
+            'peak_memory_bytes': peak,
+        }
+        print(f"  {name}: {results[name]['median_seconds'] * 1000:.2f} ms median "
+              f"(IQR {results[name]['iqr_seconds'] * 1000:.2f} ms), peak {peak / 2**20:.1f} MiB")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def average_ranks(values):
+    """Ranks starting at 1, ties sharing their average rank"""
+    order = np.argsort(values, kind='mergesort')
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(1, len(values) + 1)
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return sums[inverse] / counts[inverse]
+
+
+def slower_p_value(before, after):
+    """One-sided p-value that `after` samples are larger than `before` (Mann-Whitney U, normal approximation)"""
+    n1, n2 = len(after), len(before)
+    combined = np.concatenate([after, before])
+    u = average_ranks(combined)[:n1].sum() - n1 * (n1 + 1) / 2
+    _, counts = np.unique(combined, return_counts=True)
+    n = n1 + n2
+    tie_correction = (counts ** 3 - counts).sum() / (n * (n - 1))
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_correction))
+    if sigma == 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / sigma
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(before_path, after_path, alpha, min_slowdown, memory_growth):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    if before.get('schema_version') != after.get('schema_version'):
+        print(f"❌ Baseline schema versions differ: {before.get('schema_version')} vs {after.get('schema_version')}")
+        return 1
+
+    print(f"📊 {before['label']} ({before['git_commit']}) → {after['label']} ({after['git_commit']})")
+    regressions = 0
+    for name, new in after['benchmarks'].items():
+        old = before['benchmarks'].get(name)
+        if old is None or 'samples_seconds' not in old or 'samples_seconds' not in new:
+            print(f"  {name}: not comparable")
+            continue
+        ratio = new['median_seconds'] / old['median_seconds'] if old['median_seconds'] else math.inf
+        p_value = slower_p_value(np.array(old['samples_seconds']), np.array(new['samples_seconds']))
+        slower = p_value < alpha and ratio > 1 + min_slowdown
+        memory_ratio = new['peak_memory_bytes'] / old['peak_memory_bytes'] if old['peak_memory_bytes'] else 1.0
+        grew = memory_ratio > 1 + memory_growth and new['peak_memory_bytes'] - old['peak_memory_bytes'] > 2**20
+        flags = (['⚠️ slower'] if slower else []) + (['⚠️ memory'] if grew else [])
+        regressions += bool(flags)
+        print(f"  {name}: {old['median_seconds'] * 1000:.2f} → {new['median_seconds'] * 1000:.2f} ms "
+              f"({ratio:.2f}x, p={p_value:.3g}), peak memory {memory_ratio:.2f}x {' '.join(flags)}")
+
+    if regressions:
+        print(f"❌ {regressions} benchmark(s) regressed")
+        return 1
+    print("✅ No significant regressions")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of pipeline hot functions with stored baselines")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="Run the suite and save it as a baseline")
+    run.add_argument('--label', default='current', help="Name of this run, used in the output file name")
+    run.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Samples per benchmark (some use fewer)")
+    run.add_argument('--only', action='append', help="Run only benchmarks whose name contains this (repeatable)")
+    run.add_argument('--s3-endpoint', help="host:port of an S3 server to use instead of an in-process moto server")
+
+    diff = commands.add_parser('compare', help="Flag regressions between two saved runs")
+    diff.add_argument('before')
+    diff.add_argument('after')
+    diff.add_argument('--alpha', type=float, default=0.01, help="Significance level of the slowdown test")
+    diff.add_argument('--min-slowdown', type=float, default=0.05, help="Ignore median slowdowns below this share")
+    diff.add_argument('--memory-growth', type=float, default=0.10, help="Flag peak memory growth above this share")
+    return parser.parse_args()
+
+
+def main(args):
+    if args.command == 'compare':
+        return compare(args.before, args.after, args.alpha, args.min_slowdown, args.memory_growth)
+
+    selected = [name for name in BENCHMARKS if not args.only or any(part in name for part in args.only)]
+    print(f"⏱️  Running {len(selected)} microbenchmarks...")
+    fixtures = Fixtures(args.s3_endpoint)
+    try:
+        results = run_suite(fixtures, args.repeat, args.only)
+    finally:
+        fixtures.close()
+
+    os.makedirs('benchmark_results', exist_ok=True)
+    output_path = f"benchmark_results/micro_{args.label}.json"
+    with open(output_path, 'w') as f:
+        json.dump({
+            'schema_version': SCHEMA_VERSION,
+            'label': args.label,
+            'git_commit': git_commit(),
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'benchmarks': results,
+        }, f, indent=2)
+    print(f"📄 Results saved to {output_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    # Ensure we're in the server directory
+    os.chdir(Path(__file__).parent.parent)
+    sys.exit(main(parse_args()))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+MRZ Batch Parsing Throughput Benchmark
+
+Generates synthetic TD1/TD2/TD3 zones with correct check digits (a share of
+them corrupted), then measures single-core throughput of the vectorized
+ICAO 9303 parser (common/icao9303.py) in MRZ lines per second: validation
+only, with field extraction, and with NDJSON serialization as streamed by
+mrz_svc's /parse/batch.
+
+Usage: python scripts/benchmark_mrz.py [--records 200000] [--chunk 2000] [--corrupt 0.1] [--runs 3]
+"""
+
+import os
+import json
+import time
+import random
+import string
+import argparse
+import statistics
+from pathlib import Path
+from common.icao9303 import LAYOUTS, check_digit, parse_batch, to_ndjson
+
+ALNUM = string.ascii_uppercase + string.digits
+
+
+def _date(rng):
+    return f"{rng.randint(0, 99):02d}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+
+
+def _field(rng, length, alphabet=ALNUM):
+    value = "".join(rng.choice(alphabet) for _ in range(rng.randint(length // 2, length)))
+    return value.ljust(length, "<")
+
+
+def _names(rng, length):
+    surname = "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(3, 12)))
+    given = "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(3, 10)))
+    return f"{surname}<<{given}"[:length].ljust(length, "<")
+
+
+def synthetic_zone(rng, fmt):
+    """One zone with valid check digits, as a list of lines"""
+    number, birth, expiry = _field(rng, 9), _date(rng), _date(rng)
+    sex, country = rng.choice("MF<"), "".join(rng.choice(string.ascii_uppercase) for _ in range(3))
+    if fmt == "TD3":
+        personal = _field(rng, 14)
+        line2 = (number + check_digit(number) + country + birth + check_digit(birth) + sex
+                 + expiry + check_digit(expiry) + personal + check_digit(personal))
+        line2 += check_digit(line2[0:10] + line2[13:20] + line2[21:43])
+        return ["P<" + country + _names(rng, 39), line2]
+    if fmt == "TD2":
+        optional = _field(rng, 7)
+        line2 = (number + check_digit(number) + country + birth + check_digit(birth) + sex
+                 + expiry + check_digit(expiry) + optional)
+        line2 += check_digit(line2[0:10] + line2[13:20] + line2[21:35])
+        return ["I<" + country + _names(rng, 31), line2]
+    optional1, optional2 = _field(rng, 15), _field(rng, 11)
+    line1 = "I<" + country + number + check_digit(number) + optional1
+    line2 = birth + check_digit(birth) + sex + expiry + check_digit(expiry) + country + optional2
+    line2 += check_digit(line1[5:30] + line2[0:7] + line2[8:15] + line2[18:29])
+    return [line1, line2, _names(rng, 30)]
+
+
+def corrupt(rng, lines):
+    """Replace one character with a digit; unless it lands in the names, a check fails"""
+    row = rng.randrange(len(lines))
+    col = rng.randrange(len(lines[row]))
+    replacement = rng.choice([c for c in string.digits if c != lines[row][col]])
+    lines[row] = lines[row][:col] + replacement + lines[row][col + 1:]
+    return lines
+
+
+def generate_records(count, corrupt_share, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        lines = synthetic_zone(rng, rng.choice(list(LAYOUTS)))
+        if rng.random() < corrupt_share:
+            lines = corrupt(rng, lines)
+        records.append("\n".join(lines))
+    return records
+
+
+def run_mode(records, chunk, mode):
+    start = time.perf_counter()
+    for offset in range(0, len(records), chunk):
+        results = parse_batch(records[offset:offset + chunk], fields=mode != "validate")
+        if mode == "ndjson":
+            to_ndjson(results)
+    return time.perf_counter() - start
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark batch MRZ parsing throughput on one core")
+    parser.add_argument('--records', type=int, default=200_000, help="Synthetic zones to parse")
+    parser.add_argument('--chunk', type=int, default=2000, help="Zones per parse_batch call (the /parse/batch chunk size)")
+    parser.add_argument('--corrupt', type=float, default=0.1, help="Share of zones with a corrupted character")
+    parser.add_argument('--runs', type=int, default=3, help="Repetitions per mode")
+    return parser.parse_args()
+
+
+def main(args):
+    print(f"🧾 Generating {args.records:,} synthetic TD1/TD2/TD3 zones...")
+    records = generate_records(args.records, args.corrupt)
+    line_count = sum(record.count("\n") + 1 for record in records)
+
+    results = parse_batch(records[:args.chunk])
+    expected_invalid = sum(not r["valid"] for r in results)
+    print(f"   Sanity check: {expected_invalid} of {len(results)} zones in the first chunk fail validation "
+          f"(~{args.corrupt:.0%} corrupted)")
+
+    report = []
+    for mode in ("validate", "fields", "ndjson"):
+        seconds = statistics.median(run_mode(records, args.chunk, mode) for _ in range(args.runs))
+        row = {
+            'mode': mode,
+            'seconds_median': seconds,
+            'records_per_second': args.records / seconds,
+            'lines_per_second': line_count / seconds,
+        }
+        report.append(row)
+        print(f"  {mode:>8}: {seconds:.2f}s, {row['records_per_second']:,.0f} zones/s, "
+              f"{row['lines_per_second']:,.0f} lines/s")
+
+    os.makedirs('benchmark_results', exist_ok=True)
+    output_path = 'benchmark_results/mrz_batch.json'
+    with open(output_path, 'w') as f:
+        json.dump({'records': args.records, 'lines': line_count, 'chunk': args.chunk,
+                   'corrupt': args.corrupt, 'runs': args.runs, 'results': report}, f, indent=2)
+    print(f"📄 Results saved to {output_path}")
+
+
+if __name__ == '__main__':
+    # Ensure we're in the server directory
+    os.chdir(Path(__file__).parent.parent)
+    main(parse_args())
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+ONNX Runtime fp32 vs int8 Benchmark on the Red Team Set
+
+``calibrate`` writes the int8 model a service loads with
+INFERENCE_PRECISION=int8 (common/onnx_backend.py): statically quantized
+with activation ranges calibrated on frames sampled from a directory of
+representative videos, or dynamically quantized with --dynamic.
+
+``run`` scores frames sampled from every red team video listed in
+red_team_labels.json with the fp32 and the int8 model, on the same thread
+settings, and reports per-video latency (median and p95), model size, the
+share of correct decisions at the service threshold per precision and
+attack type, and how far the int8 scores and decisions move from fp32.
+
+Usage: python scripts/benchmark_onnx.py calibrate --model pad_texture --videos red_team_videos [--dynamic]
+       python scripts/benchmark_onnx.py run --model pad_texture --videos red_team_videos [--runs 5] [--threads 1]
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+
+from common import onnx_backend
+
+LABELS_PATH = Path(__file__).resolve().parent.parent.parent / 'red_team_labels.json'
+# Config threshold compared with each model's mean live probability
+THRESHOLDS = {'pad_texture': 'pad_texture', 'doc_liveness': 'doc_liveness'}
+
+
+def sample_frames(path, count):
+    """`count` evenly spaced frames of a video"""
+    cap = cv2.VideoCapture(str(path))
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for frame_number in np.linspace(0, max(total - 1, 0), count).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_number))
+        ok, frame = cap.read()
+        if ok:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+
+def video_path(videos_dir, video):
+    """Path of a labeled video: seed_red_team.py's <attack>/<variation>_<n>.mp4 layout, or <video_id>.mp4"""
+    index = video['video_id'].rsplit('_', 1)[-1]
+    for candidate in [Path(videos_dir) / video['attack_type'] / f"{video['variation']}_{index}.mp4",
+                      Path(videos_dir) / f"{video['video_id']}.mp4"]:
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def calibration_batches(classifier, paths, frames_per_video):
+    """Preprocessed input batches, split to the model's batch size when it is fixed"""
+    batch_size = classifier.input_shape[0]
+    for path in paths:
+        frames = sample_frames(path, frames_per_video)
+        if not frames:
+            continue
+        batch = classifier.preprocess(frames)
+        if isinstance(batch_size, int):
+            for start in range(0, len(batch) - batch_size + 1, batch_size):
+                yield batch[start:start + batch_size]
+        else:
+            yield batch
+
+
+def calibrate(args):
+    src = onnx_backend.model_path(args.model, 'fp32', args.model_dir)
+    dst = onnx_backend.model_path(args.model, 'int8', args.model_dir)
+    if not os.path.exists(src):
+        print(f"❌ No fp32 model at {src}")
+        return 1
+
+    started = time.perf_counter()
+    if args.dynamic:
+        print(f"⚙️  Dynamic int8 quantization of {src}")
+        onnx_backend.quantize_dynamic(src, dst)
+    else:
+        paths = sorted(Path(args.videos).rglob('*.mp4'))[:args.max_videos]
+        if not paths:
+            print(f"❌ No calibration videos under {args.videos}")
+            return 1
+        print(f"⚙️  Static int8 quantization of {src}, calibrated on {len(paths)} videos")
+        classifier = onnx_backend.ImageClassifier(src)
+        onnx_backend.quantize_static(src, dst, calibration_batches(classifier, paths, args.frames_per_video))
+    print(f"✅ Wrote {dst} ({os.path.getsize(dst) / 1e6:.1f} MB, fp32 {os.path.getsize(src) / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+def time_scores(classifier, frames, runs):
+    """(median seconds, per-run seconds, live scores) for one video's frames"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        scores = classifier.scores(frames)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), timings, scores
+
+
+def run(args):
+    with open(args.labels) as f:
+        videos = [(video, video_path(args.videos, video)) for video in json.load(f)['videos']]
+    missing = [video['video_id'] for video, path in videos if path is None]
+    videos = [(video, path) for video, path in videos if path is not None]
+    if missing:
+        print(f"⚠️  {len(missing)} labeled videos not found under {args.videos}")
+    if not videos:
+        print("❌ No red team videos to benchmark")
+        return 1
+
+    with open('config.yaml') as f:
+        threshold = args.threshold or yaml.safe_load(f)['thresholds'][THRESHOLDS.get(args.model, 'pad')]
+    classifiers = {}
+    for precision in onnx_backend.PRECISIONS:
+        path = onnx_backend.model_path(args.model, precision, args.model_dir)
+        if not os.path.exists(path):
+            print(f"❌ No {precision} model at {path} (int8: run the calibrate command first)")
+            return 1
+        classifiers[precision] = onnx_backend.ImageClassifier(path, args.threads, 1)
+
+    print(f"🔬 {args.model}: {len(videos)} videos, {args.frames} frames each, threshold {threshold}, "
+          f"{args.threads} intra-op threads")
+    rows = []
+    for video, path in videos:
+        frames = sample_frames(path, args.frames)
+        if not frames:
+            continue
+        row = {'video_id': video['video_id'], 'attack_type': video['attack_type'],
+               'attack': video['expected_decision'] != 'approve'}
+        for precision, classifier in classifiers.items():
+            classifier.scores(frames[:1])  # Warm up
+            seconds, timings, scores = time_scores(classifier, frames, args.runs)
+            row[precision] = {'seconds': seconds, 'timings': timings, 'score': float(scores.mean()),
+                              'frame_scores': scores.tolist()}
+        rows.append(row)
+
+    report = {'model': args.model, 'frames': args.frames, 'runs': args.runs, 'threads': args.threads,
+              'threshold': threshold, 'precisions': {}, 'videos': rows}
+    for precision in onnx_backend.PRECISIONS:
+        timings = [t for row in rows for t in row[precision]['timings']]
+        correct = [(row[precision]['score'] < threshold) == row['attack'] for row in rows]
+        by_attack = {}
+        for row, ok in zip(rows, correct):
+            by_attack.setdefault(row['attack_type'], []).append(ok)
+        report['precisions'][precision] = {
+            'model_bytes': os.path.getsize(classifiers[precision].path),
+            'median_ms': statistics.median(timings) * 1000,
+            'p95_ms': float(np.percentile(timings, 95)) * 1000,
+            'accuracy': float(np.mean(correct)),
+            'accuracy_by_attack': {attack: float(np.mean(oks)) for attack, oks in sorted(by_attack.items())},
+        }
+    fp32 = np.array([row['fp32']['score'] for row in rows])
+    int8 = np.array([row['int8']['score'] for row in rows])
+    frame_fp32 = np.concatenate([row['fp32']['frame_scores'] for row in rows])
+    frame_int8 = np.concatenate([row['int8']['frame_scores'] for row in rows])
+    report['int8_vs_fp32'] = {
+        'speedup': report['precisions']['fp32']['median_ms'] / report['precisions']['int8']['median_ms'],
+        'decision_agreement': float(np.mean((fp32 < threshold) == (int8 < threshold))),
+        'mean_abs_score_diff': float(np.abs(fp32 - int8).mean()),
+        'max_abs_frame_score_diff': float(np.abs(frame_fp32 - frame_int8).max()),
+    }
+
+    for precision, result in report['precisions'].items():
+        print(f"  {precision:>4}: {result['median_ms']:8.2f} ms/video (p95 {result['p95_ms']:.2f})  "
+              f"accuracy {result['accuracy']:.1%}  {result['model_bytes'] / 1e6:.1f} MB")
+        for attack, accuracy in result['accuracy_by_attack'].items():
+            print(f"        {attack:<16} {accuracy:.1%}")
+    comparison = report['int8_vs_fp32']
+    print(f"⚡ int8 speedup {comparison['speedup']:.2f}x, decisions agree on {comparison['decision_agreement']:.1%} "
+          f"of videos, mean |Δscore| {comparison['mean_abs_score_diff']:.4f}")
+
+    os.makedirs('benchmark_results', exist_ok=True)
+    output_path = f'benchmark_results/onnx_{args.model}.json'
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results saved to {output_path}")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Quantize ONNX models and compare fp32 with int8")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ['calibrate', 'run']:
+        command = commands.add_parser(name)
+        command.add_argument('--model', default='pad_texture', help="Model name, e.g. pad_texture or doc_liveness")
+        command.add_argument('--model-dir', default=os.getenv('ONNX_MODEL_DIR', 'onnx_models'))
+        command.add_argument('--videos', default='red_team_videos', help="Calibration videos / red team video root")
+
+    calibrate_parser = commands.choices['calibrate']
+    calibrate_parser.add_argument('--dynamic', action='store_true', help="Dynamic quantization, no calibration")
+    calibrate_parser.add_argument('--frames-per-video', type=int, default=8)
+    calibrate_parser.add_argument('--max-videos', type=int, default=50)
+
+    run_parser = commands.choices['run']
+    run_parser.add_argument('--labels', default=str(LABELS_PATH))
+    run_parser.add_argument('--frames', type=int, default=10, help="Frames scored per video, as PAD receives")
+    run_parser.add_argument('--runs', type=int, default=5, help="Timed repetitions per video and precision")
+    run_parser.add_argument('--threads', type=int, default=1, help="Intra-op threads, as in one pool process")
+    run_parser.add_argument('--threshold', type=float, help="Live score threshold (default: config.yaml)")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # Ensure we're in the server directory
+    os.chdir(Path(__file__).parent.parent)
+    args = parse_args()
+    sys.exit(calibrate(args) if args.command == 'calibrate' else run(args))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Query-Plan Benchmark for Session and Result Lookups
+
+Runs the queries the API, worker and dashboards issue against kyc_sessions and
+the result tables with EXPLAIN (ANALYZE, BUFFERS) and records planning and
+execution time, scanned partitions and whether indexes were used. Seed a
+multi-million-row dataset first (make seed-bulk), then run once before and
+once after a schema change and compare the two runs.
+
+Usage: python scripts/benchmark_query_plans.py [--label after] [--runs 5]
+       python scripts/benchmark_query_plans.py --compare benchmark_results/query_plans_before.json \\
+                                                         benchmark_results/query_plans_after.json
+"""
+
+import os
+import json
+import argparse
+import statistics
+from pathlib import Path
+from sqlalchemy import text
+from db.database import engine
+
+QUERIES = {
+    'session_by_uuid': (
+        "SELECT * FROM kyc_sessions WHERE session_id = :session_uuid"
+    ),
+    'session_results': (
+        "SELECT s.status, p.score, d.score, f.cosine_similarity, l.score, r.decision "
+        "FROM kyc_sessions s "
+        "LEFT JOIN pad_results p ON p.session_id = s.id "
+        "LEFT JOIN deepfake_results d ON d.session_id = s.id "
+        "LEFT JOIN face_match_results f ON f.session_id = s.id "
+        "LEFT JOIN doc_liveness_results l ON l.session_id = s.id "
+        "LEFT JOIN risk_scores r ON r.session_id = s.id "
+        "WHERE s.session_id = :session_uuid"
+    ),
+    'summary_by_uuid': (
+        "SELECT * FROM session_summary WHERE session_id = :session_uuid"
+    ),
+    'summary_red_team_scores': (
+        "SELECT pad_score, pad_passed, deepfake_score, deepfake_passed FROM session_summary "
+        "WHERE created_at >= :window_end - interval '30 days' AND created_at < :window_end"
+    ),
+    'pending_sessions': (
+        "SELECT id, session_id FROM kyc_sessions WHERE status = 'pending' ORDER BY created_at LIMIT 100"
+    ),
+    'status_last_day': (
+        "SELECT status, count(*) FROM kyc_sessions "
+        "WHERE created_at >= :window_end - interval '1 day' AND created_at < :window_end GROUP BY status"
+    ),
+    'failed_last_week': (
+        "SELECT count(*) FROM kyc_sessions "
+        "WHERE status = 'failed' AND created_at >= :window_end - interval '7 days' AND created_at < :window_end"
+    ),
+    'pad_scores_month': (
+        "SELECT p.score, p.passed FROM pad_results p JOIN kyc_sessions s ON s.id = p.session_id "
+        "WHERE s.created_at >= :window_end - interval '30 days' AND s.created_at < :window_end"
+    ),
+    'decisions_month': (
+        "SELECT decision, count(*) FROM risk_scores "
+        "WHERE created_at >= :window_end - interval '30 days' AND created_at < :window_end GROUP BY decision"
+    ),
+}
+
+
+def walk_plan(node):
+    """Yield every node of an EXPLAIN JSON plan tree"""
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk_plan(child)
+
+
+def plan_summary(plan):
+    nodes = list(walk_plan(plan['Plan']))
+    relations = sorted({node['Relation Name'] for node in nodes if 'Relation Name' in node})
+    return {
+        'root_node': plan['Plan']['Node Type'],
+        'node_types': sorted({node['Node Type'] for node in nodes}),
+        'relations_scanned': len(relations),
+        'uses_index': any('Index' in node['Node Type'] for node in nodes),
+        # Seq scans that actually read rows (empty future partitions are free)
+        'seq_scans': sum(
+            1 for node in nodes
+            if node['Node Type'] == 'Seq Scan' and node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0) > 0
+        ),
+        'shared_hit_blocks': plan['Plan'].get('Shared Hit Blocks', 0),
+        'shared_read_blocks': plan['Plan'].get('Shared Read Blocks', 0),
+    }
+
+
+def benchmark_queries(runs=5):
+    """EXPLAIN ANALYZE each query `runs` times and summarize timings and plans"""
+    results = {}
+    with engine.connect() as conn:
+        row_count = conn.execute(text("SELECT count(*) FROM kyc_sessions")).scalar()
+        params = conn.execute(text(
+            "SELECT session_id AS session_uuid, max(created_at) OVER () AS window_end "
+            "FROM kyc_sessions ORDER BY random() LIMIT 1"
+        )).mappings().first()
+        if params is None:
+            return row_count, results
+        params = dict(params)
+
+        for name, sql in QUERIES.items():
+            planning, execution = [], []
+            summary = None
+            for _ in range(runs):
+                plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params).scalar()[0]
+                planning.append(plan['Planning Time'])
+                execution.append(plan['Execution Time'])
+                summary = plan_summary(plan)
+
+            results[name] = {
+                'planning_ms_median': statistics.median(planning),
+                'execution_ms_median': statistics.median(execution),
+                'execution_ms_min': min(execution),
+                **summary,
+            }
+    return row_count, results
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    print(f"📊 {before['label']} ({before['rows']} sessions) → {after['label']} ({after['rows']} sessions)")
+    for name, new in after['queries'].items():
+        old = before['queries'].get(name)
+        if old is None:
+            continue
+        speedup = old['execution_ms_median'] / new['execution_ms_median'] if new['execution_ms_median'] else float('inf')
+        print(f"  {name}: {old['execution_ms_median']:.2f} ms → {new['execution_ms_median']:.2f} ms "
+              f"({speedup:.1f}x), seq scans {old['seq_scans']} → {new['seq_scans']}, "
+              f"relations {old['relations_scanned']} → {new['relations_scanned']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE benchmark of session/result queries")
+    parser.add_argument('--label', default='current', help="Name of this run, used in the output file name")
+    parser.add_argument('--runs', type=int, default=5, help="EXPLAIN ANALYZE repetitions per query")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="Compare two saved runs")
+    return parser.parse_args()
+
+
+def main(args):
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    print("🔍 Benchmarking query plans...")
+    rows, results = benchmark_queries(args.runs)
+    if not results:
+        print("❌ No sessions found. Run make seed-bulk first.")
+        return
+
+    for name, summary in results.items():
+        print(f"  {name}: {summary['execution_ms_median']:.2f} ms exec, {summary['planning_ms_median']:.2f} ms plan, "
+              f"{summary['relations_scanned']} relations, index={summary['uses_index']}, "
+              f"seq scans={summary['seq_scans']}")
+
+    os.makedirs('benchmark_results', exist_ok=True)
+    output_path = f"benchmark_results/query_plans_{args.label}.json"
+    with open(output_path, 'w') as f:
+        json.dump({'label': args.label, 'rows': rows, 'runs': args.runs, 'queries': results}, f, indent=2)
+    print(f"📄 Results saved to {output_path}")
+
+
+if __name__ == '__main__':
+    # Ensure we're in the server directory
+    os.chdir(Path(__file__).parent.parent)
+    main(parse_args())
@@ -6,76 +6,194 @@ This script evaluates PAD and replay detection performance across different thre
 using the seeded red team dataset. It computes TPR@FPR metrics and generates
 optimization recommendations for production thresholds.
 
-Usage: python scripts/benchmark_red_team.py
+Scores are streamed from Postgres with a server-side cursor in columnar NumPy
+chunks and folded into fixed-bin histograms per outcome, so memory stays bounded
+no matter how much history the selected date window covers.
+
+Usage: python scripts/benchmark_red_team.py [--start 2024-01-01] [--end 2024-02-01]
+                                            [--attack replay_attack --attack photo_print]
 """
 
 import os
 import json
+import argparse
 import numpy as np
+from datetime import datetime
 from pathlib import Path
+from sqlalchemy import select
 from sqlalchemy.orm import sessionmaker
 from db.database import engine, SessionLocal
-from db.models import KycSession, PadResult, DeepfakeResult
-from sklearn.metrics import roc_curve, auc
+from db.models import SessionSummary
+from sklearn.metrics import auc
 import matplotlib.pyplot as plt
 
-def load_red_team_results():
-    """Load PAD and deepfake results from red team sessions"""
+LABELS_PATH = Path(__file__).resolve().parent.parent.parent / 'red_team_labels.json'
+DEFAULT_CHUNK_SIZE = 50_000
+DEFAULT_BINS = 1000
+
+
+class ScoreHistogram:
+    """Fixed-bin score histogram split by outcome (0 = genuine, 1 = attack).
+
+    Scores are assumed to lie in [0, 1]; anything outside is clipped into the
+    edge bins and NaNs are dropped. Thresholds and quantiles derived from the
+    histogram are exact up to one bin width (1 / bins).
+    """
+
+    def __init__(self, bins=DEFAULT_BINS):
+        self.bins = bins
+        self.edges = np.linspace(0.0, 1.0, bins + 1)
+        self.counts = np.zeros((2, bins), dtype=np.int64)
+
+    def update(self, scores, labels):
+        """Fold a chunk of scores and 0/1 labels into the histogram"""
+        scores = np.asarray(scores, dtype=np.float64)
+        labels = np.asarray(labels, dtype=np.float64)
+        keep = ~(np.isnan(scores) | np.isnan(labels))
+        scores, labels = scores[keep], labels[keep].astype(np.int64)
+
+        idx = np.clip((scores * self.bins).astype(np.int64), 0, self.bins - 1)
+        self.counts += np.bincount(labels * self.bins + idx, minlength=2 * self.bins).reshape(2, self.bins)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def quantile(self, q, label):
+        """Approximate score quantile for one outcome (upper bin edge)"""
+        counts = self.counts[label]
+        n = counts.sum()
+        if n == 0:
+            return float('nan')
+        idx = int(np.searchsorted(np.cumsum(counts), q * n, side='left'))
+        return float(self.edges[min(idx, self.bins - 1) + 1])
+
+    def confusion_at(self, thresholds):
+        """TP/FP/TN/FN arrays for 'score > threshold => attack' at each threshold"""
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        # Number of samples in bins whose lower edge is >= threshold, per outcome
+        above = np.concatenate([np.cumsum(self.counts[:, ::-1], axis=1)[:, ::-1], np.zeros((2, 1), dtype=np.int64)], axis=1)
+        first_bin = np.clip(np.ceil(thresholds * self.bins - 1e-9).astype(np.int64), 0, self.bins)
+        tp = above[1, first_bin]
+        fp = above[0, first_bin]
+        fn = self.counts[1].sum() - tp
+        tn = self.counts[0].sum() - fp
+        return tp, fp, tn, fn
+
+    def roc(self):
+        """ROC curve (fpr, tpr, thresholds) evaluated at every bin edge"""
+        thresholds = self.edges[::-1]
+        tp, fp, tn, fn = self.confusion_at(thresholds)
+        positives = max(int(tp[0] + fn[0]), 1)
+        negatives = max(int(fp[0] + tn[0]), 1)
+        return fp / negatives, tp / positives, thresholds
+
+
+def resolve_attack_labels(labels, labels_path=LABELS_PATH):
+    """Split attack labels from red_team_labels.json into attack types and variations"""
+    with open(labels_path, 'r') as f:
+        attack_types = json.load(f)['attack_types']
+
+    types, variations = set(), set()
+    for label in labels:
+        if label in attack_types:
+            types.add(label)
+        elif any(label in spec['variations'] for spec in attack_types.values()):
+            variations.add(label)
+        else:
+            raise ValueError(f"Unknown attack label '{label}' (not in {labels_path.name})")
+
+    return sorted(types), sorted(variations)
+
+
+def stream_red_team_scores(start=None, end=None, attack_labels=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream PAD and replay scores as columnar NumPy chunks.
+
+    Yields dicts of equally sized float64 arrays: ``pad_score``, ``pad_label``,
+    ``replay_score`` and ``replay_label`` (labels are 1 for attack). Rows are
+    fetched through a server-side cursor ``chunk_size`` at a time, optionally
+    restricted to sessions created in ``[start, end)`` and to the given attack
+    types/variations from red_team_labels.json. Scores come from the
+    session_summary read model, so no result tables are joined.
+    """
+    stmt = (
+        select(
+            SessionSummary.pad_score,
+            1 - SessionSummary.pad_passed,  # 1 for attack (failed genuine check)
+            SessionSummary.deepfake_score,
+            1 - SessionSummary.deepfake_passed,
+        )
+        .where(SessionSummary.pad_score.is_not(None), SessionSummary.deepfake_score.is_not(None))
+    )
+
+    if start is not None:
+        stmt = stmt.where(SessionSummary.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(SessionSummary.created_at < end)
+    if attack_labels:
+        types, variations = resolve_attack_labels(attack_labels)
+        conditions = []
+        if types:
+            conditions.append(SessionSummary.attack_type.in_(types))
+        if variations:
+            conditions.append(SessionSummary.attack_variation.in_(variations))
+        stmt = stmt.where(conditions[0] if len(conditions) == 1 else conditions[0] | conditions[1])
+
     db = SessionLocal()
     try:
-        # Get all sessions with PAD results
-        results = db.query(
-            PadResult.score,
-            PadResult.passed,
-            DeepfakeResult.score.label('replay_score'),
-            DeepfakeResult.passed.label('replay_passed')
-        ).join(KycSession).join(DeepfakeResult).all()
-
-        pad_scores = [r.score for r in results]
-        pad_labels = [1 - r.passed for r in results]  # 1 for attack (failed genuine check)
-        replay_scores = [r.replay_score for r in results]
-        replay_labels = [1 - r.replay_passed for r in results]
-
-        return pad_scores, pad_labels, replay_scores, replay_labels
+        result = db.execute(stmt.execution_options(yield_per=chunk_size))
+        for rows in result.partitions():
+            columns = np.array(rows, dtype=np.float64).reshape(-1, 4)
+            yield {
+                'pad_score': columns[:, 0],
+                'pad_label': columns[:, 1],
+                'replay_score': columns[:, 2],
+                'replay_label': columns[:, 3],
+            }
     finally:
         db.close()
 
-def compute_tpr_at_fpr(scores, labels, target_fpr=0.01):
-    """Compute TPR at specific FPR level"""
-    fpr, tpr, thresholds = roc_curve(labels, scores)
 
-    # Find the threshold that gives FPR closest to target
-    idx = np.argmin(np.abs(fpr - target_fpr))
-    return tpr[idx], thresholds[idx], fpr[idx]
+def aggregate_red_team_scores(start=None, end=None, attack_labels=None,
+                              chunk_size=DEFAULT_CHUNK_SIZE, bins=DEFAULT_BINS):
+    """Fold the streamed scores into one PAD and one replay histogram"""
+    pad_hist, replay_hist = ScoreHistogram(bins), ScoreHistogram(bins)
+    for chunk in stream_red_team_scores(start, end, attack_labels, chunk_size):
+        pad_hist.update(chunk['pad_score'], chunk['pad_label'])
+        replay_hist.update(chunk['replay_score'], chunk['replay_label'])
+    return pad_hist, replay_hist
 
-def benchmark_thresholds(scores, labels, threshold_range, service_name):
-    """Benchmark different thresholds for a service"""
-    results = []
 
-    for threshold in threshold_range:
-        predictions = [1 if score > threshold else 0 for score in scores]
-        tp = sum(1 for pred, label in zip(predictions, labels) if pred == 1 and label == 1)
-        fp = sum(1 for pred, label in zip(predictions, labels) if pred == 1 and label == 0)
-        tn = sum(1 for pred, label in zip(predictions, labels) if pred == 0 and label == 0)
-        fn = sum(1 for pred, label in zip(predictions, labels) if pred == 0 and label == 1)
+def benchmark_histogram_thresholds(histogram, threshold_range):
+    """Benchmark thresholds against an aggregated ScoreHistogram"""
+    tp, fp, tn, fn = histogram.confusion_at(threshold_range)
+    results = []
 
-        tpr = tp / (tp + fn) if (tp + fn) > 0 else 0
-        fpr = fp / (fp + tn) if (fp + tn) > 0 else 0
-        precision = tp / (tp + fp) if (tp + fp) > 0 else 0
+    for i, threshold in enumerate(threshold_range):
+        tpr = tp[i] / (tp[i] + fn[i]) if (tp[i] + fn[i]) > 0 else 0
+        fpr = fp[i] / (fp[i] + tn[i]) if (fp[i] + tn[i]) > 0 else 0
+        precision = tp[i] / (tp[i] + fp[i]) if (tp[i] + fp[i]) > 0 else 0
 
         results.append({
-            'threshold': threshold,
-            'tpr': tpr,
-            'fpr': fpr,
-            'precision': precision,
-            'tp': tp, 'fp': fp, 'tn': tn, 'fn': fn
+            'threshold': float(threshold),
+            'tpr': float(tpr),
+            'fpr': float(fpr),
+            'precision': float(precision),
+            'tp': int(tp[i]), 'fp': int(fp[i]), 'tn': int(tn[i]), 'fn': int(fn[i])
         })
 
     return results
 
-def plot_roc_curve(scores, labels, service_name, output_path):
-    """Plot ROC curve"""
-    fpr, tpr, _ = roc_curve(labels, scores)
+def compute_histogram_tpr_at_fpr(histogram, target_fpr=0.01):
+    """Compute TPR at specific FPR level from an aggregated ScoreHistogram"""
+    fpr, tpr, thresholds = histogram.roc()
+
+    idx = np.argmin(np.abs(fpr - target_fpr))
+    return float(tpr[idx]), float(thresholds[idx]), float(fpr[idx])
+
+def plot_histogram_roc(histogram, service_name, output_path):
+    """Plot ROC curve from an aggregated ScoreHistogram"""
+    fpr, tpr, _ = histogram.roc()
     roc_auc = auc(fpr, tpr)
 
     plt.figure(figsize=(8, 6))
@@ -90,17 +208,40 @@ def plot_roc_curve(scores, labels, service_name, output_path):
     plt.savefig(output_path)
     plt.close()
 
-def main():
+def score_quantiles(histogram, quantiles=(0.05, 0.5, 0.95)):
+    """Per-outcome score quantiles from an aggregated ScoreHistogram"""
+    return {
+        outcome: {f'p{int(q * 100)}': histogram.quantile(q, label) for q in quantiles}
+        for outcome, label in (('genuine', 0), ('attack', 1))
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Red team PAD/replay threshold benchmark")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="Only sessions created at or after this date")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="Only sessions created before this date")
+    parser.add_argument('--attack', action='append', default=[],
+                        help="Attack type or variation from red_team_labels.json (repeatable)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows fetched per cursor round trip")
+    parser.add_argument('--bins', type=int, default=DEFAULT_BINS, help="Histogram bins over the [0, 1] score range")
+    return parser.parse_args()
+
+def main(args):
     print("🔬 Starting Red Team Benchmarking...")
 
-    # Load data
-    pad_scores, pad_labels, replay_scores, replay_labels = load_red_team_results()
+    # Stream and aggregate data
+    pad_hist, replay_hist = aggregate_red_team_scores(
+        start=args.start,
+        end=args.end,
+        attack_labels=args.attack,
+        chunk_size=args.chunk_size,
+        bins=args.bins,
+    )
 
-    if not pad_scores:
+    if not pad_hist.total:
         print("❌ No red team data found. Run seed_red_team.py first.")
         return
 
-    print(f"📊 Loaded {len(pad_scores)} red team samples")
+    print(f"📊 Aggregated {pad_hist.total} red team samples")
 
     # Define threshold ranges
     pad_thresholds = np.linspace(0.1, 0.9, 17)
@@ -108,33 +249,42 @@ def main():
 
     # Benchmark PAD
     print("\n🛡️  Benchmarking PAD thresholds...")
-    pad_results = benchmark_thresholds(pad_scores, pad_labels, pad_thresholds, "PAD")
+    pad_results = benchmark_histogram_thresholds(pad_hist, pad_thresholds)
 
     # Benchmark Replay
     print("🎬 Benchmarking Replay thresholds...")
-    replay_results = benchmark_thresholds(replay_scores, replay_labels, replay_thresholds, "Replay")
+    replay_results = benchmark_histogram_thresholds(replay_hist, replay_thresholds)
 
     # Compute TPR@FPR=1e-2
-    pad_tpr_at_fpr, pad_opt_threshold, pad_actual_fpr = compute_tpr_at_fpr(pad_scores, pad_labels, 0.01)
-    replay_tpr_at_fpr, replay_opt_threshold, replay_actual_fpr = compute_tpr_at_fpr(replay_scores, replay_labels, 0.01)
+    pad_tpr_at_fpr, pad_opt_threshold, pad_actual_fpr = compute_histogram_tpr_at_fpr(pad_hist, 0.01)
+    replay_tpr_at_fpr, replay_opt_threshold, replay_actual_fpr = compute_histogram_tpr_at_fpr(replay_hist, 0.01)
 
     # Generate plots
     os.makedirs('benchmark_results', exist_ok=True)
-    plot_roc_curve(pad_scores, pad_labels, "PAD", 'benchmark_results/pad_roc.png')
-    plot_roc_curve(replay_scores, replay_labels, "Replay", 'benchmark_results/replay_roc.png')
+    plot_histogram_roc(pad_hist, "PAD", 'benchmark_results/pad_roc.png')
+    plot_histogram_roc(replay_hist, "Replay", 'benchmark_results/replay_roc.png')
 
     # Save results
     results = {
+        'window': {
+            'start': args.start.isoformat() if args.start else None,
+            'end': args.end.isoformat() if args.end else None,
+            'attack_labels': args.attack,
+            'samples': pad_hist.total,
+            'score_resolution': 1.0 / args.bins
+        },
         'pad': {
             'tpr_at_fpr_0_01': pad_tpr_at_fpr,
             'optimal_threshold': pad_opt_threshold,
             'actual_fpr': pad_actual_fpr,
+            'score_quantiles': score_quantiles(pad_hist),
             'threshold_sweep': pad_results
         },
         'replay': {
             'tpr_at_fpr_0_01': replay_tpr_at_fpr,
             'optimal_threshold': replay_opt_threshold,
             'actual_fpr': replay_actual_fpr,
+            'score_quantiles': score_quantiles(replay_hist),
             'threshold_sweep': replay_results
         },
         'recommendations': {
@@ -166,4 +316,4 @@ def main():
 if __name__ == '__main__':
     # Ensure we're in the server directory
     os.chdir(Path(__file__).parent.parent)
-    main()
\ No newline at end of file
+    main(parse_args())
\ No newline at end of file
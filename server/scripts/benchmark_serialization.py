@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Serialization Benchmark for Task Messages, Service Bodies and Result Columns
+
+Encodes and decodes representative documents (a Celery task body, a
+service request carrying frame references, PAD and OCR responses) with
+stdlib json, orjson and msgpack, and reports the median encode and decode
+time and the encoded size of each. It also compares the text Postgres
+stored for a result's details column before and after migration 0007: a
+json.dumps string wrapped in JSON, against the object itself.
+
+Codecs that are not installed are skipped.
+
+Usage: python scripts/benchmark_serialization.py [--runs 5] [--frames 16]
+"""
+
+import os
+import json
+import string
+import random
+import timeit
+import argparse
+import statistics
+from pathlib import Path
+
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
+    orjson = None
+
+try:
+    import msgpack
+except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
+    msgpack = None
+
+SESSION_ID = "5f0c2a4e-8d1b-4c7e-9a36-2b8f1e0d7c54"
+
+
+def codecs():
+    """name -> (encode, decode) for every codec installed here"""
+    available = {"json": (lambda value: json.dumps(value).encode(), json.loads)}
+    if orjson is not None:
+        available["orjson"] = (orjson.dumps, orjson.loads)
+    if msgpack is not None:
+        available["msgpack"] = (msgpack.packb, msgpack.unpackb)
+    return available
+
+
+def frame_refs(count):
+    """References into a session's frame archive, as sent to the services"""
+    offset, refs = 32, []
+    for i in range(count):
+        size = 18_000 + 97 * i
+        refs.append({"bucket": "kyc-videos", "key": f"{SESSION_ID}/selfie.kfa", "index": i, "offset": offset,
+                     "size": size, "frame_number": 4 * i + 3, "timestamp_ms": 133 * i})
+        offset += size
+    return refs
+
+
+def ocr_response(rng):
+    words = ["".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(3, 10))) for _ in range(120)]
+    text = "\n".join(" ".join(words[i:i + 6]) for i in range(0, len(words), 6))
+    return {
+        "session_id": SESSION_ID,
+        "text": text,
+        "fields": {name: {"value": rng.choice(words), "confidence": round(rng.random(), 3), "votes": rng.randint(1, 4)}
+                   for name in ["surname", "given_names", "document_number", "nationality", "date_of_birth",
+                                "sex", "date_of_expiry", "issuing_state", "personal_number"]},
+        "confidence": 0.912,
+        "document_type": "passport",
+        "analysis": {"frames_received": 16, "distinct_frames": 5, "frames_processed": 3, "cache_hits": 0,
+                     "roi_found": 15, "method": "doctr_roi", "text_length": len(text), "language_detected": "en"},
+    }
+
+
+def pad_response():
+    return {
+        "session_id": SESSION_ID,
+        "score": 0.812,
+        "threshold": 0.65,
+        "passed": True,
+        "analysis": {
+            "frame_count": 16,
+            "method": "multi_signal_pad",
+            "signals_analyzed": {"texture_cnn": 0.842, "temporal_blink": 0.771, "temporal_head": 0.803, "rppg": 0.69},
+            "weights": {"texture": 0.4, "temporal": 0.4, "rppg": 0.2},
+            "confidence": 0.812,
+            "analysis_timestamp": "2026-10-19T08:15:02.118342",
+        },
+    }
+
+
+def documents(frames):
+    rng = random.Random(0)
+    return {
+        # Celery protocol 2 body: (args, kwargs, embed)
+        "celery_task_body": [[SESSION_ID], {}, {"callbacks": None, "errbacks": None, "chain": None, "chord": None}],
+        "service_request": {"session_id": SESSION_ID, "frames": frame_refs(frames)},
+        "pad_response": pad_response(),
+        "ocr_response": ocr_response(rng),
+    }
+
+
+def median_seconds(call, runs):
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    return statistics.median(timer.repeat(repeat=runs, number=number)) / number
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark payload size and codec speed")
+    parser.add_argument('--runs', type=int, default=5, help="Timing repetitions per codec and document")
+    parser.add_argument('--frames', type=int, default=16, help="Frame references in the service request")
+    return parser.parse_args()
+
+
+def main(args):
+    available = codecs()
+    print(f"📦 Codecs: {', '.join(available)}")
+    report = []
+    for name, document in documents(args.frames).items():
+        print(f"\n  {name}")
+        for codec, (encode, decode) in available.items():
+            encoded = encode(document)
+            row = {
+                'document': name,
+                'codec': codec,
+                'bytes': len(encoded),
+                'encode_us': median_seconds(lambda: encode(document), args.runs) * 1e6,
+                'decode_us': median_seconds(lambda: decode(encoded), args.runs) * 1e6,
+            }
+            report.append(row)
+            print(f"  {codec:>8}: {row['bytes']:>6,} B  encode {row['encode_us']:8.2f} µs  "
+                  f"decode {row['decode_us']:8.2f} µs")
+
+    # What the details column held per OCR result: a JSON string wrapping the encoded object, then the object
+    ocr = documents(args.frames)["ocr_response"]
+    columns = {
+        'double_encoded': len(json.dumps(json.dumps(ocr)).encode()),
+        'object': len(json.dumps(ocr).encode()),
+    }
+    print(f"\n🗄️  OCR details column text: {columns['double_encoded']:,} B double-encoded, "
+          f"{columns['object']:,} B as an object")
+
+    os.makedirs('benchmark_results', exist_ok=True)
+    output_path = 'benchmark_results/serialization.json'
+    with open(output_path, 'w') as f:
+        json.dump({'runs': args.runs, 'frames': args.frames, 'results': report, 'details_column': columns}, f, indent=2)
+    print(f"📄 Results saved to {output_path}")
+
+
+if __name__ == '__main__':
+    # Ensure we're in the server directory
+    os.chdir(Path(__file__).parent.parent)
+    main(parse_args())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Partition Maintenance for kyc_sessions and Result Tables
+
+Lists the monthly partitions, creates partitions ahead of the clock, and
+archives (detaches) partitions older than the retention window. The same
+operations run nightly via the worker.maintenance.maintain_partitions beat task.
+
+Usage: python scripts/manage_partitions.py list
+       python scripts/manage_partitions.py ensure [--months-ahead 3]
+       python scripts/manage_partitions.py archive --retain-months 24 [--drop] [--dry-run]
+"""
+
+import os
+import argparse
+from pathlib import Path
+from db.database import engine
+from db.partitions import PARTITIONED_TABLES, archive_partitions, ensure_future_partitions, list_partitions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Manage monthly partitions")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('list', help="List monthly partitions per table")
+
+    ensure = sub.add_parser('ensure', help="Create partitions for the coming months")
+    ensure.add_argument('--months-ahead', type=int, default=3)
+
+    archive = sub.add_parser('archive', help="Detach partitions past the retention window")
+    archive.add_argument('--retain-months', type=int, required=True)
+    archive.add_argument('--drop', action='store_true', help="Drop detached partitions instead of archiving them")
+    archive.add_argument('--dry-run', action='store_true', help="Only print what would be archived")
+    return parser.parse_args()
+
+
+def main(args):
+    with engine.begin() as conn:
+        if args.command == 'list':
+            for table in PARTITIONED_TABLES:
+                months = [month.strftime('%Y-%m') for _, month in list_partitions(conn, table)]
+                span = f"{months[0]} … {months[-1]}" if months else "not partitioned"
+                print(f"  {table}: {len(months)} monthly partitions ({span})")
+
+        elif args.command == 'ensure':
+            ensure_future_partitions(conn, args.months_ahead)
+            print(f"✅ Partitions ensured through {args.months_ahead} months ahead")
+
+        elif args.command == 'archive':
+            archived = archive_partitions(conn, args.retain_months, drop=args.drop, dry_run=args.dry_run)
+            action = "Would archive" if args.dry_run else ("Dropped" if args.drop else "Archived")
+            print(f"🗄️  {action} {len(archived)} partitions")
+            for name in archived:
+                print(f"  {name}")
+
+
+if __name__ == '__main__':
+    # Ensure we're in the server directory
+    os.chdir(Path(__file__).parent.parent)
+    main(parse_args())
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Bulk Risk Re-Scoring for Threshold/Weight Changes
+
+Re-evaluates historical sessions against a proposed config (thresholds,
+weights and decision cut-offs) using the same vectorized scorer as the worker.
+Stored component scores are read from the session_summary read model with a
+server-side cursor in columnar NumPy chunks, and a decision-diff report is
+written showing how every stored decision would change. With --persist, each
+re-scored session gets a new RiskScore version and its summary row is updated
+in the same transaction.
+
+Usage: python scripts/rescore_risk.py --config proposed.yaml [--start 2024-01-01] [--end 2024-02-01]
+                                      [--report benchmark_results/rescore_report.json]
+                                      [--changes-csv changes.csv] [--persist]
+"""
+
+import os
+import csv
+import json
+import time
+import argparse
+import numpy as np
+import yaml
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import select, insert, update
+from db.database import SessionLocal
+from db.models import RiskScore, SessionSummary
+from worker.risk import COMPONENTS, DECISIONS, component_weights, evaluate
+
+DEFAULT_CHUNK_SIZE = 100_000
+CHANGED_SAMPLE_SIZE = 1000
+
+
+def stream_component_scores(start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream stored component scores and the latest decision per session.
+
+    Yields dicts with ``id`` (int64), ``session_id`` (object), one float64 array
+    per component (NaN where the result row is missing), plus the latest stored
+    ``decision`` and ``version``.
+    """
+    stmt = (
+        select(
+            SessionSummary.session_pk,
+            SessionSummary.session_id,
+            SessionSummary.pad_score,
+            SessionSummary.deepfake_score,
+            SessionSummary.face_match_score,
+            SessionSummary.doc_liveness_score,
+            SessionSummary.decision,
+            SessionSummary.risk_version,
+        )
+        .where(SessionSummary.status == 'completed')
+    )
+
+    if start is not None:
+        stmt = stmt.where(SessionSummary.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(SessionSummary.created_at < end)
+
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=chunk_size))
+        for rows in result.partitions():
+            ids, session_ids, pad, deepfake, face_match, doc_liveness, decision, version = zip(*rows)
+            yield {
+                'id': np.array(ids, dtype=np.int64),
+                'session_id': np.array(session_ids, dtype=object),
+                'pad': np.array(pad, dtype=np.float64),
+                'deepfake': np.array(deepfake, dtype=np.float64),
+                'face_match': np.array(face_match, dtype=np.float64),
+                'doc_liveness': np.array(doc_liveness, dtype=np.float64),
+                'decision': np.array([d or 'unscored' for d in decision], dtype=object),
+                'version': np.array([v or 0 for v in version], dtype=np.int64),
+            }
+    finally:
+        db.close()
+
+
+def label_index(values, labels):
+    """Position of each value in labels; unknown values map to position 0"""
+    order = np.argsort(labels)
+    pos = np.clip(np.searchsorted(labels[order], values), 0, len(labels) - 1)
+    idx = order[pos]
+    return np.where(labels[idx] == values, idx, 0)
+
+
+def persist_new_versions(db, chunk, rescored, config):
+    """Insert one new RiskScore version per session in the chunk and point the summaries at it"""
+    weights = component_weights(config)
+    passed = np.stack([rescored['passed'][component] for component in COMPONENTS], axis=1).astype(float)
+    rows = [
+        {
+            'session_id': session_pk,
+            'overall_score': overall,
+            'risk_level': level,
+            'component_scores': dict(zip(COMPONENTS, flags)),
+            'weights': weights,
+            'decision': decision,
+            'version': version + 1,
+        }
+        for session_pk, overall, level, flags, decision, version in zip(
+            chunk['id'].tolist(),
+            rescored['overall_score'].tolist(),
+            rescored['risk_level'].tolist(),
+            passed.tolist(),
+            rescored['decision'].tolist(),
+            chunk['version'].tolist(),
+        )
+    ]
+    db.execute(insert(RiskScore), rows)
+    db.execute(update(SessionSummary), [
+        {
+            'session_pk': row['session_id'],
+            'overall_score': row['overall_score'],
+            'risk_level': row['risk_level'],
+            'decision': row['decision'],
+            'risk_version': row['version'],
+        }
+        for row in rows
+    ])
+    db.commit()
+
+
+def rescore(config, start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE, persist=False, changes_csv=None):
+    """Re-score every completed session in the window and build the decision-diff report"""
+    old_labels = np.array(['unscored', *DECISIONS.tolist()])
+    transitions = np.zeros((len(old_labels), len(DECISIONS)), dtype=np.int64)
+    changed_sample = []
+    total = 0
+    scoring_seconds = 0.0
+    started = time.perf_counter()
+
+    writer_db = SessionLocal() if persist else None
+    changes_file = open(changes_csv, 'w', newline='') if changes_csv else None
+    changes_writer = csv.writer(changes_file) if changes_file else None
+    if changes_writer:
+        changes_writer.writerow(['session_id', 'old_decision', 'new_decision', 'new_overall_score'])
+
+    try:
+        for chunk in stream_component_scores(start, end, chunk_size):
+            t0 = time.perf_counter()
+            rescored = evaluate(chunk, config)
+            scoring_seconds += time.perf_counter() - t0
+
+            old_idx = label_index(chunk['decision'].astype(str), old_labels)
+            new_idx = label_index(rescored['decision'], DECISIONS)
+            np.add.at(transitions, (old_idx, new_idx), 1)
+
+            changed = np.flatnonzero(chunk['decision'] != rescored['decision'])
+            if changes_writer is not None:
+                changes_writer.writerows(zip(
+                    chunk['session_id'][changed].tolist(),
+                    chunk['decision'][changed].tolist(),
+                    rescored['decision'][changed].tolist(),
+                    rescored['overall_score'][changed].tolist(),
+                ))
+            for i in changed[:max(0, CHANGED_SAMPLE_SIZE - len(changed_sample))].tolist():
+                changed_sample.append({
+                    'session_id': chunk['session_id'][i],
+                    'old_decision': chunk['decision'][i],
+                    'new_decision': str(rescored['decision'][i]),
+                    'new_overall_score': float(rescored['overall_score'][i]),
+                })
+
+            if writer_db is not None:
+                persist_new_versions(writer_db, chunk, rescored, config)
+
+            total += len(chunk['id'])
+            elapsed = time.perf_counter() - started
+            print(f"  ✓ {total} sessions re-scored ({total / elapsed:,.0f} sessions/s)")
+    finally:
+        if writer_db is not None:
+            writer_db.close()
+        if changes_file is not None:
+            changes_file.close()
+
+    elapsed = time.perf_counter() - started
+    matrix = {
+        old: {new: int(transitions[i, j]) for j, new in enumerate(DECISIONS.tolist())}
+        for i, old in enumerate(old_labels.tolist())
+    }
+    changed_total = int(transitions.sum() - sum(transitions[i + 1, i] for i in range(len(DECISIONS))))
+
+    return {
+        'window': {
+            'start': start.isoformat() if start else None,
+            'end': end.isoformat() if end else None,
+        },
+        'config': {
+            'thresholds': config['thresholds'],
+            'weights': component_weights(config),
+            'decision_cutoffs': config.get('decision_cutoffs'),
+        },
+        'sessions': total,
+        'changed': changed_total,
+        'changed_rate': changed_total / total if total else 0.0,
+        'transitions': matrix,
+        'new_decisions': {new: int(transitions[:, j].sum()) for j, new in enumerate(DECISIONS.tolist())},
+        'changed_sample': changed_sample,
+        'persisted': persist,
+        'timing': {
+            'total_seconds': elapsed,
+            'scoring_seconds': scoring_seconds,
+            'sessions_per_second': total / elapsed if elapsed else 0.0,
+        },
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Re-score historical sessions against a proposed risk config")
+    parser.add_argument('--config', default='config.yaml', help="Config with the proposed thresholds/weights/cut-offs")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="Only sessions created at or after this date")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="Only sessions created before this date")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows fetched per cursor round trip")
+    parser.add_argument('--report', default='benchmark_results/rescore_report.json', help="Decision-diff report path")
+    parser.add_argument('--changes-csv', help="Also write every changed decision to this CSV file")
+    parser.add_argument('--persist', action='store_true', help="Store the new scores as new RiskScore versions")
+    return parser.parse_args()
+
+
+def main(args):
+    print("⚖️  Starting bulk risk re-scoring...")
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+
+    report = rescore(config, args.start, args.end, args.chunk_size, args.persist, args.changes_csv)
+
+    os.makedirs(os.path.dirname(args.report) or '.', exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("\n✅ Re-scoring Complete!")
+    print(f"📊 {report['sessions']} sessions in {report['timing']['total_seconds']:.1f}s "
+          f"({report['timing']['sessions_per_second']:,.0f} sessions/s)")
+    print(f"🔀 {report['changed']} decisions would change ({report['changed_rate']:.2%})")
+    for old, row in report['transitions'].items():
+        print(f"  {old:>13} → " + ", ".join(f"{new}: {count}" for new, count in row.items()))
+    print(f"📄 Report saved to {args.report}")
+    if args.persist:
+        print("💾 New RiskScore versions persisted")
+
+
+if __name__ == '__main__':
+    # Ensure we're in the server directory
+    os.chdir(Path(__file__).parent.parent)
+    main(parse_args())
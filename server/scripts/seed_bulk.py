@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+High-Volume Synthetic Dataset Seeder
+
+Generates millions of realistic KYC sessions with all eight result tables
+populated (frame extraction, PAD, deepfake, face match, OCR, MRZ,
+doc-liveness and risk score) plus their session_summary rows to exercise
+query plans and dashboards at production scale.
+
+Rows are produced in vectorized NumPy batches and streamed into Postgres with
+COPY (or multi-row INSERTs with --method insert). The attack mix, the spread of
+created_at dates and the per-outcome score distributions are configurable.
+
+Usage: python scripts/seed_bulk.py --sessions 2000000 [--batch-size 20000] [--days 365]
+                                   [--attack-mix genuine=0.9,replay_attack=0.05,print_attack=0.05]
+                                   [--failed-rate 0.01] [--profile profiles.yaml]
+                                   [--method copy|insert] [--seed 42]
+"""
+
+import os
+import io
+import csv
+import json
+import time
+import uuid
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import yaml
+from pathlib import Path
+from psycopg2.extras import execute_values
+from common import frame_archive
+from db.database import engine
+from db.partitions import ensure_partitions
+from seed_red_team import ATTACK_TYPES
+from worker.risk import component_passed, component_weights, evaluate
+
+CONFIG_PATH = Path(__file__).resolve().parent.parent / 'config.yaml'
+
+# Beta(a, b) distributions per outcome and component. Attack types inherit from
+# 'attack' and only override what differs; a --profile YAML file is merged on top.
+DEFAULT_SCORE_PROFILES = {
+    'genuine': {
+        'pad': (8.0, 2.0),
+        'deepfake': (2.0, 12.0),
+        'face_match': (9.0, 3.0),
+        'doc_liveness': (8.0, 2.0),
+        'ocr_confidence': (9.0, 2.0),
+        'mrz_valid_rate': 0.97,
+    },
+    'attack': {
+        'pad': (2.0, 6.0),
+        'deepfake': (2.0, 8.0),
+        'face_match': (3.0, 5.0),
+        'doc_liveness': (3.0, 5.0),
+        'ocr_confidence': (6.0, 3.0),
+        'mrz_valid_rate': 0.9,
+    },
+    'replay_attack': {'deepfake': (5.0, 4.0)},
+    'deepfake': {'deepfake': (7.0, 3.0), 'pad': (5.0, 4.0)},
+    'fake_document': {'pad': (7.0, 3.0), 'doc_liveness': (2.0, 7.0), 'mrz_valid_rate': 0.4},
+}
+
+# Median seconds per pipeline stage for the synthetic session_summary timings
+STAGE_MEDIAN_SECONDS = {
+    'frame_extraction': 1.5,
+    'pad': 0.4,
+    'deepfake': 1.2,
+    'face_match': 0.3,
+    'ocr': 0.8,
+    'mrz': 0.05,
+    'doc_liveness': 0.4,
+    'risk': 0.01,
+}
+
+OCR_TEXTS = {
+    'passport': "JOHN DOE\nPASSPORT NO: P123456789\nNATIONALITY: UNITED STATES",
+    'id_card': "JANE SMITH\nID CARD\nDOB: 01/01/1990",
+}
+
+TABLE_COLUMNS = {
+    'kyc_sessions': ['id', 'session_id', 'selfie_video_path', 'id_video_path', 'status', 'created_at', 'updated_at'],
+    'frame_extractions': ['session_id', 'frames_path', 'frame_count', 'created_at'],
+    'pad_results': ['session_id', 'score', 'threshold', 'passed', 'details', 'created_at'],
+    'deepfake_results': ['session_id', 'score', 'threshold', 'passed', 'details', 'created_at'],
+    'face_match_results': ['session_id', 'cosine_similarity', 'threshold', 'passed', 'face_image_path',
+                           'id_photo_path', 'details', 'created_at'],
+    'ocr_results': ['session_id', 'extracted_text', 'confidence', 'document_type', 'details', 'created_at'],
+    'mrz_results': ['session_id', 'mrz_data', 'parsed_fields', 'valid', 'details', 'created_at'],
+    'doc_liveness_results': ['session_id', 'score', 'threshold', 'passed', 'details', 'created_at'],
+    'risk_scores': ['session_id', 'overall_score', 'risk_level', 'component_scores', 'weights', 'decision',
+                    'created_at'],
+    'session_summary': ['session_pk', 'session_id', 'status', 'attack_type', 'attack_variation', 'frame_count',
+                        'pad_score', 'pad_passed', 'deepfake_score', 'deepfake_passed', 'face_match_score',
+                        'face_match_passed', 'doc_liveness_score', 'doc_liveness_passed', 'ocr_confidence',
+                        'document_type', 'mrz_valid', 'overall_score', 'risk_level', 'decision', 'risk_version',
+                        'stage_timings', 'created_at', 'updated_at', 'completed_at'],
+}
+
+
+def synthetic_frame_archive(session_uuid, frame_count, frame_interval=30, fps=30.0, frame_bytes=60_000):
+    """frames_path descriptor of an archive the worker would have written for this session"""
+    payload_offset = frame_archive.HEADER.size + frame_archive.ENTRY.size * frame_count
+    entries = [
+        {
+            'offset': payload_offset + i * frame_bytes,
+            'size': frame_bytes,
+            'frame_number': i * frame_interval,
+            'timestamp_ms': i * frame_interval * 1000.0 / fps,
+        }
+        for i in range(frame_count)
+    ]
+    return frame_archive.describe('kyc-frames', f"{session_uuid}/frames.kfa", entries)
+
+
+def parse_attack_mix(spec):
+    """Parse 'genuine=0.9,replay_attack=0.1' into normalized outcome probabilities"""
+    if not spec:
+        # Default: 85% genuine, the rest split like the red team dataset
+        attack_total = sum(cfg['count'] for cfg in ATTACK_TYPES.values())
+        mix = {'genuine': 0.85}
+        mix.update({name: 0.15 * cfg['count'] / attack_total for name, cfg in ATTACK_TYPES.items()})
+        return mix
+
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name != 'genuine' and name not in ATTACK_TYPES:
+            raise ValueError(f"Unknown outcome '{name}' in --attack-mix")
+        mix[name] = float(weight)
+
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("--attack-mix weights must sum to a positive value")
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def load_score_profiles(profile_path=None):
+    """Resolve the score profile of every outcome, merging a YAML override file if given"""
+    overrides = {}
+    if profile_path:
+        with open(profile_path, 'r') as f:
+            overrides = yaml.safe_load(f) or {}
+
+    def merged(name):
+        base = dict(DEFAULT_SCORE_PROFILES['genuine' if name == 'genuine' else 'attack'])
+        if name != 'genuine':
+            base.update(overrides.get('attack', {}))
+            base.update(DEFAULT_SCORE_PROFILES.get(name, {}))
+        base.update(overrides.get(name, {}))
+        return base
+
+    return {name: merged(name) for name in ['genuine', *ATTACK_TYPES]}
+
+
+class BatchGenerator:
+    """Generates one batch of sessions and their result rows as columnar arrays"""
+
+    def __init__(self, mix, profiles, days, failed_rate, config, seed=None):
+        self.outcomes = list(mix)
+        self.probabilities = np.array([mix[name] for name in self.outcomes])
+        self.profiles = profiles
+        self.days = days
+        self.failed_rate = failed_rate
+        self.config = config
+        self.thresholds = config['thresholds']
+        self.rng = np.random.default_rng(seed)
+        self.now = np.datetime64('now', 'us')
+
+        # Variation names per outcome, indexed per row at generation time
+        self.variations = []
+        for name in self.outcomes:
+            variations = ATTACK_TYPES[name]['variations'] if name in ATTACK_TYPES else ['bona_fide']
+            self.variations.append(variations)
+        self.weights_json = json.dumps(component_weights(config))
+
+    def _beta(self, outcome_idx, component):
+        scores = np.empty(outcome_idx.size)
+        for i, name in enumerate(self.outcomes):
+            mask = outcome_idx == i
+            a, b = self.profiles[name][component]
+            scores[mask] = self.rng.beta(a, b, mask.sum())
+        return scores
+
+    def _stage_timings(self, completed):
+        """JSON stage timings per session; failed sessions stop after frame extraction"""
+        n = completed.size
+        seconds = {
+            stage: np.round(self.rng.lognormal(np.log(median), 0.35, n), 3).tolist()
+            for stage, median in STAGE_MEDIAN_SECONDS.items()
+        }
+        stages = list(seconds)
+        return [
+            json.dumps({stage: seconds[stage][i] for stage in (stages if ok else stages[:1])})
+            for i, ok in enumerate(completed.tolist())
+        ]
+
+    def generate(self, ids):
+        n = len(ids)
+        rng = self.rng
+        outcome_idx = rng.choice(len(self.outcomes), size=n, p=self.probabilities)
+        row_variation = np.floor(rng.random(n) * np.array([len(v) for v in self.variations])[outcome_idx]).astype(int)
+
+        offsets = (rng.random(n) * self.days * 86_400 * 1e6).astype('timedelta64[us]')
+        created = self.now - offsets
+        created_str = np.datetime_as_string(created, unit='us')
+        updated_str = np.datetime_as_string(created + rng.integers(2_000_000, 12_000_000, n).astype('timedelta64[us]'),
+                                            unit='us')
+        completed = rng.random(n) >= self.failed_rate
+
+        session_uuids = [str(uuid.uuid4()) for _ in range(n)]
+        labels = [(self.outcomes[o], self.variations[o][v]) for o, v in zip(outcome_idx.tolist(), row_variation.tolist())]
+
+        batch = {'kyc_sessions': [
+            (sid, suuid, f"{suuid}/selfie.mp4", f"{suuid}/id.mp4", 'completed' if ok else 'failed', c, u)
+            for sid, suuid, ok, c, u in zip(ids, session_uuids, completed.tolist(), created_str.tolist(), updated_str.tolist())
+        ]}
+
+        frame_counts = rng.integers(5, 31, n)
+        archives = [synthetic_frame_archive(suuid, fc) for suuid, fc in zip(session_uuids, frame_counts.tolist())]
+        batch['frame_extractions'] = [
+            (sid, json.dumps(archive), fc, c)
+            for sid, archive, fc, c in zip(ids, archives, frame_counts.tolist(), created_str.tolist())
+        ]
+
+        # Result rows only exist for sessions that completed
+        idx = np.flatnonzero(completed)
+        ids_c = np.asarray(ids)[idx].tolist()
+        archives_c = [archives[i] for i in idx.tolist()]
+        created_c = created_str[idx].tolist()
+        outcome_c = outcome_idx[idx]
+        labels_c = [labels[i] for i in idx.tolist()]
+        details_c = [json.dumps({'attack_type': a, 'variation': v}) for a, v in labels_c]
+
+        t = self.thresholds
+        pad = self._beta(outcome_c, 'pad')
+        deepfake = self._beta(outcome_c, 'deepfake')
+        face_match = self._beta(outcome_c, 'face_match')
+        doc_liveness = self._beta(outcome_c, 'doc_liveness')
+        ocr_confidence = self._beta(outcome_c, 'ocr_confidence')
+        mrz_rates = np.array([self.profiles[name]['mrz_valid_rate'] for name in self.outcomes])[outcome_c]
+        mrz_valid = (rng.random(idx.size) < mrz_rates).astype(int)
+
+        pad_passed = component_passed('pad', pad, self.config).astype(int)
+        deepfake_passed = component_passed('deepfake', deepfake, self.config).astype(int)
+        face_match_passed = component_passed('face_match', face_match, self.config).astype(int)
+        doc_liveness_passed = component_passed('doc_liveness', doc_liveness, self.config).astype(int)
+
+        batch['pad_results'] = list(zip(ids_c, pad.tolist(), [t['pad']] * idx.size, pad_passed.tolist(), details_c, created_c))
+        batch['deepfake_results'] = list(zip(ids_c, deepfake.tolist(), [t['replay']] * idx.size,
+                                             deepfake_passed.tolist(), details_c, created_c))
+        batch['face_match_results'] = [
+            (sid, score, t['facematch'], ok, '[]', json.dumps(frame_archive.frame_refs(archive, [0])[0]), d, c)
+            for sid, archive, score, ok, d, c in zip(ids_c, archives_c, face_match.tolist(),
+                                                     face_match_passed.tolist(), details_c, created_c)
+        ]
+
+        passport = rng.random(idx.size) < 0.5
+        batch['ocr_results'] = [
+            (sid, OCR_TEXTS['passport' if p else 'id_card'], conf, 'passport' if p else 'id_card', '{}', c)
+            for sid, p, conf, c in zip(ids_c, passport.tolist(), ocr_confidence.tolist(), created_c)
+        ]
+        batch['mrz_results'] = [
+            (sid, '{"type": "P"}' if p else '{"type": "I"}', '{}', ok, '{}', c)
+            for sid, p, ok, c in zip(ids_c, passport.tolist(), mrz_valid.tolist(), created_c)
+        ]
+        batch['doc_liveness_results'] = list(zip(ids_c, doc_liveness.tolist(), [t['doc_liveness']] * idx.size,
+                                                 doc_liveness_passed.tolist(), details_c, created_c))
+
+        # Same scorer as the worker
+        risk = evaluate({'pad': pad, 'deepfake': deepfake, 'face_match': face_match,
+                         'doc_liveness': doc_liveness}, self.config)
+        components = [
+            json.dumps({'pad': a, 'deepfake': b, 'face_match': c, 'doc_liveness': d})
+            for a, b, c, d in zip(pad_passed.tolist(), deepfake_passed.tolist(), face_match_passed.tolist(),
+                                  doc_liveness_passed.tolist())
+        ]
+        batch['risk_scores'] = list(zip(ids_c, risk['overall_score'].tolist(), risk['risk_level'].tolist(), components,
+                                        [self.weights_json] * idx.size, risk['decision'].tolist(), created_c))
+
+        # One read-model row per session; failed sessions only carry their frame count
+        outcomes_c = list(zip(
+            pad.tolist(), pad_passed.tolist(), deepfake.tolist(), deepfake_passed.tolist(),
+            face_match.tolist(), face_match_passed.tolist(), doc_liveness.tolist(), doc_liveness_passed.tolist(),
+            ocr_confidence.tolist(), ['passport' if p else 'id_card' for p in passport.tolist()], mrz_valid.tolist(),
+            risk['overall_score'].tolist(), risk['risk_level'].tolist(), risk['decision'].tolist(), [1] * idx.size,
+        ))
+        no_outcome = (None,) * 15
+        position = np.full(n, -1)
+        position[idx] = np.arange(idx.size)
+        batch['session_summary'] = [
+            (sid, suuid, 'completed' if ok else 'failed', attack, variation, fc,
+             *(outcomes_c[pos] if ok else no_outcome), timings, c, u, u if ok else None)
+            for sid, suuid, ok, (attack, variation), fc, pos, timings, c, u in zip(
+                ids, session_uuids, completed.tolist(), labels, frame_counts.tolist(), position.tolist(),
+                self._stage_timings(completed), created_str.tolist(), updated_str.tolist())
+        ]
+        return batch
+
+
+def reserve_session_ids(cursor, n):
+    """Reserve n ids from the kyc_sessions sequence so result rows can reference them"""
+    cursor.execute(
+        "SELECT nextval(pg_get_serial_sequence('kyc_sessions', 'id')) FROM generate_series(1, %s)", (n,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Stream rows into a table with COPY ... FROM STDIN (CSV)"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def insert_rows(cursor, table, columns, rows, page_size=1000):
+    """Insert rows with multi-row INSERT statements"""
+    execute_values(cursor, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s", rows, page_size=page_size)
+
+
+def seed_bulk_dataset(sessions, batch_size=20_000, days=365, attack_mix=None, failed_rate=0.01,
+                      profile_path=None, method='copy', seed=None):
+    """Generate and load `sessions` synthetic sessions, returning rows written per table"""
+    with open(CONFIG_PATH, 'r') as f:
+        config = yaml.safe_load(f)
+
+    mix = parse_attack_mix(attack_mix)
+    generator = BatchGenerator(mix, load_score_profiles(profile_path), days, failed_rate, config, seed)
+    write_rows = copy_rows if method == 'copy' else insert_rows
+
+    print("🏭 Starting bulk synthetic seeding...")
+    print(f"Target: {sessions} sessions via {method.upper()} in batches of {batch_size}")
+    print("Mix: " + ", ".join(f"{name}={p:.3f}" for name, p in mix.items()))
+
+    rows_written = {table: 0 for table in TABLE_COLUMNS}
+    table_seconds = {table: 0.0 for table in TABLE_COLUMNS}
+    started = time.perf_counter()
+
+    # Monthly partitions for the whole seeded range, so the history does not pile up in <table>_default
+    first_day = (generator.now - np.timedelta64(int(days * 86_400), 's')).astype(datetime)
+    with engine.begin() as setup:
+        ensure_partitions(setup, first_day, generator.now.astype(datetime) + timedelta(days=1))
+
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        done = 0
+        while done < sessions:
+            n = min(batch_size, sessions - done)
+            batch = generator.generate(reserve_session_ids(cursor, n))
+
+            for table, columns in TABLE_COLUMNS.items():
+                t0 = time.perf_counter()
+                write_rows(cursor, table, columns, batch[table])
+                table_seconds[table] += time.perf_counter() - t0
+                rows_written[table] += len(batch[table])
+            conn.commit()
+
+            done += n
+            elapsed = time.perf_counter() - started
+            total_rows = sum(rows_written.values())
+            print(f"  ✓ {done}/{sessions} sessions, {total_rows} rows "
+                  f"({total_rows / elapsed:,.0f} rows/s, {done / elapsed:,.0f} sessions/s)")
+
+        # Refresh planner statistics so query plans reflect the new volume
+        for table in TABLE_COLUMNS:
+            cursor.execute(f"ANALYZE {table}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error seeding database: {e}")
+        raise
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    total_rows = sum(rows_written.values())
+    print("\n✅ Bulk Seeding Complete!")
+    print(f"📊 {total_rows} rows in {elapsed:.1f}s ({total_rows / elapsed:,.0f} rows/s overall)")
+    print("\n📈 Per-table throughput (write time only):")
+    for table, count in rows_written.items():
+        seconds = table_seconds[table]
+        rate = count / seconds if seconds else 0.0
+        print(f"  {table}: {count} rows, {rate:,.0f} rows/s")
+
+    return rows_written
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed millions of synthetic KYC sessions")
+    parser.add_argument('--sessions', type=int, default=1_000_000, help="Number of sessions to generate")
+    parser.add_argument('--batch-size', type=int, default=20_000, help="Sessions per COPY/INSERT batch")
+    parser.add_argument('--days', type=float, default=365, help="Spread created_at uniformly over the last N days")
+    parser.add_argument('--attack-mix', help="Outcome weights, e.g. genuine=0.9,replay_attack=0.05,print_attack=0.05")
+    parser.add_argument('--failed-rate', type=float, default=0.01, help="Fraction of sessions that end as failed")
+    parser.add_argument('--profile', help="YAML file overriding the Beta score profiles per outcome")
+    parser.add_argument('--method', choices=['copy', 'insert'], default='copy', help="Bulk load method")
+    parser.add_argument('--seed', type=int, help="Random seed for reproducible datasets")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # Ensure we're in the server directory
+    os.chdir(Path(__file__).parent.parent)
+
+    args = parse_args()
+    seed_bulk_dataset(
+        sessions=args.sessions,
+        batch_size=args.batch_size,
+        days=args.days,
+        attack_mix=args.attack_mix,
+        failed_rate=args.failed_rate,
+        profile_path=args.profile,
+        method=args.method,
+        seed=args.seed,
+    )
@@ -19,7 +19,7 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from sqlalchemy.orm import sessionmaker
 from db.database import engine, SessionLocal
-from db.models import KycSession, PadResult, DeepfakeResult, FaceMatchResult, OcrResult, MrzResult, DocLivenessResult, RiskScore
+from db.models import KycSession, PadResult, DeepfakeResult, FaceMatchResult, OcrResult, MrzResult, DocLivenessResult, RiskScore, SessionSummary
 
 # Mock video data - in real implementation, these would be actual video files
 ATTACK_TYPES = {
@@ -195,6 +195,31 @@ def seed_red_team_dataset(video_base_path: str = 'red_team_videos'):
                     )
                     db.add(risk_score)
 
+                    db.add(SessionSummary(
+                        session_pk=session.id,
+                        session_id=session.session_id,
+                        status='completed',
+                        attack_type=attack_type,
+                        attack_variation=variation,
+                        pad_score=pad_result.score,
+                        pad_passed=pad_result.passed,
+                        deepfake_score=deepfake_result.score,
+                        deepfake_passed=deepfake_result.passed,
+                        face_match_score=face_match_result.cosine_similarity,
+                        face_match_passed=face_match_result.passed,
+                        doc_liveness_score=doc_liveness_result.score,
+                        doc_liveness_passed=doc_liveness_result.passed,
+                        ocr_confidence=ocr_result.confidence,
+                        document_type=ocr_result.document_type,
+                        mrz_valid=mrz_result.valid,
+                        overall_score=risk_score.overall_score,
+                        risk_level=risk_score.risk_level,
+                        decision=risk_score.decision,
+                        risk_version=1,
+                        created_at=session.created_at,
+                        completed_at=session.created_at
+                    ))
+
                     # Create mock video file
                     video_path = Path(video_base_path) / attack_type / variation / f"{variation}_{total_created:03d}.mp4"
                     video_path.touch()
@@ -216,7 +241,7 @@ def seed_red_team_dataset(video_base_path: str = 'red_team_videos'):
         # Print summary by attack type
         print("\n📈 Attack Type Summary:")
         for attack_type, config in ATTACK_TYPES.items():
-            count = db.query(KycSession).join(PadResult).filter(PadResult.details['attack_type'].astext == attack_type).count()
+            count = db.query(SessionSummary).filter(SessionSummary.attack_type == attack_type).count()
             print(f"  {attack_type}: {count} sessions")
 
     except Exception as e:
@@ -1,22 +1,39 @@
 from celery import Celery
+from celery.schedules import crontab
 import os
 
+from common.serialization import CELERY_SETTINGS
+
 # Celery configuration
 celery_app = Celery(
     "kyc_worker",
     broker=os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0"),
     backend=os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0"),
-    include=["worker.tasks"],
+    include=["worker.tasks", "worker.maintenance"],
 )
 
 # Celery settings
 celery_app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    **CELERY_SETTINGS,  # msgpack messages, no stored task results
     timezone='UTC',
     enable_utc=True,
     task_routes={
         "worker.tasks.process_kyc_video": {"queue": "kyc_processing"},
+        "worker.tasks.run_next_session": {"queue": "kyc_processing"},
+        "worker.maintenance.*": {"queue": "kyc_maintenance"},
+    },
+    beat_schedule={
+        "maintain-partitions": {
+            "task": "worker.maintenance.maintain_partitions",
+            "schedule": crontab(hour=3, minute=0),
+        },
+        "apply-retention": {
+            "task": "worker.maintenance.apply_retention",
+            "schedule": crontab(minute=15),
+        },
+        "sweep-orphans": {
+            "task": "worker.maintenance.sweep_orphans",
+            "schedule": crontab(hour=4, minute=30),
+        },
     },
 )
@@ -0,0 +1,169 @@
+"""Face detection and alignment, run once per selected frame of a session.
+
+PAD, deepfake detection and face match all work on the face, not the whole
+frame. Rather than every service detecting faces in the same frames, the
+worker detects the largest face in each frame picked for a face consumer
+(``face_crops.consumers`` in config.yaml), aligns it with a similarity
+transform that maps its five landmarks (eyes, nose tip, mouth corners) onto
+the ArcFace template, and packs the ``size`` x ``size`` crops into a second
+frame archive next to the session's frames (common/frame_archive.py).
+Services receive references to those crops, with the landmarks and face
+box in source frame coordinates, and never run a detector themselves.
+
+Landmarks come from OpenCV's YuNet detector when ``detector_model`` points
+at its ONNX file. Without it the Haar cascades already used for frame
+selection find the face and the eyes, and the nose and mouth corners are
+placed at their usual proportions of the face box.
+"""
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from common import frame_archive
+
+# Eye centres, nose tip and mouth corners (image left first) of an aligned 112x112 face (ArcFace)
+TEMPLATE = np.array([
+    [38.2946, 51.6963],
+    [73.5318, 51.5014],
+    [56.0252, 71.7366],
+    [41.5493, 92.3655],
+    [70.7299, 92.2041],
+], dtype=np.float32)
+TEMPLATE_SIZE = 112
+DETECT_MAX_SIDE = 640
+
+# Detectors per thread: the stream threads detect concurrently, and YuNet is resized per image
+_local = threading.local()
+
+
+def _detectors():
+    if not hasattr(_local, "detectors"):
+        _local.detectors = {}
+    return _local.detectors
+
+
+def _cascade(name):
+    detectors = _detectors()
+    if name not in detectors:
+        detectors[name] = cv2.CascadeClassifier(cv2.data.haarcascades + name)
+    return detectors[name]
+
+
+def _yunet(model_path):
+    detectors = _detectors()
+    if model_path not in detectors:
+        detectors[model_path] = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold=0.7)
+    return detectors[model_path]
+
+
+def _ordered(landmarks):
+    """Landmarks with each eye and mouth corner pair sorted left to right in the image"""
+    points = np.asarray(landmarks, dtype=np.float32).reshape(5, 2)
+    eyes = points[:2][np.argsort(points[:2, 0])]
+    mouth = points[3:][np.argsort(points[3:, 0])]
+    return np.vstack([eyes, points[2:3], mouth])
+
+
+def _detect_yunet(image, model_path):
+    detector = _yunet(model_path)
+    detector.setInputSize((image.shape[1], image.shape[0]))
+    _, faces = detector.detect(image)
+    if faces is None or not len(faces):
+        return None
+    face = max(faces, key=lambda row: row[2] * row[3])
+    return face[:4], _ordered(face[4:14]), float(face[14])
+
+
+def _detect_haar(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    min_side = max(24, min(gray.shape) // 8)
+    faces = _cascade("haarcascade_frontalface_default.xml").detectMultiScale(
+        gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_side, min_side)
+    )
+    if not len(faces):
+        return None
+    x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+    eyes = _cascade("haarcascade_eye.xml").detectMultiScale(
+        gray[y:y + h // 2, x:x + w], scaleFactor=1.1, minNeighbors=5, minSize=(w // 10, w // 10)
+    )
+    if len(eyes) >= 2:
+        eyes = sorted(eyes, key=lambda box: box[2] * box[3])[-2:]
+        centres = [(x + ex + ew / 2, y + ey + eh / 2) for ex, ey, ew, eh in eyes]
+    else:
+        centres = [(x + 0.3 * w, y + 0.38 * h), (x + 0.7 * w, y + 0.38 * h)]
+    landmarks = centres + [(x + 0.5 * w, y + 0.58 * h), (x + 0.35 * w, y + 0.78 * h), (x + 0.65 * w, y + 0.78 * h)]
+    return np.array([x, y, w, h], dtype=np.float32), _ordered(landmarks), None
+
+
+def detect(image, detector_model=None):
+    """(box x/y/w/h, 5x2 landmarks, score or None) of the largest face, or None.
+
+    Detection runs on a copy at most DETECT_MAX_SIDE pixels wide or high;
+    box and landmarks are in the coordinates of `image`.
+    """
+    scale = min(1.0, DETECT_MAX_SIDE / max(image.shape[:2]))
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+    if detector_model and os.path.exists(detector_model):
+        found = _detect_yunet(small, detector_model)
+    else:
+        found = _detect_haar(small)
+    if found is None:
+        return None
+    box, landmarks, score = found
+    return box / scale, landmarks / scale, score
+
+
+def align(image, landmarks, size=TEMPLATE_SIZE):
+    """size x size crop with the landmarks moved onto the template by a similarity transform"""
+    matrix, _ = cv2.estimateAffinePartial2D(landmarks, TEMPLATE * (size / TEMPLATE_SIZE), method=cv2.LMEDS)
+    if matrix is None:
+        return None
+    return cv2.warpAffine(image, matrix, (size, size), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def write_crops(archive_path, entries, indices, crops_path, config):
+    """Detect and align a face in each listed frame of a local archive and pack the crops into crops_path.
+
+    Returns the crops archive's index entries and one dict per crop, in
+    archive order: the ``source`` frame index, ``box`` and ``landmarks`` in
+    source frame coordinates and the detector ``score``. Frames without a
+    face get no crop.
+    """
+    size = config.get("size", TEMPLATE_SIZE)
+    detector_model = config.get("detector_model")
+    crops, faces = [], []
+    with open(archive_path, "rb") as f:
+        for i in indices:
+            entry = entries[i]
+            f.seek(entry["offset"])
+            image = cv2.imdecode(np.frombuffer(f.read(entry["size"]), dtype=np.uint8), cv2.IMREAD_COLOR)
+            found = detect(image, detector_model) if image is not None else None
+            crop = align(image, found[1], size) if found is not None else None
+            if crop is None:
+                continue
+            ok, jpeg = cv2.imencode(".jpg", crop)
+            if not ok:
+                continue
+            box, landmarks, score = found
+            crops.append((entry["frame_number"], entry["timestamp_ms"], jpeg.tobytes()))
+            faces.append({
+                "source": i,
+                "box": [round(float(v), 1) for v in box],
+                "landmarks": [[round(float(x), 1), round(float(y), 1)] for x, y in landmarks],
+                "score": round(score, 3) if score is not None else None,
+            })
+    with open(crops_path, "wb") as f:
+        crop_entries = frame_archive.write_archive(f, crops)
+    return crop_entries, faces
+
+
+def crop_refs(descriptor, indices):
+    """References to the crops of the given source frame indices that have a face, with their landmarks"""
+    position = {face["source"]: i for i, face in enumerate(descriptor["faces"])}
+    picked = [position[i] for i in indices if i in position]
+    return [
+        {**ref, "source_index": face["source"], "box": face["box"], "landmarks": face["landmarks"]}
+        for ref, face in zip(frame_archive.frame_refs(descriptor, picked), (descriptor["faces"][i] for i in picked))
+    ]
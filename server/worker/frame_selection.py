@@ -0,0 +1,153 @@
+"""Quality-aware frame selection.
+
+Candidate frames are reduced to small grayscale thumbnails and scored with
+cheap signals computed over the whole stack at once:
+
+- sharpness: variance of the Laplacian
+- exposure: distance of the mean brightness from mid-grey, penalized by clipped pixels
+- motion / stillness: mean absolute difference to the neighbouring candidate
+- face: area of the largest Haar-cascade face detection
+- document: area of the largest convex quadrilateral contour (an ID card in frame)
+
+Each consumer (PAD, face match, ID photo, OCR, doc-liveness) weighs these
+signals differently and gets its own top-k frames, configured under
+``frame_selection.consumers`` in config.yaml.
+"""
+import threading
+
+import cv2
+import numpy as np
+
+SIGNALS = ["sharpness", "exposure", "motion", "stillness", "face", "document"]
+
+DEFAULT_THUMBNAIL_WIDTH = 160
+
+# One classifier per thread: the selfie and ID streams are selected concurrently
+_local = threading.local()
+
+
+def candidate_interval(total_frames, config):
+    """Decode every n-th frame so at most max_candidates frames are scored"""
+    interval = config.get("sample_interval", 5)
+    max_candidates = config.get("max_candidates", 120)
+    if total_frames > 0 and max_candidates > 0:
+        interval = max(interval, -(-total_frames // max_candidates))
+    return max(1, interval)
+
+
+def thumbnail(frame, width=DEFAULT_THUMBNAIL_WIDTH):
+    """Small grayscale copy of a BGR frame used for every quality signal"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    height = max(1, round(gray.shape[0] * width / gray.shape[1]))
+    return cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def _normalize(values):
+    """Scale to [0, 1] by the 95th percentile so one outlier does not flatten the rest"""
+    scale = np.percentile(values, 95) if values.size else 0.0
+    if scale <= 0:
+        return np.zeros_like(values)
+    return np.clip(values / scale, 0.0, 1.0)
+
+
+def _face_area(thumbs):
+    if not hasattr(_local, "face_cascade"):
+        _local.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+    area = np.zeros(len(thumbs))
+    for i, thumb in enumerate(thumbs):
+        faces = _local.face_cascade.detectMultiScale(thumb, scaleFactor=1.2, minNeighbors=4, minSize=(16, 16))
+        if len(faces):
+            area[i] = max(w * h for _, _, w, h in faces) / thumb.size
+    return area
+
+
+def _document_area(thumbs):
+    area = np.zeros(len(thumbs))
+    for i, thumb in enumerate(thumbs):
+        edges = cv2.Canny(cv2.GaussianBlur(thumb, (5, 5), 0), 50, 150)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in contours:
+            quad = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(quad) == 4 and cv2.isContourConvex(quad):
+                area[i] = max(area[i], cv2.contourArea(quad) / thumb.size)
+    return area
+
+
+def quality_signals(thumbs):
+    """Compute every quality signal for a stack of equally sized thumbnails.
+
+    Returns a dict of float arrays in [0, 1], one value per thumbnail.
+    """
+    stack = np.asarray(thumbs, dtype=np.float32) / 255.0
+    n = len(stack)
+    if n == 0:
+        return {name: np.zeros(0) for name in SIGNALS}
+
+    laplacian = (
+        4 * stack[:, 1:-1, 1:-1]
+        - stack[:, :-2, 1:-1] - stack[:, 2:, 1:-1]
+        - stack[:, 1:-1, :-2] - stack[:, 1:-1, 2:]
+    )
+    sharpness = laplacian.reshape(n, -1).var(axis=1)
+
+    brightness = stack.reshape(n, -1).mean(axis=1)
+    clipped = ((stack < 0.02) | (stack > 0.98)).reshape(n, -1).mean(axis=1)
+    exposure = np.clip(1.0 - 2.0 * np.abs(brightness - 0.5), 0.0, 1.0) * (1.0 - clipped)
+
+    if n > 1:
+        diffs = np.abs(np.diff(stack, axis=0)).reshape(n - 1, -1).mean(axis=1)
+        # Each frame takes the larger change to either neighbour
+        motion = np.maximum(np.r_[diffs[:1], diffs], np.r_[diffs, diffs[-1:]])
+    else:
+        motion = np.zeros(1)
+    motion = _normalize(motion)
+
+    return {
+        "sharpness": _normalize(sharpness),
+        "exposure": exposure,
+        "motion": motion,
+        "stillness": 1.0 - motion,
+        "face": np.clip(_face_area(thumbs) * 4.0, 0.0, 1.0),  # a face filling a quarter of the frame scores 1
+        "document": np.clip(_document_area(thumbs) * 2.0, 0.0, 1.0),
+    }
+
+
+def select_top_k(signals, consumer):
+    """Indices of the best `k` frames for one consumer, in temporal order.
+
+    ``consumer`` holds ``k``, signal ``weights``, an optional ``require``
+    signal that must be present (falls back to all frames if none has it) and
+    an optional ``min_spacing`` in candidates to spread the picks over time.
+    """
+    weights = consumer.get("weights", {"sharpness": 1.0})
+    n = len(next(iter(signals.values())))
+    total = sum(weights.values()) or 1.0
+    score = sum(signals[name] * weight for name, weight in weights.items()) / total
+
+    eligible = np.ones(n, dtype=bool)
+    required = consumer.get("require")
+    if required and (signals[required] > 0).any():
+        eligible = signals[required] > 0
+
+    order = np.flatnonzero(eligible)[np.argsort(-score[eligible], kind="stable")]
+    k = consumer.get("k", 1)
+    spacing = consumer.get("min_spacing", 0)
+    if spacing <= 0:
+        return sorted(order[:k].tolist())
+
+    chosen = []
+    for i in order.tolist():
+        if all(abs(i - j) >= spacing for j in chosen):
+            chosen.append(i)
+            if len(chosen) == k:
+                break
+    return sorted(chosen)
+
+
+def select_frames(thumbs, consumers):
+    """Pick the frames each consumer should receive; returns {consumer: [candidate indices]}"""
+    signals = quality_signals(thumbs)
+    if len(thumbs) == 0:
+        return {name: [] for name in consumers}
+    return {name: select_top_k(signals, consumer) for name, consumer in consumers.items()}
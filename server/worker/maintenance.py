@@ -0,0 +1,94 @@
+"""Periodic maintenance tasks (run by celery beat)."""
+import os
+
+import yaml
+from celery.signals import worker_process_init
+
+from .celery_app import celery_app
+from . import retention, scratch
+from .tasks import BUCKET_NAME, FRAMES_BUCKET, minio_client, record_scratch_usage, retention_stats
+from db.database import SessionLocal, engine
+from db.partitions import archive_partitions, ensure_future_partitions
+
+# Load config
+with open(os.getenv("KYC_CONFIG_PATH", "/app/config.yaml"), 'r') as f:
+    config = yaml.safe_load(f)
+
+BUCKETS = {"videos": BUCKET_NAME, "frames": FRAMES_BUCKET}
+
+
+@celery_app.task
+def maintain_partitions():
+    """Create upcoming monthly partitions and archive the ones past retention"""
+    settings = config.get("partitioning", {})
+    with engine.begin() as conn:
+        ensure_future_partitions(conn, settings.get("months_ahead", 3))
+        archived = archive_partitions(
+            conn,
+            settings.get("retain_months", 24),
+            drop=settings.get("drop_archived", False),
+        )
+
+    if archived:
+        print(f"[partitions] Archived {len(archived)} partitions: {', '.join(archived)}")
+    return {"archived": archived}
+
+
+@worker_process_init.connect
+def sweep_scratch(**_):
+    """Remove scratch directories left by worker processes that died mid-run"""
+    removed, freed = scratch.sweep(config.get("retention", {}).get("scratch_max_age_hours", 6) * 3600)
+    if removed:
+        print(f"[retention] Removed {removed} stale scratch directories ({freed / 1e6:.1f} MB)")
+
+
+@celery_app.task
+def apply_retention():
+    """Delete session artifacts past their retention window, then stale scratch directories"""
+    settings = config.get("retention", {})
+    batch_size = settings.get("batch_size", retention.MAX_DELETE_BATCH)
+    purged = {}
+    db = SessionLocal()
+    try:
+        for artifact, hours in settings.get("policies", {}).items():
+            if hours is None:
+                continue
+            sessions, objects, size = retention.purge_artifact(
+                db, minio_client, BUCKETS, artifact, hours, batch_size, retention_stats
+            )
+            purged[artifact] = sessions
+            if sessions:
+                print(f"[retention] Deleted {artifact} of {sessions} sessions: {objects} objects, {size / 1e6:.1f} MB")
+    finally:
+        db.close()
+
+    sweep_scratch()
+    record_scratch_usage()
+    return {"purged": purged}
+
+
+@celery_app.task
+def sweep_orphans():
+    """Delete objects of no live session and abort abandoned multipart uploads"""
+    settings = config.get("retention", {})
+    grace_hours = settings.get("orphan_grace_hours", 48)
+    batch_size = settings.get("batch_size", retention.MAX_DELETE_BATCH)
+    retain_months = config.get("partitioning", {}).get("retain_months", 24)
+    deleted = {}
+    db = SessionLocal()
+    try:
+        for role, bucket in BUCKETS.items():
+            if not minio_client.bucket_exists(bucket):
+                continue
+            objects, size = retention.sweep_orphans(
+                db, minio_client, BUCKETS, role, grace_hours, settings.get("policies", {}), retain_months,
+                batch_size, retention_stats
+            )
+            aborted = retention.abort_stale_uploads(minio_client, bucket, grace_hours, retention_stats)
+            deleted[bucket] = objects
+            if objects or aborted:
+                print(f"[retention] {bucket}: deleted {objects} orphaned objects ({size / 1e6:.1f} MB), "
+                      f"aborted {aborted} stale uploads")
+    finally:
+        db.close()
+    return {"deleted": deleted}
@@ -0,0 +1,186 @@
+"""Segment-parallel decoding of candidate frames.
+
+The video is split into time segments whose boundaries sit on keyframes
+(taken from ffprobe's packet flags when it is installed, otherwise an even
+split that OpenCV's seek resolves to the preceding keyframe). Each segment is
+decoded in its own process. A worker writes the segment's thumbnails and
+JPEG-encoded candidate frames into one shared memory block and returns only
+their offsets, so no frame arrays are pickled. The parent copies the results
+out in segment order and unlinks the block.
+
+The decode processes come from a forkserver rather than being forked from
+the worker: the pipeline's stream threads, OpenCV and the hedging threads
+run alongside, and a forked child can deadlock on a lock one of them held.
+"""
+import os
+import shutil
+import subprocess
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+try:
+    import billiard as mp  # Celery prefork children are daemonic; billiard lets them start a pool
+except ModuleNotFoundError:  # pragma: no cover - optional dependency guard
+    import multiprocessing as mp
+
+from .frame_selection import DEFAULT_THUMBNAIL_WIDTH, thumbnail
+
+DEFAULT_MIN_SEGMENT_FRAMES = 150
+
+
+def resolve_processes(processes):
+    """0 or None means one decode process per CPU"""
+    if not processes:
+        return os.cpu_count() or 1
+    return max(1, int(processes))
+
+
+def keyframe_indices(video_path):
+    """Frame numbers of the video's keyframes, or None when ffprobe is not available"""
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe is None:
+        return None
+    try:
+        output = subprocess.run(
+            [ffprobe, "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=flags",
+             "-of", "csv=p=0", video_path],
+            capture_output=True, text=True, timeout=60, check=True,
+        ).stdout
+    except (subprocess.SubprocessError, OSError):
+        return None
+    return [i for i, flags in enumerate(output.split()) if "K" in flags]
+
+
+def plan_segments(total_frames, processes, keyframes=None, min_segment_frames=DEFAULT_MIN_SEGMENT_FRAMES):
+    """Split [0, total_frames) into at most `processes` segments starting on keyframes.
+
+    Returns ``(start, end)`` pairs; the last segment has ``end=None`` and reads
+    to the end of the stream, since container frame counts are estimates.
+    """
+    count = max(1, min(processes, total_frames // max(1, min_segment_frames)))
+    starts = [round(i * total_frames / count) for i in range(count)]
+    if keyframes:
+        keyframes = np.asarray(keyframes)
+        starts = [0] + [int(keyframes[np.abs(keyframes - start).argmin()]) for start in starts[1:]]
+    starts = sorted(set(starts))
+    return [(start, end) for start, end in zip(starts, starts[1:])] + [(starts[-1], None)]
+
+
+def _decode_segment(task):
+    """Decode one segment in a pool process and park its output in shared memory"""
+    video_path, start, end, interval, thumbnail_width = task
+    cv2.setNumThreads(1)  # the pool already uses every core
+
+    cap = cv2.VideoCapture(video_path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    frame_number = start
+
+    meta, encoded, thumbs = [], [], []
+    while (end is None or frame_number < end) and cap.grab():
+        if frame_number % interval == 0:
+            ret, frame = cap.retrieve()
+            if ret:
+                ok, jpeg = cv2.imencode(".jpg", frame)
+                if ok:
+                    meta.append((frame_number, cap.get(cv2.CAP_PROP_POS_MSEC), len(jpeg)))
+                    encoded.append(jpeg)
+                    thumbs.append(thumbnail(frame, thumbnail_width))
+        frame_number += 1
+    cap.release()
+
+    if not meta:
+        return None, (0, 0, 0), []
+
+    thumbs = np.stack(thumbs)
+    jpeg_bytes = sum(size for _, _, size in meta)
+    block = shared_memory.SharedMemory(create=True, size=thumbs.nbytes + jpeg_bytes)
+    # The parent attaches and unlinks the block; stop this process's tracker from
+    # removing it when the pool process exits
+    resource_tracker.unregister(block._name, "shared_memory")
+    try:
+        np.ndarray(thumbs.shape, dtype=np.uint8, buffer=block.buf)[:] = thumbs
+        offset = thumbs.nbytes
+        for jpeg in encoded:
+            block.buf[offset:offset + len(jpeg)] = jpeg.tobytes()
+            offset += len(jpeg)
+        return block.name, thumbs.shape, meta
+    finally:
+        block.close()
+
+
+def _collect_segment(name, shape, meta):
+    """Copy one segment's thumbnails and JPEGs out of shared memory and free the block"""
+    if name is None:
+        return [], []
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        thumbs = np.ndarray(shape, dtype=np.uint8, buffer=block.buf).copy()
+        candidates = []
+        offset = thumbs.nbytes
+        for frame_number, timestamp_ms, size in meta:
+            candidates.append((frame_number, timestamp_ms, bytes(block.buf[offset:offset + size])))
+            offset += size
+        return candidates, list(thumbs)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def decode_candidates(video_path, interval, processes=1, thumbnail_width=DEFAULT_THUMBNAIL_WIDTH,
+                      min_segment_frames=DEFAULT_MIN_SEGMENT_FRAMES):
+    """Decode every `interval`-th frame, in parallel segments when worthwhile.
+
+    Returns ``(candidates, thumbs)``: ``(frame_number, timestamp_ms, jpeg_bytes)``
+    tuples and grayscale thumbnails, both in frame order.
+    """
+    processes = resolve_processes(processes)
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    segments = [(0, None)]
+    if processes > 1 and total_frames > 0:
+        segments = plan_segments(total_frames, processes, keyframe_indices(video_path), min_segment_frames)
+
+    tasks = [(video_path, start, end, interval, thumbnail_width) for start, end in segments]
+    if len(tasks) == 1:
+        results = [_decode_segment(tasks[0])]
+    else:
+        with mp.get_context("forkserver").Pool(processes=len(tasks)) as pool:
+            results = pool.map(_decode_segment, tasks)
+
+    candidates, thumbs = [], []
+    for name, shape, meta in results:
+        segment_candidates, segment_thumbs = _collect_segment(name, shape, meta)
+        candidates.extend(segment_candidates)
+        thumbs.extend(segment_thumbs)
+    return candidates, thumbs
+
+
+def decode_frames_at(video_path, frame_numbers, max_forward_grab=30):
+    """JPEG-encode specific frames of a video, e.g. full-resolution copies of selected proxy frames.
+
+    Nearby frames are reached by grabbing forward; farther ones by seeking.
+    Returns {frame_number: (timestamp_ms, jpeg_bytes)}.
+    """
+    cap = cv2.VideoCapture(video_path)
+    position = 0
+    frames = {}
+    for frame_number in sorted(set(frame_numbers)):
+        if not 0 <= frame_number - position <= max_forward_grab:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            position = frame_number
+        while position < frame_number and cap.grab():
+            position += 1
+        ret, frame = cap.read()
+        if not ret:
+            break
+        position += 1
+        ok, jpeg = cv2.imencode(".jpg", frame)
+        if ok:
+            frames[frame_number] = (cap.get(cv2.CAP_PROP_POS_MSEC), jpeg.tobytes())
+    cap.release()
+    return frames
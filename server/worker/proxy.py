@@ -0,0 +1,62 @@
+"""Analysis proxy transcoding.
+
+Uploads arrive as 720p-4K H.264, H.265 or VP9. Once per session, each video
+is transcoded into a small H.264 proxy that is cheap to decode and seek:
+capped height, a short fixed GOP, no B-frames and the original frame timing
+(so frame numbers in the proxy match the original). The proxy is stored in
+MinIO next to the original. Analysis stages read the proxy; only stages that
+need full resolution (OCR of small print, the ID photo) go back to the
+original.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+DEFAULT_PROXY_CONFIG = {
+    "enabled": True,
+    "max_height": 480,
+    "gop": 10,
+    "crf": 23,
+    "preset": "ultrafast",
+    "timeout": 300,
+}
+
+
+def proxy_object_name(session_id, label):
+    return f"{session_id}/proxy_{label}.mp4"
+
+
+def ffmpeg_command(src, dst, proxy_config):
+    cfg = {**DEFAULT_PROXY_CONFIG, **(proxy_config or {})}
+    gop = str(cfg["gop"])
+    return [
+        shutil.which("ffmpeg") or "ffmpeg", "-y", "-v", "error",
+        "-i", src,
+        "-map", "0:v:0", "-an",
+        # Never upscale; -2 keeps the width even for yuv420p
+        "-vf", f"scale=-2:'min({cfg['max_height']},ih)'",
+        "-c:v", "libx264", "-preset", cfg["preset"], "-crf", str(cfg["crf"]),
+        # Short closed GOPs without B-frames: every seek lands within a few frames of a keyframe
+        "-g", gop, "-keyint_min", gop, "-sc_threshold", "0", "-bf", "0",
+        "-pix_fmt", "yuv420p",
+        "-fps_mode", "passthrough",
+        "-movflags", "+faststart",
+        dst,
+    ]
+
+
+def transcode_proxy(src, proxy_config=None, workdir=None):
+    """Transcode src into an analysis proxy under workdir; returns its path, or None if ffmpeg is unavailable or fails"""
+    cfg = {**DEFAULT_PROXY_CONFIG, **(proxy_config or {})}
+    if not cfg["enabled"] or shutil.which("ffmpeg") is None:
+        return None
+
+    dst = os.path.join(tempfile.mkdtemp(dir=workdir), "proxy.mp4")
+    try:
+        subprocess.run(ffmpeg_command(src, dst, cfg), check=True, capture_output=True, timeout=cfg["timeout"])
+    except (subprocess.SubprocessError, OSError) as e:
+        print(f"Proxy transcode failed, analysing the original: {e}")
+        shutil.rmtree(os.path.dirname(dst), ignore_errors=True)
+        return None
+    return dst
@@ -0,0 +1,199 @@
+"""Retention of session artifacts in object storage.
+
+Policies (``retention.policies`` in config.yaml) give, per artifact, how
+many hours after a session finished (completed or failed, as of
+``session_summary.completed_at``) its objects are deleted: the frame
+archives in the frames bucket, and the analysis proxies and original
+uploads in the videos bucket. A policy of ``null`` keeps the artifact.
+
+A session's objects are found by listing its prefix and deleted with
+multi-object delete requests of at most ``batch_size`` keys (S3 takes up
+to 1000 per request). Each purge is stamped on the summary row
+(``<artifact>_purged_at``), and a partial index over the finished,
+unpurged sessions per artifact keeps every run proportional to the
+sessions that are due rather than to the history.
+
+The orphan sweep lists the top-level prefixes of a bucket and deletes those
+that belong to no KycSession once they are older than a grace period, and
+aborts multipart uploads (common/chunked_upload.py) left open that long.
+Sessions in partitions archived by db/partitions.py are no longer in
+kyc_sessions or session_summary, so objects from the oldest live month or
+earlier are never treated as orphans: without a live session they are
+deleted once older than their artifact's retention, counted from upload.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from minio.deleteobjects import DeleteObject
+
+from db.models import KycSession, SessionSummary
+from db.partitions import add_months
+
+FINISHED = ["completed", "failed"]
+
+MAX_DELETE_BATCH = 1000
+
+
+def _is_proxy(object_name):
+    return os.path.basename(object_name).startswith("proxy_")
+
+
+# Artifact -> (bucket role, object filter, KycSession columns cleared once the objects are gone)
+ARTIFACTS = {
+    "frames": ("frames", lambda name: True, []),
+    "proxies": ("videos", _is_proxy, ["selfie_proxy_path", "id_proxy_path"]),
+    "videos": ("videos", lambda name: not _is_proxy(name), []),
+}
+
+
+def artifact_of(role, object_name):
+    """Artifact an object of the bucket with the given role belongs to"""
+    return next(artifact for artifact, (bucket_role, matches, _) in ARTIFACTS.items()
+                if bucket_role == role and matches(object_name))
+
+
+def purged_column(artifact):
+    return getattr(SessionSummary, f"{artifact}_purged_at")
+
+
+def due_sessions(db, artifact, hours, limit, now=None):
+    """(session_pk, session_id) of finished sessions whose artifact is past its retention, oldest first"""
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=hours)
+    return (
+        db.query(SessionSummary.session_pk, SessionSummary.session_id)
+        .filter(
+            purged_column(artifact).is_(None),
+            SessionSummary.status.in_(FINISHED),
+            SessionSummary.completed_at < cutoff,
+        )
+        .order_by(SessionSummary.completed_at)
+        .limit(limit)
+        .all()
+    )
+
+
+def delete_objects(client, bucket, names, batch_size=MAX_DELETE_BATCH):
+    """Delete objects with multi-object delete requests; returns the names that could not be deleted"""
+    batch_size = min(batch_size, MAX_DELETE_BATCH)
+    failed = set()
+    for start in range(0, len(names), batch_size):
+        batch = [DeleteObject(name) for name in names[start:start + batch_size]]
+        for error in client.remove_objects(bucket, batch):
+            print(f"[retention] Could not delete {bucket}/{error.name}: {error.code} {error.message}")
+            failed.add(error.name)
+    return failed
+
+
+def purge_artifact(db, client, buckets, artifact, hours, batch_size=MAX_DELETE_BATCH, stats=None):
+    """Delete one artifact of every session past its retention, batch_size sessions at a time.
+
+    Sessions whose objects could not all be deleted stay due for the next
+    run. Returns (sessions purged, objects deleted, bytes deleted).
+    """
+    role, matches, columns = ARTIFACTS[artifact]
+    bucket = buckets[role]
+    totals = [0, 0, 0]
+    while True:
+        sessions = due_sessions(db, artifact, hours, batch_size)
+        if not sessions:
+            break
+        objects = {}
+        for session_pk, session_id in sessions:
+            for item in client.list_objects(bucket, prefix=f"{session_id}/", recursive=True):
+                if matches(item.object_name):
+                    objects[item.object_name] = (session_pk, item.size or 0)
+
+        failed = delete_objects(client, bucket, list(objects), batch_size)
+        failed_sessions = {objects[name][0] for name in failed}
+        purged = [session_pk for session_pk, _ in sessions if session_pk not in failed_sessions]
+        if purged:
+            db.query(SessionSummary).filter(SessionSummary.session_pk.in_(purged)).update(
+                {purged_column(artifact): datetime.utcnow()}, synchronize_session=False
+            )
+            if columns:
+                db.query(KycSession).filter(KycSession.id.in_(purged)).update(
+                    {column: None for column in columns}, synchronize_session=False
+                )
+            db.commit()
+
+        deleted = [name for name in objects if name not in failed]
+        counts = [len(purged), len(deleted), sum(objects[name][1] for name in deleted)]
+        totals = [total + count for total, count in zip(totals, counts)]
+        if stats is not None:
+            stats.record(artifact, objects_deleted=counts[1], bytes_deleted=counts[2], delete_errors=len(failed))
+        # Failed sessions would come back first in the next batch; leave them to the next run
+        if failed or len(sessions) < batch_size:
+            break
+    return tuple(totals)
+
+
+def sweep_orphans(db, client, buckets, role, grace_hours, policies, retain_months, batch_size=MAX_DELETE_BATCH,
+                  stats=None, now=None):
+    """Delete objects under top-level prefixes of a bucket that belong to no live KycSession.
+
+    Objects newer than the oldest live partition month are orphans once
+    older than grace_hours; older ones may belong to an archived session and
+    are deleted once older than their artifact's policy (``policies``, in
+    hours). Returns (objects deleted, bytes deleted).
+    """
+    now = now or datetime.now(timezone.utc)
+    bucket = buckets[role]
+    orphan_cutoff = now - timedelta(hours=grace_hours)
+    live_since = datetime.combine(add_months(now.date(), 1 - retain_months), datetime.min.time(), timezone.utc)
+    policy_cutoffs = {
+        artifact: now - timedelta(hours=hours) for artifact, hours in policies.items() if hours is not None
+    }
+
+    listing = iter(client.list_objects(bucket))
+    deleted = size = 0
+    while True:
+        chunk = [item.object_name for item in islice(listing, batch_size)]
+        if not chunk:
+            break
+        ids = [prefix.rstrip("/") for prefix in chunk]
+        known = {session_id for (session_id,) in db.query(KycSession.session_id).filter(KycSession.session_id.in_(ids))}
+        objects = {}
+        for prefix in chunk:
+            if prefix.rstrip("/") in known:
+                continue
+            for item in client.list_objects(bucket, prefix=prefix, recursive=True):
+                if item.last_modified is None:
+                    continue
+                if item.last_modified >= live_since:
+                    cutoff = orphan_cutoff
+                else:
+                    cutoff = policy_cutoffs.get(artifact_of(role, item.object_name))
+                if cutoff is not None and item.last_modified < cutoff:
+                    objects[item.object_name] = item.size or 0
+        if not objects:
+            continue
+        failed = delete_objects(client, bucket, list(objects), batch_size)
+        removed = [name for name in objects if name not in failed]
+        deleted += len(removed)
+        size += sum(objects[name] for name in removed)
+        if stats is not None:
+            stats.record("orphans", objects_deleted=len(removed), bytes_deleted=sum(objects[name] for name in removed),
+                         delete_errors=len(failed))
+    return deleted, size
+
+
+def abort_stale_uploads(client, bucket, max_age_hours, stats=None, now=None):
+    """Abort multipart uploads started more than max_age_hours ago; returns how many were aborted"""
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(hours=max_age_hours)
+    aborted = 0
+    key_marker = upload_id_marker = None
+    while True:
+        result = client._list_multipart_uploads(
+            bucket, key_marker=key_marker, upload_id_marker=upload_id_marker, max_uploads=MAX_DELETE_BATCH
+        )
+        for upload in result.uploads:
+            if upload.initiated_time is not None and upload.initiated_time < cutoff:
+                client._abort_multipart_upload(bucket, upload.object_name, upload.upload_id)
+                aborted += 1
+        if not result.is_truncated:
+            break
+        key_marker, upload_id_marker = result.next_key_marker, result.next_upload_id_marker
+    if stats is not None and aborted:
+        stats.record("uploads", objects_deleted=aborted)
+    return aborted
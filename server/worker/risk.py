@@ -0,0 +1,74 @@
+"""Risk scoring shared by the worker and the batch re-scorer.
+
+Every function accepts scalars or NumPy arrays, so the worker scores one
+session with the same code the re-scorer uses on chunks of millions.
+"""
+import numpy as np
+
+# Component -> (config key for threshold and weight, pass direction).
+# "min" components pass when score >= threshold, "max" ones when score <= threshold.
+COMPONENTS = {
+    "pad": ("pad", "min"),
+    "deepfake": ("replay", "max"),
+    "face_match": ("facematch", "min"),
+    "doc_liveness": ("doc_liveness", "min"),
+}
+
+DEFAULT_DECISION_CUTOFFS = {"approve": 0.8, "manual_review": 0.6}
+
+RISK_LEVELS = np.array(["low", "medium", "high"])
+DECISIONS = np.array(["approve", "manual_review", "reject"])
+
+
+def component_passed(component, score, config):
+    """Whether a component score passes its configured threshold (missing scores fail)"""
+    key, direction = COMPONENTS[component]
+    threshold = config["thresholds"][key]
+    score = np.asarray(score, dtype=np.float64)
+    passed = score >= threshold if direction == "min" else score <= threshold
+    return passed & ~np.isnan(score)
+
+
+def component_weights(config):
+    """Weights of the scored components, keyed by component name"""
+    return {component: config["weights"][key] for component, (key, _) in COMPONENTS.items()}
+
+
+def evaluate(scores, config):
+    """Score sessions from their raw component scores.
+
+    ``scores`` maps each component in COMPONENTS to a scalar or array. The
+    overall score is the weight-normalized share of passed components, and the
+    decision cut-offs come from ``config["decision_cutoffs"]``.
+    """
+    weights = component_weights(config)
+    cutoffs = config.get("decision_cutoffs", DEFAULT_DECISION_CUTOFFS)
+    total_weight = sum(weights.values())
+
+    passed = {component: component_passed(component, scores[component], config) for component in COMPONENTS}
+    overall = sum(passed[component] * weights[component] for component in COMPONENTS) / total_weight
+
+    level = np.select(
+        [overall >= cutoffs["approve"], overall >= cutoffs["manual_review"]],
+        [0, 1],
+        default=2,
+    )
+
+    return {
+        "passed": passed,
+        "overall_score": overall,
+        "risk_level": RISK_LEVELS[level],
+        "decision": DECISIONS[level],
+    }
+
+
+def score_session(scores, config):
+    """Score a single session, returning plain Python values for the RiskScore row"""
+    result = evaluate(scores, config)
+    return {
+        "overall_score": float(result["overall_score"]),
+        "risk_level": str(result["risk_level"]),
+        "decision": str(result["decision"]),
+        "component_scores": {component: 1.0 if bool(flag) else 0.0 for component, flag in result["passed"].items()},
+        "weights": component_weights(config),
+    }
@@ -0,0 +1,77 @@
+"""Worker scratch space for downloaded videos, proxies and frame archives.
+
+Every pipeline run works in its own directory under ``SCRATCH_ROOT``, named
+after the owning process and the session, and the whole directory is
+removed when the run ends, whether it succeeded or not. Directories left
+behind by a killed worker process are removed by ``sweep()``, which each
+worker process runs when it starts and the retention task runs
+periodically.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+SCRATCH_ROOT = os.getenv("WORKER_SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "kyc-worker"))
+
+
+def create_dir(session_id):
+    """New scratch directory for one pipeline run"""
+    os.makedirs(SCRATCH_ROOT, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"{os.getpid()}.{session_id}.", dir=SCRATCH_ROOT)
+
+
+def remove_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _owner_alive(name):
+    pid = name.split(".", 1)[0]
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def usage():
+    """(run directories, bytes) currently under the scratch root"""
+    if not os.path.isdir(SCRATCH_ROOT):
+        return 0, 0
+    entries = [entry for entry in os.scandir(SCRATCH_ROOT) if entry.is_dir(follow_symlinks=False)]
+    return len(entries), sum(_size(entry.path) for entry in entries)
+
+
+def sweep(max_age_seconds):
+    """Remove run directories whose process is gone or that are older than max_age_seconds.
+
+    Returns (directories removed, bytes freed).
+    """
+    if not os.path.isdir(SCRATCH_ROOT):
+        return 0, 0
+    removed = freed = 0
+    cutoff = time.time() - max_age_seconds
+    for entry in os.scandir(SCRATCH_ROOT):
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        if _owner_alive(entry.name) and entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+            continue
+        freed += _size(entry.path)
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed += 1
+    return removed, freed
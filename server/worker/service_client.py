@@ -0,0 +1,338 @@
+"""Replica-aware calls to the analysis services, with optional hedging.
+
+Every service has a list of replica base URLs (``services.replicas`` in
+config.yaml). A call goes to the better of two randomly chosen replicas
+(power of two choices): fewer requests outstanding from this worker
+process, then lower recent latency. A 503 from a saturated replica is
+retried on another replica at once, and after its Retry-After once every
+replica has answered 503.
+
+With hedging enabled and at least two replicas, a call still unanswered
+after the service's recent latency percentile (``hedging.percentile``, at
+least ``min_delay_seconds``) is sent once more to a different replica and
+the first good answer wins. The first copy runs on the calling thread and
+only the hedged copy on the hedging threads, so a busy pool never holds
+back a call. The losing copy's connection is shut down as soon as the
+other answers, which frees its thread at once; the service then drops the
+request when it next checks its deadline.
+
+With session affinity (``affinity`` in config.yaml), every call carrying
+a ``session_id`` goes to a replica on the session's home node instead: the
+owner of the session id on a consistent hash ring of the nodes the
+replicas run on (common/hashring.py). All stages, retries and reprocessing
+of a session then land where its frame archives are already cached
+(common/frame_cache.py). A node is passed over for the next one on the
+ring while its replicas carry more than ``max_load`` times their share of
+the outstanding calls, and while they refuse connections (for
+``down_seconds``), so a node leaving only moves its own sessions.
+
+Calls and errors per replica, hedged calls, hedge wins and calls served by
+a session's home node or another node are counted in Redis
+(common/service_stats.py) and exported on the API's ``/metrics``.
+"""
+import math
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+
+from common.hashring import DEFAULT_VNODES, HashRing
+from common.serialization import JSON_CONTENT_TYPE, dumps, loads
+
+# Absolute request deadline (Unix seconds) understood by the services, see common/admission.py
+DEADLINE_HEADER = "X-Request-Deadline"
+
+
+class _AbortablePoolManager(PoolManager):
+    """Pool manager that remembers its sockets so another thread can shut them down"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sockets = []
+        self.aborted = False
+
+    def _new_pool(self, *args, **kwargs):
+        pool = super()._new_pool(*args, **kwargs)
+        manager = self
+
+        class Connection(pool.ConnectionCls):
+            def connect(self):
+                super().connect()
+                manager.sockets.append(self.sock)
+                if manager.aborted:
+                    manager.abort()
+
+        pool.ConnectionCls = Connection
+        return pool
+
+    def abort(self):
+        self.aborted = True
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _AbortableAdapter(HTTPAdapter):
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager = _AbortablePoolManager(num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs)
+
+
+class _Copy:
+    """One copy of a call, on its own connection, which abort() closes from any thread"""
+
+    def __init__(self):
+        self.adapter = _AbortableAdapter()
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    @property
+    def aborted(self):
+        return self.adapter.poolmanager.aborted
+
+    def abort(self):
+        self.adapter.poolmanager.abort()
+
+    def post(self, url, **kwargs):
+        try:
+            return self.session.post(url, **kwargs)
+        finally:
+            self.session.close()
+
+
+class Replica:
+    def __init__(self, url, node=None):
+        self.url = url.rstrip("/")
+        self.node = node or urlparse(self.url).hostname
+        self.outstanding = 0
+        self.latency = 0.0  # Exponentially weighted mean of successful call times
+        self.failed_at = 0.0  # Last refused connection
+
+
+class ServiceClient:
+    def __init__(self, services_config, stats=None):
+        hedging = services_config.get("hedging", {})
+        affinity = services_config.get("affinity", {})
+        nodes = affinity.get("nodes") or {}
+        self.timeout = services_config.get("timeout_seconds", 300)
+        self.replicas = {
+            service: [Replica(url, nodes.get(url)) for url in urls]
+            for service, urls in services_config.get("replicas", {}).items()
+        }
+        self.affinity = affinity.get("enabled", False)
+        self.max_load = affinity.get("max_load", 1.25)
+        self.down_seconds = affinity.get("down_seconds", 30)
+        self.rings = {
+            service: HashRing({replica.node for replica in replicas}, affinity.get("virtual_nodes", DEFAULT_VNODES))
+            for service, replicas in self.replicas.items()
+        }
+        # This process's node, to tell whether a session's home node is local
+        self.node = os.getenv("NODE_NAME") or socket.gethostname()
+        self.hedging = hedging.get("enabled", False)
+        self.percentile = hedging.get("percentile", 95)
+        self.min_delay = hedging.get("min_delay_seconds", 0.5)
+        self.min_samples = hedging.get("min_samples", 20)
+        # Hedged copies in flight at once: one per concurrent caller, and as many losers still closing
+        self.hedge_threads = 2 * hedging.get("concurrent_calls", 4)
+        self.latencies = {service: deque(maxlen=hedging.get("window", 200)) for service in self.replicas}
+        self.stats = stats
+        self.lock = threading.Lock()
+        self.executor = None
+        self.executor_pid = None
+
+    def _executor(self):
+        """Hedging threads, started in the process that uses them (Celery forks its workers)"""
+        if self.executor_pid != os.getpid():
+            self.executor = ThreadPoolExecutor(max_workers=self.hedge_threads, thread_name_prefix="service-hedge")
+            self.executor_pid = os.getpid()
+        return self.executor
+
+    def home_node(self, service, session_id):
+        return self.rings[service].owner(session_id)
+
+    def is_home(self, session_id):
+        """Whether this process runs on the home node of the session for any service"""
+        return self.affinity and any(ring.owner(session_id) == self.node for ring in self.rings.values())
+
+    def _affine(self, service, replicas, session_id):
+        """Least loaded replica on the first node in the session's ring order that is not overloaded"""
+        by_node = {}
+        for replica in replicas:
+            by_node.setdefault(replica.node, []).append(replica)
+        with self.lock:
+            outstanding = sum(replica.outstanding for replica in self.replicas[service])
+            limit = math.ceil(self.max_load * (outstanding + 1) / len(self.replicas[service]))
+            for node in self.rings[service].preference(session_id):
+                if node in by_node:
+                    replica = min(by_node[node], key=lambda replica: (replica.outstanding, replica.latency))
+                    if replica.outstanding < limit:
+                        return replica
+        return None
+
+    def pick(self, service, exclude=(), session_id=None):
+        """Replica on the session's home node with affinity, else the less loaded of two random replicas.
+
+        Skips `exclude` and replicas that recently refused connections while others remain.
+        """
+        replicas = [replica for replica in self.replicas[service] if replica not in exclude] or self.replicas[service]
+        cutoff = time.time() - self.down_seconds
+        replicas = [replica for replica in replicas if replica.failed_at < cutoff] or replicas
+        if self.affinity and session_id:
+            replica = self._affine(service, replicas, session_id)
+            if replica is not None:
+                return replica
+        choices = random.sample(replicas, 2) if len(replicas) > 2 else replicas
+        with self.lock:
+            return min(choices, key=lambda replica: (replica.outstanding, replica.latency))
+
+    def hedge_delay(self, service):
+        """Seconds to wait before hedging a call, or None when it should not be hedged"""
+        samples = self.latencies[service]
+        if not self.hedging or len(self.replicas[service]) < 2 or len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, float(np.percentile(samples, self.percentile)))
+
+    def _record(self, service, replica=None, **counts):
+        if self.stats is not None:
+            try:
+                self.stats.record(service, replica.url if replica else None, **counts)
+            except Exception as e:
+                print(f"Could not record {service} call statistics: {e}")
+
+    def _send(self, service, replica, path, payload, headers, deadline, copy=None):
+        """POST to one replica, tracking its outstanding calls and latency"""
+        copy = copy or _Copy()
+        with self.lock:
+            replica.outstanding += 1
+        started = time.perf_counter()
+        try:
+            response = copy.post(
+                replica.url + path, data=payload, headers=headers, timeout=max(deadline - time.time(), 1)
+            )
+        except requests.exceptions.RequestException as e:
+            if copy.aborted:  # Lost to the other copy; not the replica's fault
+                self._record(service, replica, requests=1)
+                raise
+            if isinstance(e, requests.exceptions.ConnectionError):
+                replica.failed_at = time.time()
+            self._record(service, replica, requests=1, errors=1)
+            raise
+        finally:
+            with self.lock:
+                replica.outstanding -= 1
+        elapsed = time.perf_counter() - started
+        self._record(service, replica, requests=1, errors=int(response.status_code >= 500))
+        if response.ok:
+            with self.lock:
+                replica.latency = 0.8 * replica.latency + 0.2 * elapsed if replica.latency else elapsed
+                self.latencies[service].append(elapsed)
+        return response
+
+    def _attempt(self, service, path, payload, headers, deadline, exclude=(), session_id=None):
+        """One call, hedged to a second replica if it is slower than usual; returns (replica, response)
+
+        The first copy runs on this thread. A hedging thread waits out the
+        hedge delay and, if the first copy is still running, sends the second;
+        whichever copy answers first without a 5xx aborts the other.
+        """
+        primary = self.pick(service, exclude, session_id)
+        delay = self.hedge_delay(service)
+        if delay is None:
+            return primary, self._send(service, primary, path, payload, headers, deadline)
+
+        primary_copy, backup_copy = _Copy(), _Copy()
+        answered = threading.Event()
+
+        def hedge():
+            if answered.wait(delay):
+                return None
+            backup = self.pick(service, (*exclude, primary), session_id)
+            self._record(service, hedged=1)
+            if self.stats is not None:
+                self.stats.set_hedge_delay(service, round(delay, 3))
+            response = self._send(service, backup, path, payload, headers, deadline, backup_copy)
+            if response.status_code < 500 and not answered.is_set():
+                primary_copy.abort()
+            return backup, response
+
+        hedged = self._executor().submit(hedge)
+        error, fallback = None, None
+        try:
+            response = self._send(service, primary, path, payload, headers, deadline, primary_copy)
+        except requests.exceptions.RequestException as e:
+            error = e
+        else:
+            if response.status_code < 500:
+                answered.set()
+                backup_copy.abort()
+                return primary, response
+            fallback = (primary, response)
+        answered.set()
+
+        # The first copy failed, answered 5xx or lost to the hedged copy
+        try:
+            result = hedged.result()
+        except requests.exceptions.RequestException as e:
+            result, error = None, error or e
+        if result is not None:
+            if result[1].status_code < 500:
+                self._record(service, hedge_wins=1)
+                return result
+            fallback = fallback or result
+        if fallback is None:
+            raise error
+        return fallback
+
+    def call(self, service, path, payload):
+        """POST payload to a replica of service and return the decoded JSON answer.
+
+        The call carries an absolute deadline so the service can drop the
+        request once we stop waiting. A replica that refuses the connection
+        is skipped and the call goes to another one.
+        """
+        deadline = time.time() + self.timeout
+        headers = {DEADLINE_HEADER: f"{deadline:.3f}", "Content-Type": JSON_CONTENT_TYPE}
+        session_id = payload.get("session_id")
+        payload = dumps(payload)  # Encoded once, shared by retries and hedged copies
+        saturated = []
+        refused = 0
+        try:
+            while True:
+                try:
+                    replica, response = self._attempt(
+                        service, path, payload, headers, deadline, saturated, session_id
+                    )
+                except requests.exceptions.ConnectionError:
+                    refused += 1
+                    if refused < len(self.replicas[service]) and time.time() < deadline:
+                        continue
+                    raise
+                if response.status_code == 503:
+                    saturated.append(replica)
+                    if len(saturated) < len(self.replicas[service]):
+                        continue
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                    if time.time() + retry_after < deadline:
+                        print(f"{service} is saturated, retrying in {retry_after:.0f}s")
+                        time.sleep(retry_after)
+                        saturated = []
+                        continue
+                response.raise_for_status()
+                if self.affinity and session_id:
+                    home = replica.node == self.home_node(service, session_id)
+                    self._record(service, affinity_home=int(home), affinity_fallback=int(not home))
+                return loads(response.content)
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Service call failed: {str(e)}")
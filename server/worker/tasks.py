@@ -1,15 +1,30 @@
-import requests
 import json
 import cv2
 import os
 import tempfile
+import shutil
+import time
+import socket
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from minio import Minio
 from minio.error import S3Error
 import yaml
+import redis
 from sqlalchemy.orm import Session
 from datetime import datetime
 
 from .celery_app import celery_app
+from .frame_selection import candidate_interval, select_frames
+from .parallel_decode import decode_candidates, decode_frames_at
+from .proxy import proxy_object_name, transcode_proxy
+from .risk import component_passed, score_session
+from .service_client import ServiceClient
+from . import face_crops, replay_index, scratch
+from common import frame_archive
+from common.frame_cache import FrameCache
+from common.scheduling import SessionScheduler
+from common.service_stats import ServiceStats
+from common.retention_stats import RetentionStats
 from db.database import SessionLocal
 from db.models import (
     KycSession,
@@ -21,12 +36,24 @@ from db.models import (
     MrzResult,
     DocLivenessResult,
     RiskScore,
+    SessionSummary,
 )
 
-# Load config
-with open('/app/config.yaml', 'r') as f:
+# Load config (KYC_CONFIG_PATH lets scripts import the worker outside its container)
+with open(os.getenv("KYC_CONFIG_PATH", "/app/config.yaml"), 'r') as f:
     config = yaml.safe_load(f)
 
+# Sessions queued by the API, dispatched earliest-deadline-first (common/scheduling.py)
+redis_client = redis.Redis(host="redis", port=6379, db=0)
+scheduler = SessionScheduler(redis_client)
+MAX_RETRIES = 3
+
+# Analysis service calls, balanced over the replicas in config.yaml and optionally hedged
+service_client = ServiceClient(config.get("services", {}), ServiceStats(redis_client))
+retention_stats = RetentionStats(redis_client)  # Also counts this host's scratch space
+# Cache shared with the services on this node (FRAME_CACHE_DIR), warmed for sessions whose home node this is
+frame_cache = FrameCache.from_env()
+
 # MinIO client
 minio_client = Minio(
     "storage:9000",
@@ -38,267 +65,517 @@ minio_client = Minio(
 BUCKET_NAME = "kyc-videos"
 FRAMES_BUCKET = "kyc-frames"
 
-def download_video_from_minio(video_path):
-    """Download video from MinIO to temporary file"""
+def download_video_from_minio(video_path, workdir=None):
+    """Download video from MinIO to a temporary file under workdir"""
     try:
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = tempfile.mkdtemp(dir=workdir)
         local_path = os.path.join(temp_dir, "video.mp4")
         minio_client.fget_object(BUCKET_NAME, video_path, local_path)
         return local_path
     except S3Error as e:
         raise Exception(f"Failed to download video: {str(e)}")
 
-def upload_frames_to_minio(session_id, frames_dir):
-    """Upload extracted frames to MinIO"""
+def upload_video_to_minio(local_path, object_name):
+    """Upload a derived video (e.g. an analysis proxy) next to the originals"""
     try:
-        # Create frames bucket if it doesn't exist
-        if not minio_client.bucket_exists(FRAMES_BUCKET):
-            minio_client.make_bucket(FRAMES_BUCKET)
+        minio_client.fput_object(BUCKET_NAME, object_name, local_path, content_type="video/mp4")
+        return object_name
+    except S3Error as e:
+        raise Exception(f"Failed to upload video: {str(e)}")
 
-        frame_files = [f for f in os.listdir(frames_dir) if f.endswith('.jpg')]
-        uploaded_paths = []
+def prepare_analysis_video(session_id, label, video_path, proxy_path, workdir=None):
+    """Download the original upload and its analysis proxy, transcoding the proxy on first use.
 
-        for frame_file in sorted(frame_files):
-            frame_path = os.path.join(frames_dir, frame_file)
-            object_name = f"{session_id}/frames/{frame_file}"
-            minio_client.fput_object(FRAMES_BUCKET, object_name, frame_path)
-            uploaded_paths.append(object_name)
+    Returns (original_local_path, analysis_local_path, new_proxy_path); the
+    analysis path is the original when proxies are disabled or ffmpeg is
+    unavailable, and new_proxy_path is the object key of a proxy transcoded
+    by this call (None otherwise).
+    """
+    original_local_path = download_video_from_minio(video_path, workdir)
+    proxy_config = config.get("proxy", {})
+    if not proxy_config.get("enabled", False):
+        return original_local_path, original_local_path, None
 
-        return uploaded_paths
-    except S3Error as e:
-        raise Exception(f"Failed to upload frames: {str(e)}")
+    if proxy_path:
+        return original_local_path, download_video_from_minio(proxy_path, workdir), None
 
-def extract_frames(video_path, output_dir, frame_interval=30):
-    """Extract frames from video at specified intervals"""
-    cap = cv2.VideoCapture(video_path)
-    frame_count = 0
-    extracted_count = 0
+    proxy_local_path = transcode_proxy(original_local_path, proxy_config, workdir)
+    if proxy_local_path is None:
+        return original_local_path, original_local_path, None
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    new_proxy_path = upload_video_to_minio(proxy_local_path, proxy_object_name(session_id, label))
+    return original_local_path, proxy_local_path, new_proxy_path
 
-        if frame_count % frame_interval == 0:
-            frame_filename = f"frame_{extracted_count:06d}.jpg"
-            frame_path = os.path.join(output_dir, frame_filename)
-            cv2.imwrite(frame_path, frame)
-            extracted_count += 1
+def upload_frame_archive(session_id, archive_path):
+    """Upload one of a session's packed frame archives to MinIO as a single object; returns (key, ETag)"""
+    try:
+        # Create frames bucket if it doesn't exist
+        if not minio_client.bucket_exists(FRAMES_BUCKET):
+            minio_client.make_bucket(FRAMES_BUCKET)
 
-        frame_count += 1
+        object_name = f"{session_id}/{os.path.basename(archive_path)}"
+        result = minio_client.fput_object(
+            FRAMES_BUCKET, object_name, archive_path, content_type="application/octet-stream"
+        )
+        return object_name, result.etag
+    except S3Error as e:
+        raise Exception(f"Failed to upload frames: {str(e)}")
 
+def extract_frames(video_path, archive_path, selection_config, decode_config=None, original_path=None, hash_count=0):
+    """Score candidate frames, keep the best ones per consumer and pack them into a frame archive.
+
+    Candidates are decoded from `video_path` (normally the analysis proxy) in
+    parallel keyframe-aligned segments (see parallel_decode). Frames picked
+    by consumers listed in ``full_resolution`` are re-decoded from
+    `original_path` at the same frame numbers. Returns the archive index
+    entries, {consumer: [archive indices]} and the (frame_number, perceptual
+    hash) of `hash_count` evenly spaced candidates for the replay index.
+    """
+    decode_config = decode_config or {}
+    cap = cv2.VideoCapture(video_path)
+    interval = candidate_interval(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), selection_config)
     cap.release()
-    return extracted_count
 
-def call_service(service_url, payload):
-    """Call a microservice with payload"""
+    candidates, thumbs = decode_candidates(
+        video_path,
+        interval,
+        processes=decode_config.get("processes", 1),
+        min_segment_frames=decode_config.get("min_segment_frames", 150),
+    )
+
+    selection = select_frames(thumbs, selection_config["consumers"])
+    hashes = replay_index.sample_hashes(candidates, thumbs, hash_count)
+    kept = sorted(set().union(*selection.values()))
+    position = {candidate: i for i, candidate in enumerate(kept)}
+
+    full_resolution = set(selection_config.get("full_resolution", []))
+    if original_path and original_path != video_path and full_resolution:
+        wanted = {candidates[i][0] for name in full_resolution for i in selection.get(name, [])}
+        originals = decode_frames_at(original_path, wanted)
+        for i in kept:
+            frame_number = candidates[i][0]
+            if frame_number in originals:
+                candidates[i] = (frame_number, *originals[frame_number])
+
+    with open(archive_path, "wb") as f:
+        entries = frame_archive.write_archive(f, [candidates[i] for i in kept])
+    return entries, {consumer: [position[i] for i in picks] for consumer, picks in selection.items()}, hashes
+
+def stream_selection(selection_config, label):
+    """frame_selection config restricted to the consumers fed from one stream's video"""
+    consumers = selection_config["consumers"]
+    return {**selection_config, "consumers": {name: consumers[name] for name in selection_config["streams"][label]}}
+
+def publish_archive(session_id, archive_path, entries):
+    """Upload a frame archive and return its descriptor"""
+    archive_key, etag = upload_frame_archive(session_id, archive_path)
+    # On the session's home node the services read the archive from the node's frame cache
+    if frame_cache is not None and service_client.is_home(session_id):
+        frame_cache.put(FRAMES_BUCKET, archive_key, etag, archive_path)
+    return frame_archive.describe(FRAMES_BUCKET, archive_key, entries, etag)
+
+def extract_stream(session_id, label, video_path, proxy_path, selection_config, decode_config, hash_count,
+                   workdir=None, face_config=None):
+    """Normalize one uploaded video, extract its frames and upload its frame archive.
+
+    Faces in the frames picked for the consumers in ``face_config`` are
+    detected and aligned once and uploaded as a crops archive (face_crops).
+    Runs in a thread per stream, so it works on plain values and never
+    touches the database session; local files go under workdir. Returns the
+    archive descriptor, the selected frame and face crop references per
+    consumer, the sampled perceptual hashes, the key of a newly transcoded
+    proxy and the seconds spent per step.
+    """
+    face_config = face_config or {}
+    started = time.perf_counter()
+    original_local_path, video_local_path, new_proxy_path = prepare_analysis_video(
+        session_id, label, video_path, proxy_path, workdir
+    )
+    normalize_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    frames_dir = tempfile.mkdtemp(dir=workdir)
+    try:
+        archive_path = os.path.join(frames_dir, f"{label}.kfa")
+        entries, selection, hashes = extract_frames(
+            video_local_path, archive_path, selection_config, decode_config, original_local_path, hash_count
+        )
+        # Consumers range-read single frames from the uploaded archive
+        descriptor = publish_archive(session_id, archive_path, entries)
+        extraction_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        face_consumers = [name for name in face_config.get("consumers", []) if name in selection]
+        faces = {}
+        if face_config.get("enabled", False) and face_consumers:
+            crops_path = os.path.join(frames_dir, f"{label}_faces.kfa")
+            wanted = sorted({i for name in face_consumers for i in selection[name]})
+            crop_entries, detected = face_crops.write_crops(archive_path, entries, wanted, crops_path, face_config)
+            descriptor["face_crops"] = {**publish_archive(session_id, crops_path, crop_entries), "faces": detected}
+            faces = {name: face_crops.crop_refs(descriptor["face_crops"], selection[name]) for name in face_consumers}
+        face_seconds = time.perf_counter() - started
+    finally:
+        for path in {original_local_path, video_local_path, archive_path}:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+    descriptor["selection"] = selection
+    return {
+        "descriptor": descriptor,
+        "frames": {consumer: frame_archive.frame_refs(descriptor, indices) for consumer, indices in selection.items()},
+        "faces": faces,
+        "hashes": hashes,
+        "proxy_path": new_proxy_path,
+        "normalize_seconds": normalize_seconds,
+        "extraction_seconds": extraction_seconds,
+        "face_seconds": face_seconds if faces else None,
+    }
+
+def record_stage(summary, stage, started=None, seconds=None, **fields):
+    """Copy a stage's outcome onto the session summary and record how long it took.
+
+    The duration is the time since ``started`` (a perf_counter value), or
+    ``seconds`` for stages timed elsewhere, e.g. in a stream thread.
+    """
+    for name, value in fields.items():
+        setattr(summary, name, value)
+    if seconds is None:
+        seconds = time.perf_counter() - started
+    # Reassign so SQLAlchemy sees the JSON column change
+    summary.stage_timings = {**(summary.stage_timings or {}), stage: round(seconds, 3)}
+
+def timed_call(service, path, payload):
+    """(response, seconds) of one service call"""
+    started = time.perf_counter()
+    result = service_client.call(service, path, payload)
+    return result, time.perf_counter() - started
+
+def call_selfie_stages(session_id, video_path, selected_frames, selected_faces):
+    """PAD and replay/deepfake detection, on frames and aligned face crops from the selfie stream.
+
+    Runs in a thread of its own, so it only calls the services and never
+    touches the database; store_selfie_stages() writes the results.
+    Returns (response, seconds) per stage.
+    """
+    # Step 2: PAD (Presentation Attack Detection)
+    print(f"[{session_id}] Starting PAD analysis")
+    pad_payload = {
+        "session_id": session_id,
+        "frames": selected_frames["pad"],
+        "face_crops": selected_faces.get("pad", [])
+    }
+    results = {"pad": timed_call("pad", "/analyze", pad_payload)}
+
+    # Step 3: REPLAY/DEEPFAKE DETECTION
+    print(f"[{session_id}] Starting deepfake detection")
+    deepfake_payload = {
+        "session_id": session_id,
+        "video_path": video_path,
+        "face_crops": selected_faces.get("pad", [])
+    }
+    results["deepfake"] = timed_call("deepfake", "/analyze", deepfake_payload)
+    return results
+
+
+def store_selfie_stages(db, session, summary, results):
+    """Write the PAD and deepfake results of call_selfie_stages()"""
+    pad_result, pad_seconds = results["pad"]
+    pad_db_result = PadResult(
+        session_id=session.id,
+        score=pad_result.get("score", 0.0),
+        threshold=config["thresholds"]["pad"],
+        passed=int(component_passed("pad", pad_result.get("score", 0.0), config)),
+        details=pad_result
+    )
+    db.add(pad_db_result)
+    record_stage(summary, "pad", seconds=pad_seconds, pad_score=pad_db_result.score, pad_passed=pad_db_result.passed)
+
+    deepfake_result, deepfake_seconds = results["deepfake"]
+    deepfake_db_result = DeepfakeResult(
+        session_id=session.id,
+        score=deepfake_result.get("score", 0.0),
+        threshold=config["thresholds"]["replay"],
+        passed=int(component_passed("deepfake", deepfake_result.get("score", 0.0), config)),
+        details=deepfake_result
+    )
+    db.add(deepfake_db_result)
+    record_stage(summary, "deepfake", seconds=deepfake_seconds,
+                 deepfake_score=deepfake_db_result.score, deepfake_passed=deepfake_db_result.passed)
+    db.commit()
+
+    return pad_db_result, deepfake_db_result
+
+
+def call_document_stages(session_id, selected_frames):
+    """MRZ, OCR and document liveness, on frames from the ID stream.
+
+    Runs in a thread of its own, so it only calls the services and never
+    touches the database; store_document_stages() writes the results.
+    Returns (response, seconds) per stage.
+    """
+    # Step 6: MRZ fast path - locate and read the MRZ band straight from the frames,
+    # so MRZ does not wait on full-document OCR
+    print(f"[{session_id}] Starting MRZ band reading")
+    started = time.perf_counter()
+    mrz_payload = {
+        "session_id": session_id,
+        "frames": selected_frames.get("mrz") or selected_frames["ocr"]
+    }
+    try:
+        mrz_result = service_client.call("mrz", "/parse/frames", mrz_payload)
+    except Exception as e:
+        # The fast path is optional: without it the MRZ is parsed from the OCR text below
+        print(f"[{session_id}] MRZ band reading failed, falling back to OCR text: {e}")
+        mrz_result = {}
+    mrz_seconds = time.perf_counter() - started
+
+    # Step 7: OCR
+    print(f"[{session_id}] Starting OCR analysis")
+    ocr_payload = {
+        "session_id": session_id,
+        "frames": selected_frames["ocr"]
+    }
+    results = {"ocr": timed_call("ocr", "/extract", ocr_payload)}
+
+    # MRZ fallback: parse the OCR text only when no band could be read from the frames
+    if not mrz_result.get("analysis", {}).get("mrz_found"):
+        print(f"[{session_id}] No MRZ band read from frames, parsing OCR text")
+        mrz_payload = {
+            "session_id": session_id,
+            "ocr_text": results["ocr"][0].get("text", "")
+        }
+        mrz_result, fallback_seconds = timed_call("mrz", "/parse", mrz_payload)
+        mrz_seconds += fallback_seconds
+    results["mrz"] = (mrz_result, mrz_seconds)
+
+    # Step 8: DOC-LIVENESS
+    print(f"[{session_id}] Starting document liveness detection")
+    doclive_payload = {
+        "session_id": session_id,
+        "frames": selected_frames["doc_liveness"]
+    }
+    results["doc_liveness"] = timed_call("doclive", "/analyze", doclive_payload)
+    return results
+
+
+def store_document_stages(db, session, summary, results):
+    """Write the OCR, MRZ and document liveness results of call_document_stages()"""
+    ocr_result, ocr_seconds = results["ocr"]
+    ocr_db_result = OcrResult(
+        session_id=session.id,
+        extracted_text=ocr_result.get("text", ""),
+        confidence=ocr_result.get("confidence", 0.0),
+        document_type=ocr_result.get("document_type", "unknown"),
+        details=ocr_result
+    )
+    db.add(ocr_db_result)
+    record_stage(summary, "ocr", seconds=ocr_seconds,
+                 ocr_confidence=ocr_db_result.confidence, document_type=ocr_db_result.document_type)
+
+    mrz_result, mrz_seconds = results["mrz"]
+    mrz_db_result = MrzResult(
+        session_id=session.id,
+        mrz_data=mrz_result.get("mrz_data", {}),
+        parsed_fields=mrz_result.get("parsed_fields", {}),
+        valid=1 if mrz_result.get("valid", False) else 0,
+        details=mrz_result
+    )
+    db.add(mrz_db_result)
+    record_stage(summary, "mrz", seconds=mrz_seconds, mrz_valid=mrz_db_result.valid)
+
+    doclive_result, doclive_seconds = results["doc_liveness"]
+    doclive_db_result = DocLivenessResult(
+        session_id=session.id,
+        score=doclive_result.get("score", 0.0),
+        threshold=config["thresholds"]["doc_liveness"],
+        passed=int(component_passed("doc_liveness", doclive_result.get("score", 0.0), config)),
+        details=doclive_result
+    )
+    db.add(doclive_db_result)
+    record_stage(summary, "doc_liveness", seconds=doclive_seconds,
+                 doc_liveness_score=doclive_db_result.score, doc_liveness_passed=doclive_db_result.passed)
+    db.commit()
+
+    return doclive_db_result
+
+
+def record_scratch_usage():
     try:
-        response = requests.post(service_url, json=payload, timeout=300)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Service call failed: {str(e)}")
+        retention_stats.set_scratch(socket.gethostname(), *scratch.usage())
+    except Exception as e:
+        print(f"Could not record scratch usage: {e}")
 
-@celery_app.task(bind=True)
-def process_kyc_video(self, session_id):
-    """Main task to process KYC video through the DAG pipeline"""
+
+def run_pipeline(session_id, queue_wait=None):
+    """Process a KYC session through the DAG pipeline; raises after marking it failed"""
     db = SessionLocal()
+    summary = None
+    # Downloads, proxies and archives of this run; removed however the run ends
+    workdir = scratch.create_dir(session_id)
     try:
         # Update session status
         session = db.query(KycSession).filter(KycSession.session_id == session_id).first()
         if not session:
             raise Exception(f"Session {session_id} not found")
 
-        session.status = "processing"
-        db.commit()
-
-        # Step 1: FRAME EXTRACTION
-        print(f"[{session_id}] Starting frame extraction")
-        video_local_path = download_video_from_minio(session.video_path)
-
-        frames_dir = tempfile.mkdtemp()
-        frame_count = extract_frames(video_local_path, frames_dir)
-
-        # Upload frames to MinIO
-        frame_paths = upload_frames_to_minio(session_id, frames_dir)
+        summary = db.get(SessionSummary, session.id)
+        if summary is None:
+            summary = SessionSummary(
+                session_pk=session.id,
+                session_id=session.session_id,
+                created_at=session.created_at
+            )
+            db.add(summary)
+        if queue_wait is not None:
+            summary.stage_timings = {**(summary.stage_timings or {}), "queue": round(queue_wait, 3)}
 
-        # Save frame extraction result
-        frame_extraction = FrameExtraction(
-            session_id=session.id,
-            frames_path=json.dumps(frame_paths),
-            frame_count=frame_count
-        )
-        db.add(frame_extraction)
-        db.commit()
-
-        # Clean up
-        os.remove(video_local_path)
-        for f in os.listdir(frames_dir):
-            os.remove(os.path.join(frames_dir, f))
-        os.rmdir(frames_dir)
-
-        # Step 2: PAD (Presentation Attack Detection)
-        print(f"[{session_id}] Starting PAD analysis")
-        pad_payload = {
-            "session_id": session_id,
-            "frames": frame_paths[:10]  # Use first 10 frames for PAD
-        }
-        pad_result = call_service("http://pad_svc:8000/analyze", pad_payload)
-
-        pad_db_result = PadResult(
-            session_id=session.id,
-            score=pad_result.get("score", 0.0),
-            threshold=config["thresholds"]["pad"],
-            passed=1 if pad_result.get("score", 0.0) >= config["thresholds"]["pad"] else 0,
-            details=json.dumps(pad_result)
-        )
-        db.add(pad_db_result)
+        session.status = "processing"
+        summary.status = "processing"
+        # Counted up again per stream below; a retried run starts from scratch
+        summary.frame_count = 0
         db.commit()
 
-        # Step 3: REPLAY/DEEPFAKE DETECTION
-        print(f"[{session_id}] Starting deepfake detection")
-        deepfake_payload = {
-            "session_id": session_id,
-            "video_path": session.video_path
-        }
-        deepfake_result = call_service("http://deepfake_svc:8000/analyze", deepfake_payload)
-
-        deepfake_db_result = DeepfakeResult(
-            session_id=session.id,
-            score=deepfake_result.get("score", 0.0),
-            threshold=config["thresholds"]["replay"],
-            passed=1 if deepfake_result.get("score", 0.0) <= config["thresholds"]["replay"] else 0,
-            details=json.dumps(deepfake_result)
+        # Steps 0-1: NORMALIZE + FRAME EXTRACTION, one stream per uploaded video, run concurrently.
+        # Each half of the DAG starts in its own thread as soon as its own stream is ready: PAD and
+        # deepfake on the selfie frames, MRZ, OCR and doc-liveness on the ID frames. Those threads
+        # only call the services; their results are written here, on the task's own DB session.
+        # Face match needs both streams.
+        print(f"[{session_id}] Extracting selfie and ID frames")
+        replay_config = config.get("replay_index", {})
+        selection_config = config["frame_selection"]
+        selected_frames, selected_faces, frame_hashes = {}, {}, {}
+        with ThreadPoolExecutor(max_workers=2 * len(selection_config["streams"])) as executor:
+            pending = {
+                executor.submit(
+                    extract_stream, session_id, label,
+                    getattr(session, f"{label}_video_path"), getattr(session, f"{label}_proxy_path"),
+                    stream_selection(selection_config, label), config.get("decode"),
+                    replay_config.get("frames_per_stream", 16), workdir, config.get("face_crops")
+                ): ("stream", label)
+                for label in selection_config["streams"]
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, label = pending.pop(future)
+                    if kind == "stages" and label == "selfie":
+                        pad_db_result, deepfake_db_result = store_selfie_stages(db, session, summary, future.result())
+                        continue
+                    if kind == "stages":
+                        doclive_db_result = store_document_stages(db, session, summary, future.result())
+                        continue
+
+                    stream = future.result()
+                    if stream["proxy_path"]:
+                        setattr(session, f"{label}_proxy_path", stream["proxy_path"])
+                    frame_count = stream["descriptor"]["frame_count"]
+                    # One row per stream: a retried run replaces the archive of the failed one
+                    extraction = db.query(FrameExtraction).filter(
+                        FrameExtraction.session_id == session.id, FrameExtraction.stream == label
+                    ).first()
+                    if extraction is None:
+                        extraction = FrameExtraction(session_id=session.id, stream=label)
+                        db.add(extraction)
+                    extraction.frames_path = json.dumps(stream["descriptor"])
+                    extraction.frame_count = frame_count
+                    record_stage(summary, f"normalize_{label}", seconds=stream["normalize_seconds"])
+                    record_stage(summary, f"frame_extraction_{label}", seconds=stream["extraction_seconds"],
+                                 frame_count=(summary.frame_count or 0) + frame_count)
+                    if stream["face_seconds"] is not None:
+                        record_stage(summary, f"face_crops_{label}", seconds=stream["face_seconds"])
+                    db.commit()
+                    print(f"[{session_id}] {label} stream ready: {frame_count} frames, "
+                          f"{len(stream['descriptor'].get('face_crops', {}).get('faces', []))} face crops")
+
+                    selected_frames.update(stream["frames"])
+                    selected_faces.update(stream["faces"])
+                    frame_hashes[label] = stream["hashes"]
+                    if label == "selfie":
+                        stages = executor.submit(
+                            call_selfie_stages, session_id, session.selfie_proxy_path or session.selfie_video_path,
+                            dict(selected_frames), dict(selected_faces)
+                        )
+                    else:
+                        stages = executor.submit(call_document_stages, session_id, dict(selected_frames))
+                    pending[stages] = ("stages", label)
+
+        # Step 1b: REPLAY INDEX (frames near-identical to earlier sessions)
+        print(f"[{session_id}] Searching the replay index")
+        started = time.perf_counter()
+        matches = replay_index.find_matches(
+            db, session.id, [value for hashes in frame_hashes.values() for _, value in hashes],
+            replay_config.get("max_distance", 3)
         )
-        db.add(deepfake_db_result)
+        replay_matches = replay_index.summarize_matches(matches, replay_config.get("min_matching_frames", 3))
+        if replay_matches:
+            print(f"[{session_id}] {replay_matches[0]['matching_frames']} frames near-identical to "
+                  f"session {replay_matches[0]['session_id']}")
+        for label, hashes in frame_hashes.items():
+            replay_index.add_session(db, session, label, hashes)
+        record_stage(summary, "replay_index", started,
+                     replay_match_session_id=replay_matches[0]["session_id"] if replay_matches else None,
+                     replay_matching_frames=replay_matches[0]["matching_frames"] if replay_matches else 0)
         db.commit()
 
         # Step 4: ID PHOTO EXTRACT (from frames)
         print(f"[{session_id}] Starting ID photo extraction")
-        # For simplicity, assume first frame contains ID photo
-        id_photo_path = frame_paths[0] if frame_paths else None
+        # Sharpest, best exposed frame with the document in view
+        id_photo_path = selected_frames["id_photo"][0] if selected_frames["id_photo"] else None
 
         # Step 5: FACE MATCH
         print(f"[{session_id}] Starting face matching")
+        started = time.perf_counter()
         face_match_payload = {
             "session_id": session_id,
-            "face_frames": frame_paths[:5],  # Use first 5 frames for face detection
+            "face_frames": selected_frames["face_match"],
+            # Aligned crops of the faces in those frames and in the ID photo; the service runs no detector
+            "face_crops": selected_faces.get("face_match", []),
+            "id_face_crop": next(iter(selected_faces.get("id_photo", [])), None),
             "id_photo_path": id_photo_path
         }
-        face_match_result = call_service("http://facematch_svc:8000/match", face_match_payload)
+        face_match_result = service_client.call("facematch", "/match", face_match_payload)
 
         face_match_db_result = FaceMatchResult(
             session_id=session.id,
             cosine_similarity=face_match_result.get("cosine_similarity", 0.0),
             threshold=config["thresholds"]["facematch"],
-            passed=1 if face_match_result.get("cosine_similarity", 0.0) >= config["thresholds"]["facematch"] else 0,
+            passed=int(component_passed("face_match", face_match_result.get("cosine_similarity", 0.0), config)),
             face_image_path=json.dumps(face_match_result.get("face_image_path", [])),
-            id_photo_path=id_photo_path,
-            details=json.dumps(face_match_result)
+            id_photo_path=json.dumps(id_photo_path) if id_photo_path else None,
+            details=face_match_result
         )
         db.add(face_match_db_result)
+        record_stage(summary, "face_match", started,
+                     face_match_score=face_match_db_result.cosine_similarity,
+                     face_match_passed=face_match_db_result.passed)
         db.commit()
 
-        # Step 6: OCR + MRZ
-        print(f"[{session_id}] Starting OCR and MRZ analysis")
-        ocr_payload = {
-            "session_id": session_id,
-            "frames": frame_paths  # Use all frames for OCR
-        }
-        ocr_result = call_service("http://ocr_svc:8000/extract", ocr_payload)
-
-        ocr_db_result = OcrResult(
-            session_id=session.id,
-            extracted_text=ocr_result.get("text", ""),
-            confidence=ocr_result.get("confidence", 0.0),
-            document_type=ocr_result.get("document_type", "unknown"),
-            details=json.dumps(ocr_result)
-        )
-        db.add(ocr_db_result)
-        db.commit()
-
-        # MRZ parsing
-        mrz_payload = {
-            "session_id": session_id,
-            "ocr_text": ocr_result.get("text", "")
-        }
-        mrz_result = call_service("http://mrz_svc:8000/parse", mrz_payload)
-
-        mrz_db_result = MrzResult(
-            session_id=session.id,
-            mrz_data=json.dumps(mrz_result.get("mrz_data", {})),
-            parsed_fields=json.dumps(mrz_result.get("parsed_fields", {})),
-            valid=1 if mrz_result.get("valid", False) else 0,
-            details=json.dumps(mrz_result)
-        )
-        db.add(mrz_db_result)
-        db.commit()
-
-        # Step 7: DOC-LIVENESS
-        print(f"[{session_id}] Starting document liveness detection")
-        doclive_payload = {
-            "session_id": session_id,
-            "frames": frame_paths
-        }
-        doclive_result = call_service("http://doclive_svc:8000/analyze", doclive_payload)
-
-        doclive_db_result = DocLivenessResult(
-            session_id=session.id,
-            score=doclive_result.get("score", 0.0),
-            threshold=config["thresholds"]["doc_liveness"],
-            passed=1 if doclive_result.get("score", 0.0) >= config["thresholds"]["doc_liveness"] else 0,
-            details=json.dumps(doclive_result)
-        )
-        db.add(doclive_db_result)
-        db.commit()
-
-        # Step 8: RISK SCORING
+        # Step 9: RISK SCORING
         print(f"[{session_id}] Calculating risk score")
-        risk_payload = {
-            "session_id": session_id,
-            "results": {
-                "pad": {"score": pad_db_result.score, "passed": bool(pad_db_result.passed)},
-                "deepfake": {"score": deepfake_db_result.score, "passed": bool(deepfake_db_result.passed)},
-                "face_match": {"cosine_similarity": face_match_db_result.cosine_similarity, "passed": bool(face_match_db_result.passed)},
-                "doc_liveness": {"score": doclive_db_result.score, "passed": bool(doclive_db_result.passed)}
-            }
-        }
-
-        # Calculate weighted risk score
-        weights = config["weights"]
-        component_scores = {
-            "pad": 1.0 if pad_db_result.passed else 0.0,
-            "deepfake": 1.0 if deepfake_db_result.passed else 0.0,
-            "face_match": 1.0 if face_match_db_result.passed else 0.0,
-            "doc_liveness": 1.0 if doclive_db_result.passed else 0.0
-        }
-
-        overall_score = sum(component_scores[comp] * weights[comp] for comp in component_scores)
-
-        # Determine risk level and decision
-        if overall_score >= 0.8:
-            risk_level = "low"
-            decision = "approve"
-        elif overall_score >= 0.6:
-            risk_level = "medium"
-            decision = "manual_review"
-        else:
-            risk_level = "high"
-            decision = "reject"
+        started = time.perf_counter()
+        risk = score_session({
+            "pad": pad_db_result.score,
+            "deepfake": deepfake_db_result.score,
+            "face_match": face_match_db_result.cosine_similarity,
+            "doc_liveness": doclive_db_result.score,
+        }, config)
 
         risk_score = RiskScore(
             session_id=session.id,
-            overall_score=overall_score,
-            risk_level=risk_level,
-            component_scores=json.dumps(component_scores),
-            weights=json.dumps(weights),
-            decision=decision
+            overall_score=risk["overall_score"],
+            risk_level=risk["risk_level"],
+            component_scores=risk["component_scores"],
+            weights=risk["weights"],
+            decision=risk["decision"]
         )
         db.add(risk_score)
+        record_stage(summary, "risk", started, overall_score=risk["overall_score"], risk_level=risk["risk_level"],
+                     decision=risk["decision"], risk_version=1)
         db.commit()
 
         # Update session status
         session.status = "completed"
+        summary.status = "completed"
+        summary.completed_at = datetime.utcnow()
         db.commit()
 
         print(f"[{session_id}] Processing completed successfully")
@@ -306,8 +583,46 @@ def process_kyc_video(self, session_id):
 
     except Exception as e:
         print(f"[{session_id}] Processing failed: {str(e)}")
+        db.rollback()
         session.status = "failed"
+        if summary is not None:
+            summary.status = "failed"
+            summary.completed_at = datetime.utcnow()
         db.commit()
-        raise self.retry(countdown=60, exc=e, max_retries=3)
+        raise
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+        scratch.remove_dir(workdir)
+        record_scratch_usage()
+
+
+@celery_app.task(bind=True)
+def process_kyc_video(self, session_id):
+    """Main task to process KYC video through the DAG pipeline"""
+    try:
+        return run_pipeline(session_id)
+    except Exception as e:
+        raise self.retry(countdown=60, exc=e, max_retries=MAX_RETRIES)
+
+
+@celery_app.task
+def run_next_session():
+    """Dispatch token: process the queued session with the earliest deadline in the most urgent tier"""
+    entry = scheduler.pop_next()
+    if entry is None:
+        return {"status": "idle"}
+
+    queue_wait = time.time() - entry.enqueued_at
+    scheduler.record_wait(entry.queue, queue_wait)
+    lateness = time.time() - entry.deadline
+    print(f"[{entry.session_id}] Dispatched from {entry.queue} queue after {queue_wait:.1f}s"
+          + (f", {lateness:.1f}s past its deadline" if lateness > 0 else ""))
+    try:
+        return run_pipeline(entry.session_id, queue_wait)
+    except Exception:
+        if entry.attempts >= MAX_RETRIES:
+            raise
+        # Back in its queue with its original deadline; a delayed token picks up whatever is most urgent then
+        scheduler.requeue(entry)
+        run_next_session.apply_async(countdown=60)
+        return {"status": "requeued", "session_id": entry.session_id}
\ No newline at end of file